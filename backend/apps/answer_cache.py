@@ -0,0 +1,165 @@
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import secrets
+from typing import List, Optional
+
+import numpy as np
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+from apps.cache import LRUCache
+from apps import bm25
+from apps.file_db import get_file_db
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+class AnswerCacheEntry:
+    def __init__(self, embedding: np.ndarray, file_ids: frozenset, question: str, context: str, citations: list, versions: tuple = None):
+        self.embedding = embedding
+        self.file_ids = file_ids
+        self.versions = versions
+        self.question = question
+        self.context = context
+        self.citations = citations
+        # /invoke 에서 답변 생성이 끝나면 채워짐
+        self.answer = None
+        self.created_at = time.time()
+
+class AnswerCache:
+    # standalone query embedding + file_id 집합 기준의 semantic cache
+    def __init__(self, max_size: int, ttl: float, similarity_threshold: float, version_fn=None, secret_fn=None):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # collection -> 색인 version (다른 worker 프로세스에서 재색인된 경우 invalidate 호출 없이도 무효화)
+        self.version_fn = version_fn
+        # 캐시 항목 token 서명 key (모든 worker 프로세스에서 같은 값)
+        self.secret_fn = secret_fn
+        self._entries = LRUCache(maxsize=max_size)
+
+    @staticmethod
+    def get_key(question: str, context: str) -> str:
+        return hashlib.sha256(f"{question}\0{context}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _get_versions(self, file_ids: frozenset) -> Optional[tuple]:
+        if self.version_fn is None:
+            return None
+        return tuple(self.version_fn(file_id) for file_id in sorted(file_ids))
+
+    def lookup(self, embedding: List[float], file_ids: List[str]) -> Optional[AnswerCacheEntry]:
+        file_ids = frozenset(file_ids)
+        versions = self._get_versions(file_ids)
+        now = time.time()
+        candidates = []
+        for key, entry in self._entries.items():
+            if now - entry.created_at > self.ttl:
+                self._entries.pop(key)
+                continue
+            if entry.file_ids == file_ids and entry.versions != versions:
+                self._entries.pop(key)
+                continue
+            if entry.answer is not None and entry.file_ids == file_ids:
+                candidates.append((key, entry))
+        if not candidates:
+            return None
+
+        similarities = np.stack([entry.embedding for _, entry in candidates]) @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        key, entry = candidates[best]
+        # LRU 순서 갱신
+        self._entries.get(key)
+        return entry
+
+    def add(self, embedding: List[float], file_ids: List[str], question: str, context: str, citations: list) -> str:
+        key = self.get_key(question, context)
+        if self._entries.peek(key) is None:
+            file_ids = frozenset(file_ids)
+            entry = AnswerCacheEntry(self._normalize(embedding), file_ids, question, context, citations, self._get_versions(file_ids))
+            self._entries.put(key, entry)
+        return key
+
+    def get_token(self, embedding: List[float], file_ids: List[str], question: str, context: str, citations: list) -> Optional[str]:
+        # /search -> /invoke 가 다른 worker 프로세스에서 처리되어도 답변을 저장할 수 있도록 캐시 항목을 token으로 전달
+        # (question, context는 /invoke 입력에 포함되므로 key로만 연결, 변조되지 않도록 서명)
+        if self.secret_fn is None:
+            return None
+        payload = json.dumps({
+            "key": self.get_key(question, context),
+            "embedding": base64.b64encode(self._normalize(embedding).tobytes()).decode("ascii"),
+            "file_ids": sorted(file_ids),
+            "citations": citations,
+        }, ensure_ascii=False).encode("utf-8")
+        signature = hmac.new(self.secret_fn(), payload, hashlib.sha256).hexdigest()
+        return f"{base64.urlsafe_b64encode(payload).decode('ascii')}.{signature}"
+
+    def _from_token(self, token: str, question: str, context: str) -> Optional[AnswerCacheEntry]:
+        try:
+            encoded, signature = token.rsplit(".", 1)
+            payload = base64.urlsafe_b64decode(encoded.encode("ascii"))
+        except ValueError:
+            return None
+        if self.secret_fn is None or not hmac.compare_digest(hmac.new(self.secret_fn(), payload, hashlib.sha256).hexdigest(), signature):
+            log.warning("AnswerCache._from_token(): invalid signature")
+            return None
+        data = json.loads(payload)
+        if data["key"] != self.get_key(question, context):
+            return None
+        file_ids = frozenset(data["file_ids"])
+        embedding = np.frombuffer(base64.b64decode(data["embedding"]), dtype=np.float32)
+        return AnswerCacheEntry(embedding, file_ids, question, context, data["citations"], self._get_versions(file_ids))
+
+    def set_answer(self, question: str, context: str, answer: str, token: str = None):
+        key = self.get_key(question, context)
+        entry = self._entries.peek(key)
+        if entry is None and token:
+            # 다른 worker 프로세스의 /search에서 만든 항목
+            entry = self._from_token(token, question, context)
+            if entry is None:
+                return
+            self._entries.put(key, entry)
+        if entry is not None:
+            entry.answer = answer
+
+    def invalidate(self, file_id: str):
+        # 재색인/삭제된 collection을 참조하는 항목 제거
+        removed = 0
+        for key, entry in self._entries.items():
+            if file_id in entry.file_ids:
+                self._entries.pop(key)
+                removed += 1
+        if removed:
+            log.info(f"AnswerCache.invalidate(): {file_id} ({removed} entries)")
+
+    def __len__(self):
+        return len(self._entries)
+
+_secret = None
+
+def get_secret() -> bytes:
+    # 파일관리 DB에 1회 생성하여 worker 프로세스간 공유
+    global _secret
+    if _secret is None:
+        _secret = get_file_db().setdefault_meta("answer_cache_secret", secrets.token_hex(32)).encode("ascii")
+    return _secret
+
+answer_cache = AnswerCache(
+    max_size=CONFIG_DATA['answer_cache']['max_size'],
+    ttl=CONFIG_DATA['answer_cache']['ttl'],
+    similarity_threshold=CONFIG_DATA['answer_cache']['similarity_threshold'],
+    version_fn=bm25.get_index_version,
+    secret_fn=get_secret,
+)
+
+def is_enabled() -> bool:
+    return CONFIG_DATA['answer_cache']['enabled']
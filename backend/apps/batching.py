@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, List
+import numpy as np
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+from apps import metrics
+from apps import model_registry
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+class SchedulerSaturated(Exception):
+    pass
+
+class _Request:
+    __slots__ = ("items", "future", "enqueued_at")
+
+    def __init__(self, items: list):
+        self.items = items
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class MicroBatcher:
+    # 동시 요청들의 추론 입력을 max_wait 동안(또는 max_batch_size까지) 모아서 1번의 batch 호출로 실행
+    # fn: 입력 list -> 같은 순서의 결과 list, 요청 1개가 여러 입력(rerank pair 등)을 가질 수 있음
+    def __init__(self, name: str, fn: Callable[[list], list], max_batch_size: int, max_wait: float, max_queue: int):
+        self.name = name
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def _start(self):
+        # fork 이후(gunicorn worker) 부모의 queue/thread는 사용할 수 없으므로 프로세스마다 새로 생성
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                threading.Thread(target=self._run, args=(self._queue,), name=f"batcher-{self.name}", daemon=True).start()
+                self._pid = os.getpid()
+        return self._queue
+
+    def submit(self, items: list) -> Future:
+        # 대기열이 가득 찬 경우 기다리지 않고 바로 실패 (load shedding)
+        requests = self._queue if self._pid == os.getpid() else self._start()
+        request = _Request(items)
+        try:
+            requests.put_nowait(request)
+        except queue.Full:
+            metrics.count_shed(self.name)
+            raise SchedulerSaturated(f"{self.name} scheduler is saturated ({self.max_queue} requests queued)")
+        return request.future
+
+    def __call__(self, items: list) -> list:
+        return self.submit(items).result()
+
+    def _collect(self, requests: queue.Queue) -> List[_Request]:
+        batch = [requests.get()]
+        size = len(batch[0].items)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _run(self, requests: queue.Queue):
+        while True:
+            batch = [request for request in self._collect(requests) if request.future.set_running_or_notify_cancel()]
+            if batch:
+                self._execute(batch)
+
+    def _execute(self, batch: List[_Request]):
+        started = time.perf_counter()
+        for request in batch:
+            metrics.observe(f"{self.name}_queue_wait", started - request.enqueued_at)
+        items = [item for request in batch for item in request.items]
+        try:
+            with metrics.span(f"{self.name}_batch"):
+                results = self.fn(items)
+        except Exception as e:
+            log.exception(f"_execute(): {self.name} batch of {len(items)} failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        metrics.observe_batch(self.name, len(batch), len(items))
+
+        offset = 0
+        for request in batch:
+            request.future.set_result(results[offset:offset + len(request.items)])
+            offset += len(request.items)
+
+def is_enabled() -> bool:
+    return CONFIG_DATA['batching']['enabled']
+
+def _embed(texts: list) -> list:
+    return model_registry.get_embedding().embed_documents(texts)
+
+def _rerank(pairs: list) -> list:
+    # 모인 pair 전체를 1번의 predict 호출로 scoring (forward pass당 pair 수는 rerank.batch_size로 제한하여 메모리 사용량 유지)
+    return model_registry.get_reranker().predict(pairs, batch_size=CONFIG_DATA['rerank']['batch_size']).tolist()
+
+def _get_batcher(name: str, fn) -> MicroBatcher:
+    config = CONFIG_DATA['batching']
+    return MicroBatcher(
+        name,
+        fn,
+        max_batch_size=config[name]['max_batch_size'],
+        max_wait=config['max_wait_ms'] / 1000,
+        max_queue=config[name]['max_queue'],
+    )
+
+embedding_batcher = _get_batcher("embedding", _embed)
+rerank_batcher = _get_batcher("rerank", _rerank)
+
+class BatchedCrossEncoder:
+    # CrossEncoder.predict와 같은 interface로 rerank_batcher를 사용 (RerankCompressor의 reranking_function)
+    def __init__(self, batcher: MicroBatcher = None):
+        self.batcher = batcher or rerank_batcher
+
+    def predict(self, pairs, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(self.batcher(list(pairs)), dtype=np.float32)
+
+    async def apredict(self, pairs, batch_size: int = 32, **kwargs) -> np.ndarray:
+        # event loop에서 batch 결과를 기다림 (rerank executor thread를 점유하지 않음)
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(await asyncio.wrap_future(self.batcher.submit(list(pairs))), dtype=np.float32)
+
+def get_reranker():
+    return BatchedCrossEncoder() if is_enabled() else model_registry.get_reranker()
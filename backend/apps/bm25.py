@@ -0,0 +1,186 @@
+import os
+import logging
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, BM25_DATA_PATH)
+from apps.cache import LRUCache
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# BM25Okapi(rank_bm25) 기본값과 동일
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+def tokenize(text: str) -> List[str]:
+    # BM25Retriever 기본 preprocess와 동일
+    return text.split()
+
+class BM25IndexBuilder:
+    # chunk를 하나씩 받아 posting list를 누적
+    def __init__(self):
+        self.chunk_ids = []
+        self.doc_lens = []
+        self.postings = {}
+
+    def add(self, chunk_id: str, text: str):
+        doc_id = len(self.chunk_ids)
+        tokens = tokenize(text)
+        self.chunk_ids.append(chunk_id)
+        self.doc_lens.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((doc_id, tf))
+
+    def build(self) -> "BM25Index":
+        vocab = list(self.postings.keys())
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_ids = []
+        tfs = []
+        for i, term in enumerate(vocab):
+            postings = self.postings[term]
+            offsets[i + 1] = offsets[i] + len(postings)
+            doc_ids.extend(p[0] for p in postings)
+            tfs.extend(p[1] for p in postings)
+
+        return BM25Index(
+            vocab=vocab,
+            offsets=offsets,
+            doc_ids=np.asarray(doc_ids, dtype=np.int32),
+            tfs=np.minimum(np.asarray(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16),
+            doc_lens=np.asarray(self.doc_lens, dtype=np.int32),
+            chunk_ids=self.chunk_ids,
+        )
+
+class BM25Index:
+    # CSR 형태의 inverted index: term i의 posting은 doc_ids[offsets[i]:offsets[i+1]]
+    def __init__(self, vocab, offsets, doc_ids, tfs, doc_lens, chunk_ids):
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.chunk_ids = chunk_ids
+
+        corpus_size = len(doc_lens)
+        avgdl = float(doc_lens.mean()) if corpus_size else 0.0
+        # doc 길이 정규화 항은 색인 시점에 미리 계산
+        self.norms = (K1 * (1 - B + B * doc_lens / avgdl)).astype(np.float32) if avgdl else np.full(corpus_size, K1, dtype=np.float32)
+
+        df = np.diff(offsets)
+        idf = np.log(corpus_size - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            eps = EPSILON * (idf.sum() / len(idf))
+            idf[idf < 0] = eps
+        self.idf = idf.astype(np.float32)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], chunk_ids: List[str]) -> "BM25Index":
+        builder = BM25IndexBuilder()
+        for chunk_id, text in zip(chunk_ids, texts):
+            builder.add(chunk_id, text)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def get_top_k_arrays(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # 질의 term의 posting만 읽어서 점수 계산 (corpus 크기와 무관)
+        # returns (chunk ids, scores) 점수 내림차순
+        docs = []
+        contribs = []
+        for term in tokenize(query):
+            i = self.vocab.get(term)
+            if i is None:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            doc_ids = self.doc_ids[start:end]
+            tfs = self.tfs[start:end].astype(np.float32)
+            docs.append(doc_ids)
+            contribs.append(self.idf[i] * tfs * (K1 + 1) / (tfs + self.norms[doc_ids]))
+
+        if not docs:
+            return np.asarray([], dtype=str), np.asarray([], dtype=np.float64)
+
+        unique_docs, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contribs))
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return np.asarray([self.chunk_ids[i] for i in unique_docs[top]], dtype=str), scores[top]
+
+    def save(self, path: str):
+        inverted_vocab = [None] * len(self.vocab)
+        for term, i in self.vocab.items():
+            inverted_vocab[i] = term
+        # whitespace 기준 토큰이므로 개행으로 join 해도 안전
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            vocab=np.frombuffer("\n".join(inverted_vocab).encode("utf-8"), dtype=np.uint8),
+            chunk_ids=np.frombuffer("\n".join(self.chunk_ids).encode("utf-8"), dtype=np.uint8),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_lens=self.doc_lens,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            vocab = data["vocab"].tobytes().decode("utf-8")
+            chunk_ids = data["chunk_ids"].tobytes().decode("utf-8")
+            return cls(
+                vocab=vocab.split("\n") if vocab else [],
+                offsets=data["offsets"],
+                doc_ids=data["doc_ids"],
+                tfs=data["tfs"],
+                doc_lens=data["doc_lens"],
+                chunk_ids=chunk_ids.split("\n") if chunk_ids else [],
+            )
+
+_index_cache = LRUCache(maxsize=CONFIG_DATA['bm25']['cache_size'])
+
+def get_index_path(collection_name: str) -> str:
+    return os.path.join(BM25_DATA_PATH, f"{collection_name}.npz")
+
+def get_index_version(collection_name: str) -> Optional[tuple]:
+    # 색인이 끝날 때마다 index 파일을 새로 교체하므로 (mtime, inode)로 재색인 여부 판단
+    # 다른 프로세스(worker, 일괄 색인)에서 재색인한 경우에도 캐시를 갱신하기 위해 사용
+    try:
+        stat = os.stat(get_index_path(collection_name))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino
+
+def save_index(collection_name: str, index: BM25Index):
+    index.save(get_index_path(collection_name))
+    # 재색인시 이전 index는 캐시에서 제거
+    _index_cache.pop(collection_name)
+
+def load_index(collection_name: str) -> Optional[BM25Index]:
+    version = get_index_version(collection_name)
+    if version is None:
+        return None
+    cached = _index_cache.get(collection_name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    index = BM25Index.load(get_index_path(collection_name))
+    _index_cache.put(collection_name, (version, index))
+    log.info(f"load_index(): {collection_name} ({len(index)} chunks)")
+    return index
+
+def invalidate_index(collection_name: str, remove_file: bool = False):
+    _index_cache.pop(collection_name)
+    if remove_file:
+        path = get_index_path(collection_name)
+        if os.path.exists(path):
+            os.remove(path)
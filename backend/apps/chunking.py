@@ -0,0 +1,138 @@
+import re
+import logging
+from typing import List, Iterable, Tuple
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+from apps import model_registry
+from langchain_core.documents import Document
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# 임베딩 모델에 fast tokenizer가 없는 경우(stand-in 등) 공백 단위 단어를 token으로 근사
+_word_pattern = re.compile(r"\S+")
+# chunk 끝을 단어 경계로 맞출 때 되돌아가는 최대 token 수
+MAX_BOUNDARY_BACKOFF = 8
+
+class WordTokenizer:
+    special_tokens = 0
+
+    def offsets(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        return [[match.span() for match in _word_pattern.finditer(text)] for text in texts]
+
+    def count(self, texts: List[str]) -> List[int]:
+        # 임베딩 모델 입력 token 수 (special token 포함)
+        return [len(offsets) + self.special_tokens for offsets in self.offsets(texts)]
+
+class ModelTokenizer:
+    # 임베딩 모델의 (fast) tokenizer로 page 전체를 1번에 tokenize하여 token별 글자 위치를 구함
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        # 임베딩시 추가되는 [CLS], [SEP] 등
+        self.special_tokens = tokenizer.num_special_tokens_to_add(pair=False)
+
+    def offsets(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False,
+        )
+        # 빈 token(offset (0, 0) 등)도 모델 입력 길이에 포함되므로 제외하지 않고 앞 token의 끝 위치로 맞춤
+        results = []
+        for offsets in encoded["offset_mapping"]:
+            fixed = []
+            position = 0
+            for start, end in offsets:
+                if end <= start:
+                    start = end = position
+                position = end
+                fixed.append((start, end))
+            results.append(fixed)
+        return results
+
+    def count(self, texts: List[str]) -> List[int]:
+        # 임베딩시 실제 입력 길이 (special token 포함 input_ids 길이)
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False,
+        )
+        return [len(input_ids) for input_ids in encoded["input_ids"]]
+
+def get_embedding_tokenizer():
+    # returns (tokenizer, 모델 최대 sequence 길이 or 0)
+    client = getattr(model_registry.get_embedding(), "client", None)
+    tokenizer = getattr(client, "tokenizer", None)
+    max_seq_length = getattr(client, "max_seq_length", None) or 0
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        log.warning("get_embedding_tokenizer(): embedding model has no fast tokenizer, counting words as tokens")
+        return WordTokenizer(), max_seq_length
+    return ModelTokenizer(tokenizer), max_seq_length
+
+class TokenTextSplitter:
+    # 임베딩 모델의 token 수 기준으로 chunk를 나눔 (모델 최대 길이를 넘어 잘리는 chunk가 없도록)
+    # chunk는 token 경계의 원문 구간이므로 metadata의 start_index로 겹치는 chunk를 병합할 수 있음
+    def __init__(self, tokenizer, chunk_tokens: int, chunk_overlap: int, max_seq_length: int = 0):
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+        if max_seq_length:
+            chunk_tokens = min(chunk_tokens, max_seq_length - tokenizer.special_tokens)
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = min(chunk_overlap, chunk_tokens // 2)
+
+    def _fit(self, text: str, offsets: List[Tuple[int, int]], start: int, end: int) -> Tuple[int, int]:
+        # chunk만 다시 tokenize한 실제 입력 길이는 page 전체 기준 token 수와 다를 수 있으므로 (chunk 경계 등)
+        # 모델 최대 길이를 넘으면 넘은 만큼 token을 줄임, returns (end, 입력 token 수)
+        while True:
+            tokens = self.tokenizer.count([text[offsets[start][0]:offsets[end - 1][1]]])[0]
+            if not self.max_seq_length or tokens <= self.max_seq_length or end - start <= 1:
+                return end, tokens
+            end = max(end - (tokens - self.max_seq_length), start + 1)
+
+    def _windows(self, text: str, offsets: List[Tuple[int, int]]) -> Iterable[Tuple[int, int, int]]:
+        # returns [start, end) token index, 입력 token 수
+        start = 0
+        while start < len(offsets):
+            end = min(start + self.chunk_tokens, len(offsets))
+            if end < len(offsets):
+                # 단어 중간에서 자르지 않도록 공백 뒤에서 시작하는 token까지 되돌아감
+                for boundary in range(end, max(end - MAX_BOUNDARY_BACKOFF, start + 1), -1):
+                    if offsets[boundary][0] > offsets[boundary - 1][1] or text[offsets[boundary][0] - 1].isspace():
+                        end = boundary
+                        break
+            end, tokens = self._fit(text, offsets, start, end)
+            yield start, end, tokens
+            if end == len(offsets):
+                break
+            start = max(end - self.chunk_overlap, start + 1)
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        texts = [document.page_content for document in documents]
+        docs = []
+        for document, text, offsets in zip(documents, texts, self.tokenizer.offsets(texts)):
+            for start, end, tokens in self._windows(text, offsets):
+                start_index = offsets[start][0]
+                docs.append(Document(
+                    page_content=text[start_index:offsets[end - 1][1]],
+                    metadata={
+                        **document.metadata,
+                        "start_index": start_index,
+                        # 임베딩 모델 입력 token 수 (special token 포함)
+                        "tokens": tokens,
+                    },
+                ))
+        return docs
+
+def get_token_text_splitter() -> TokenTextSplitter:
+    tokenizer, max_seq_length = get_embedding_tokenizer()
+    return TokenTextSplitter(
+        tokenizer,
+        chunk_tokens=CONFIG_DATA['index']['chunk_tokens'],
+        chunk_overlap=CONFIG_DATA['index']['chunk_overlap_tokens'],
+        max_seq_length=max_seq_length,
+    )
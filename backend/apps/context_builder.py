@@ -0,0 +1,174 @@
+import os
+import logging
+import urllib.parse
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# tokenizer를 사용할 수 없을 때의 token당 평균 글자수 (근사치)
+CHARS_PER_TOKEN = 4
+
+class Tokenizer:
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+def _get_encoding_name(model_name: str) -> str:
+    import tiktoken
+    try:
+        return tiktoken.encoding_name_for_model(model_name)
+    except KeyError:
+        return "cl100k_base"
+
+def _get_marker_path(encoding_name: str) -> str:
+    # download_tokenizer()로 받아둔 encoding 표시 (tiktoken은 캐시가 없으면 network에서 받음)
+    return os.path.join(os.environ["TIKTOKEN_CACHE_DIR"], f"{encoding_name}.downloaded")
+
+def download_tokenizer(model_name: str = None) -> str:
+    # tiktoken encoding 파일을 TIKTOKEN_CACHE_DIR에 다운로드, returns encoding name
+    import tiktoken
+    encoding_name = _get_encoding_name(model_name or CONFIG_DATA['rag']['llm_model'])
+    tiktoken.get_encoding(encoding_name)
+    open(_get_marker_path(encoding_name), "w").close()
+    return encoding_name
+
+@lru_cache(maxsize=8)
+def get_tokenizer(model_name: str = None) -> Tokenizer:
+    # 답변 생성 모델의 tokenizer로 token 수 계산
+    # 서버 시작/요청 중에는 network 조회 없이 로컬 캐시의 encoding만 사용
+    model_name = model_name or CONFIG_DATA['rag']['llm_model']
+    try:
+        import tiktoken
+        encoding_name = _get_encoding_name(model_name)
+        if not os.path.exists(_get_marker_path(encoding_name)):
+            raise FileNotFoundError(f"{encoding_name} is not in {os.environ['TIKTOKEN_CACHE_DIR']}, run `python -m apps.model_registry --download`")
+        return Tokenizer(tiktoken.get_encoding(encoding_name))
+    except Exception as e:
+        log.warning(f"get_tokenizer(): {model_name} tokenizer is not available, estimating tokens by length: {e}")
+        return Tokenizer()
+
+def strip_header(text: str, filename: str) -> str:
+    # 이전 버전의 get_split_docs에서 chunk마다 붙인 파일명 제거 (현재는 metadata["filename"]에만 저장)
+    header = f"{urllib.parse.unquote(filename)}\n\n"
+    return text[len(header):] if text.startswith(header) else text
+
+class Segment:
+    # 같은 page에서 겹치거나 이어지는 chunk들을 합친 구간
+    def __init__(self, file_id: str, page, start, text: str, score: float, chunk: int):
+        self.file_id = file_id
+        self.page = page
+        self.start = start
+        self.text = text
+        self.score = score
+        self.chunks = [chunk]
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+    def merge(self, other: "Segment") -> bool:
+        if self.start is None or other.start is None or other.start > self.end:
+            return False
+        if other.end > self.end:
+            self.text += other.text[self.end - other.start:]
+        self.score = max(self.score, other.score)
+        self.chunks.extend(other.chunks)
+        return True
+
+def merge_chunks(documents: List[str], metadatas: List[dict], file_names: Dict[str, str]) -> List[Segment]:
+    groups = {}
+    for i, (document, metadata) in enumerate(zip(documents, metadatas)):
+        if document is None:
+            continue
+        file_id = metadata["file_id"]
+        segment = Segment(
+            file_id=file_id,
+            page=metadata.get("page"),
+            start=metadata.get("start_index"),
+            text=strip_header(document, file_names[file_id]),
+            score=metadata.get("score") or 0.0,
+            chunk=i,
+        )
+        groups.setdefault((file_id, segment.page), []).append(segment)
+
+    segments = []
+    for group in groups.values():
+        group.sort(key=lambda segment: -1 if segment.start is None else segment.start)
+        current = group[0]
+        for segment in group[1:]:
+            if not current.merge(segment):
+                segments.append(current)
+                current = segment
+        segments.append(current)
+    return segments
+
+def build_context(query_result: dict, file_names: Dict[str, str], max_tokens: int = None, tokenizer: Tokenizer = None) -> Tuple[List[str], List[dict], dict]:
+    # rerank 결과 -> 파일별 context, citation, token 통계
+    # 겹치는 chunk는 합치고, 파일명은 파일당 1번만 넣고, 점수순으로 token budget 안에서 선택
+    max_tokens = max_tokens if max_tokens is not None else CONFIG_DATA['context']['max_tokens']
+    tokenizer = tokenizer or get_tokenizer()
+    documents, metadatas = query_result["documents"][0], query_result["metadatas"][0]
+
+    segments = sorted(merge_chunks(documents, metadatas, file_names), key=lambda segment: segment.score, reverse=True)
+
+    selected = []
+    used_tokens = 0
+    headers = set()
+    for segment in segments:
+        header_tokens = 0 if segment.file_id in headers else tokenizer.count(f"{urllib.parse.unquote(file_names[segment.file_id])}\n\n")
+        tokens = tokenizer.count(segment.text) + header_tokens
+        if max_tokens > 0 and used_tokens + tokens > max_tokens:
+            if selected:
+                continue
+            # 가장 점수가 높은 구간도 budget을 넘으면 잘라서 사용
+            segment.text = tokenizer.truncate(segment.text, max(max_tokens - header_tokens, 0))
+            tokens = max_tokens
+        selected.append(segment)
+        headers.add(segment.file_id)
+        used_tokens += tokens
+
+    # 파일별로 문서 순서(page, 위치)대로 배치
+    by_file = {}
+    for segment in selected:
+        by_file.setdefault(segment.file_id, []).append(segment)
+
+    contexts = []
+    citations = []
+    for file_id, file_segments in by_file.items():
+        file_segments.sort(key=lambda segment: (segment.page if segment.page is not None else -1, segment.start or 0))
+        filename = urllib.parse.unquote(file_names[file_id])
+        contexts.append(f"{filename}\n\n" + "\n\n".join(segment.text for segment in file_segments))
+        # citation은 원본 chunk 단위로 유지
+        chunks = sorted(chunk for segment in file_segments for chunk in segment.chunks)
+        citations.append({
+            "source": file_names[file_id],
+            "document": [documents[chunk] for chunk in chunks],
+            "metadata": [metadatas[chunk] for chunk in chunks],
+        })
+
+    # 기존 방식(파일별 chunk 전체를 이어붙임) 대비 token 수
+    original_tokens = sum(tokenizer.count(document) for document in documents if document is not None)
+    context_tokens = sum(tokenizer.count(context) for context in contexts)
+    stats = {
+        "chunks": sum(1 for document in documents if document is not None),
+        "segments": len(segments),
+        "selected_chunks": sum(len(segment.chunks) for segment in selected),
+        "original_tokens": original_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": original_tokens - context_tokens,
+        "max_tokens": max_tokens,
+    }
+    return contexts, citations, stats
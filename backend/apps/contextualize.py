@@ -0,0 +1,80 @@
+import re
+import json
+import time
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+from apps.cache import LRUCache
+from apps.utils import get_content_from_message, aget_contextualize_query
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# 이전 대화를 참조하는 표현 (포함되면 standalone 질문이 아니라고 판단)
+REFERENCE_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their",
+    "he", "she", "him", "her", "his", "above", "previous", "former", "latter",
+    "same", "more", "else", "again", "also", "another", "other",
+    "그", "이", "저", "위", "앞", "또",
+}
+# 한국어는 조사가 붙으므로 prefix로 비교
+REFERENCE_PREFIXES = (
+    "그것", "그거", "그게", "그건", "이것", "이거", "이게", "이건", "저것", "저거",
+    "거기", "여기", "해당", "위의", "앞의", "앞에서", "그럼", "그러면", "그리고", "다른",
+)
+_word_pattern = re.compile(r"\w+")
+
+_rewrite_cache = LRUCache(maxsize=CONFIG_DATA['contextualize']['cache_size'])
+
+def _words(text: str) -> List[str]:
+    return _word_pattern.findall(text.lower())
+
+def trim_history(history: List[dict]) -> List[dict]:
+    # 최근 N개의 메시지만 사용하여 token 사용량을 대화 길이와 무관하게 유지
+    window = CONFIG_DATA['contextualize']['history_window']
+    return history[-window:] if window > 0 else history
+
+def get_cache_key(query: str, history: List[dict]) -> str:
+    payload = json.dumps(
+        [[m["role"], get_content_from_message(m)] for m in history] + [query],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def is_standalone(query: str, history: List[dict]) -> bool:
+    # 대화 히스토리 없이도 이해 가능한 질문인지 간단히 판단
+    if not any(m["role"] == "user" for m in history):
+        return True
+    words = _words(query)
+    if len(words) < CONFIG_DATA['contextualize']['min_standalone_words']:
+        return False
+    return not any(word in REFERENCE_WORDS or word.startswith(REFERENCE_PREFIXES) for word in words)
+
+def query_similarity(a: str, b: str) -> float:
+    # 단어 집합의 jaccard 유사도
+    a, b = set(_words(a)), set(_words(b))
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def lookup(query: str, history: List[dict]) -> Tuple[Optional[str], str]:
+    # LLM 호출 없이 standalone query를 정할 수 있으면 반환
+    # returns (standalone query or None, mode)
+    if not history:
+        return query, "none"
+    if is_standalone(query, history):
+        return query, "skipped"
+    cached = _rewrite_cache.get(get_cache_key(query, trim_history(history)))
+    if cached is not None:
+        return cached, "cached"
+    return None, "rewrite"
+
+async def rewrite(llm, query: str, history: List[dict]) -> str:
+    history = trim_history(history)
+    started = time.perf_counter()
+    rag_query = await aget_contextualize_query(llm, query, history)
+    _rewrite_cache.put(get_cache_key(query, history), rag_query)
+    log.info(f"rewrite(): {time.perf_counter() - started:.3f}s")
+    return rag_query
@@ -0,0 +1,72 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import List, Tuple
+
+import numpy as np
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, EMBEDDING_CACHE_PATH)
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# sqlite 변수 개수 제한 대응
+_QUERY_BATCH = 500
+_local = threading.local()
+
+def _get_connection() -> sqlite3.Connection:
+    # thread마다 connection 1개를 재사용
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(EMBEDDING_CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        _local.conn = conn
+    return conn
+
+def get_cache_key(text: str, model_name: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+def _lookup(keys: List[str]) -> dict:
+    conn = _get_connection()
+    found = {}
+    for i in range(0, len(keys), _QUERY_BATCH):
+        batch = keys[i:i + _QUERY_BATCH]
+        rows = conn.execute(
+            f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+        ).fetchall()
+        found.update((key, np.frombuffer(vector, dtype=np.float32).tolist()) for key, vector in rows)
+    return found
+
+def _store(items: List[Tuple[str, List[float]]]):
+    conn = _get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items],
+        )
+
+def embed_documents(embedding, texts: List[str], model_name: str = None) -> Tuple[List[List[float]], int]:
+    # chunk text + model 기준으로 캐시된 embedding은 재사용, 나머지만 embedding
+    # returns (embeddings, cache hit count)
+    if not CONFIG_DATA['index']['embedding_cache']:
+        return embedding.embed_documents(texts), 0
+
+    model_name = model_name or CONFIG_DATA['rag']['embedding_model']
+    keys = [get_cache_key(text, model_name) for text in texts]
+    cached = _lookup(list(set(keys)))
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+    if missing:
+        vectors = embedding.embed_documents(list(missing.values()))
+        computed = list(zip(missing.keys(), vectors))
+        _store(computed)
+        cached.update(computed)
+
+    hits = sum(1 for key in keys if key not in missing)
+    return [cached[key] for key in keys], hits
@@ -0,0 +1,36 @@
+import asyncio
+import logging
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# 용도별 전용 thread pool (event loop를 막는 blocking 작업만 실행)
+# - search: vector store(Chroma) & bm25 조회 (I/O)
+# - embedding: query embedding (CPU/GPU)
+# - rerank: cross-encoder 점수 계산 (CPU/GPU)
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                max_workers = CONFIG_DATA['executors'][name]
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+                _executors[name] = executor
+                log.info(f"get_executor(): {name} (max_workers={max_workers})")
+    return executor
+
+async def run(name: str, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # contextvars(요청별 timing 등)를 worker thread에서도 사용할 수 있도록 복사하여 실행
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(name), functools.partial(context.run, func, *args, **kwargs))
@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Optional
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, FILE_DB_PATH, DATA_DIR, UPLOAD_DIR)
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+LEGACY_JSON_PATH = os.path.join(DATA_DIR, 'file_index_db.json')
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS files (
+        file_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        file_size INTEGER NOT NULL,
+        content_hash TEXT,
+        docs_count INTEGER NOT NULL DEFAULT -1,
+        created_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files (content_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_files_name_size ON files (name, file_size)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    # 색인 job 상태 (여러 worker 프로세스에서 조회 & 갱신)
+    """CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        file_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        extract_images INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        stage TEXT,
+        pages_done INTEGER NOT NULL DEFAULT 0,
+        chunks_total INTEGER NOT NULL DEFAULT 0,
+        chunks_embedded INTEGER NOT NULL DEFAULT 0,
+        docs_count INTEGER NOT NULL DEFAULT -1,
+        error TEXT,
+        stats TEXT,
+        pid INTEGER NOT NULL,
+        process TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )""",
+    # 파일당 진행중인 job은 1개만 허용 (프로세스간 중복 색인 방지)
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_file ON jobs (file_id) WHERE status IN ('queued', 'running')",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at)",
+]
+# 기존 DB에 추가하는 column (table 이름, column 이름, 정의)
+MIGRATIONS = [
+    # 마지막 검색 시각 (TTL/LRU eviction 기준, 검색된 적이 없으면 created_at 기준)
+    ("files", "last_accessed", "ALTER TABLE files ADD COLUMN last_accessed REAL"),
+    # job을 실행하는 프로세스 식별자 (pid 재사용과 구분, apps.jobs._get_process_identity)
+    ("jobs", "process", "ALTER TABLE jobs ADD COLUMN process TEXT"),
+]
+COLUMNS = ("file_id", "name", "file_size", "content_hash", "docs_count")
+JOB_COLUMNS = (
+    "job_id", "file_id", "name", "extract_images", "status", "stage", "pages_done", "chunks_total",
+    "chunks_embedded", "docs_count", "error", "stats", "pid", "process", "created_at", "updated_at",
+)
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+def get_file_hash(path: str) -> Optional[str]:
+    # 업로드 파일 내용의 sha256, 파일이 없으면 None
+    sha256 = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(CONFIG_DATA['upload']['chunk_size']):
+                sha256.update(chunk)
+    except FileNotFoundError:
+        return None
+    return sha256.hexdigest()
+
+class FileIndexDB:
+    # 파일관리 DB (sqlite WAL, thread별 connection 재사용)
+    def __init__(self, path: str = FILE_DB_PATH, legacy_json_path: str = LEGACY_JSON_PATH, upload_dir: str = UPLOAD_DIR):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self.upload_dir = upload_dir
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # fork된 worker에서는 부모의 connection을 재사용하지 않음
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._init_schema(conn)
+                    self._initialized = True
+        return conn
+
+    def _init_schema(self, conn: sqlite3.Connection):
+        for statement in SCHEMA:
+            conn.execute(statement)
+        for table, column, statement in MIGRATIONS:
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                try:
+                    conn.execute(statement)
+                except sqlite3.OperationalError:
+                    # 다른 프로세스에서 먼저 추가한 경우
+                    pass
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_files_last_accessed ON files (COALESCE(last_accessed, created_at))")
+        self._migrate_legacy_json(conn)
+        self._fill_content_hash(conn)
+
+    def _migrate_legacy_json(self, conn: sqlite3.Connection):
+        # 기존 TinyDB json 파일을 1회만 이관
+        if not self.legacy_json_path or not os.path.exists(self.legacy_json_path):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_migrated'").fetchone():
+                conn.execute("COMMIT")
+                return
+            with open(self.legacy_json_path) as f:
+                data = json.load(f)
+            records = [record for table in data.values() for record in table.values()]
+            conn.executemany(
+                "INSERT OR IGNORE INTO files (file_id, name, file_size, content_hash, docs_count, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (r['file_id'], r['name'], r['file_size'], r.get('content_hash'), r.get('docs_count', -1), time.time())
+                    for r in records
+                ],
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_json_migrated', ?)", (str(time.time()),))
+            conn.execute("COMMIT")
+            log.info(f"_migrate_legacy_json(): migrated {len(records)} files from {self.legacy_json_path}")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _fill_content_hash(self, conn: sqlite3.Connection):
+        # 이전 버전(TinyDB json)에서 이관된 파일은 content_hash가 없으므로 업로드 파일에서 계산
+        # (hash 중복검사에서 빠져 같은 파일을 다시 업로드하면 재색인되는 것을 방지, 파일이 없으면 search에서 이름/크기로 확인)
+        rows = conn.execute("SELECT file_id FROM files WHERE content_hash IS NULL").fetchall()
+        hashes = [(get_file_hash(os.path.join(self.upload_dir, row["file_id"])), row["file_id"]) for row in rows]
+        hashes = [(content_hash, file_id) for content_hash, file_id in hashes if content_hash]
+        if hashes:
+            conn.executemany("UPDATE files SET content_hash = ? WHERE file_id = ? AND content_hash IS NULL", hashes)
+            log.info(f"_fill_content_hash(): {len(hashes)} files")
+
+    def _match_legacy(self, conn: sqlite3.Connection, filename: str, file_size: int, content_hash: str) -> Optional[sqlite3.Row]:
+        # content_hash가 없는 파일을 이름 & 크기로 찾고, 업로드 파일이 남아있으면 내용이 같은지 확인한 뒤 hash 기록
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM files WHERE name = ? AND file_size = ? AND content_hash IS NULL",
+            (filename, file_size),
+        ).fetchall()
+        for row in rows:
+            stored_hash = get_file_hash(os.path.join(self.upload_dir, row["file_id"]))
+            if stored_hash is not None and stored_hash != content_hash:
+                continue
+            conn.execute("UPDATE files SET content_hash = ? WHERE file_id = ? AND content_hash IS NULL", (content_hash, row["file_id"]))
+            return conn.execute(f"SELECT {', '.join(COLUMNS)} FROM files WHERE file_id = ?", (row["file_id"],)).fetchone()
+        return None
+
+    def _row_to_dict(self, row: Optional[sqlite3.Row]) -> Optional[dict]:
+        return {column: row[column] for column in COLUMNS} if row else None
+
+    def search(self, file_id=None, filename=None, file_size=None, content_hash=None) -> Optional[dict]:
+        conn = self._connect()
+        select = f"SELECT {', '.join(COLUMNS)} FROM files"
+        if file_id:
+            row = conn.execute(f"{select} WHERE file_id = ?", (file_id,)).fetchone()
+        elif content_hash:
+            row = conn.execute(f"{select} WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+            if row is None and filename and file_size:
+                row = self._match_legacy(conn, filename, file_size, content_hash)
+        elif filename and file_size:
+            row = conn.execute(f"{select} WHERE name = ? AND file_size = ? LIMIT 1", (filename, file_size)).fetchone()
+        else:
+            row = None
+        return self._row_to_dict(row)
+
+    def insert(self, file_id, filename, file_size, content_hash=None, docs_count=-1):
+        self._connect().execute(
+            "INSERT INTO files (file_id, name, file_size, content_hash, docs_count, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (file_id, filename, file_size, content_hash, docs_count, time.time()),
+        )
+
+    def update_docs_count(self, file_id, docs_count):
+        self._connect().execute("UPDATE files SET docs_count = ? WHERE file_id = ?", (docs_count, file_id))
+
+    def get_existing(self, file_ids: list) -> set:
+        if not file_ids:
+            return set()
+        rows = self._connect().execute(
+            f"SELECT file_id FROM files WHERE file_id IN ({', '.join('?' * len(file_ids))})", tuple(file_ids)
+        ).fetchall()
+        return {row["file_id"] for row in rows}
+
+    def touch(self, file_ids: list, accessed_at: float):
+        self._connect().executemany("UPDATE files SET last_accessed = ? WHERE file_id = ?", [(accessed_at, file_id) for file_id in file_ids])
+
+    def list_by_access(self) -> list:
+        # 오래 검색되지 않은 파일부터 (eviction 순서)
+        rows = self._connect().execute(
+            f"""SELECT {', '.join(COLUMNS)}, created_at, COALESCE(last_accessed, created_at) AS last_accessed
+                FROM files ORDER BY COALESCE(last_accessed, created_at)"""
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, file_id: str):
+        self._connect().execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self._connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def setdefault_meta(self, key: str, value: str) -> str:
+        # 다른 프로세스가 먼저 기록한 값이 있으면 그 값을 반환
+        conn = self._connect()
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()["value"]
+
+    def vacuum(self):
+        conn = self._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+
+    def insert_job(self, job: dict):
+        # 같은 파일의 진행중인 job이 있으면 sqlite3.IntegrityError
+        self._connect().execute(
+            f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)}) VALUES ({', '.join('?' * len(JOB_COLUMNS))})",
+            tuple(job[column] for column in JOB_COLUMNS),
+        )
+
+    def update_job(self, job_id: str, **fields):
+        self._connect().execute(
+            f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in fields)} WHERE job_id = ?",
+            (*fields.values(), job_id),
+        )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_active_jobs(self, file_id: str = None) -> list:
+        select = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status IN ({', '.join('?' * len(ACTIVE_JOB_STATUSES))})"
+        if file_id:
+            rows = self._connect().execute(f"{select} AND file_id = ?", (*ACTIVE_JOB_STATUSES, file_id)).fetchall()
+        else:
+            rows = self._connect().execute(select, ACTIVE_JOB_STATUSES).fetchall()
+        return [dict(row) for row in rows]
+
+    def prune_jobs(self, keep: int):
+        # 완료된 job은 최근 N개만 보관
+        self._connect().execute(
+            f"""DELETE FROM jobs WHERE status NOT IN ({', '.join('?' * len(ACTIVE_JOB_STATUSES))})
+                AND job_id NOT IN (SELECT job_id FROM jobs ORDER BY updated_at DESC LIMIT ?)""",
+            (*ACTIVE_JOB_STATUSES, keep),
+        )
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+_file_db = None
+_file_db_lock = threading.Lock()
+
+def get_file_db() -> FileIndexDB:
+    global _file_db
+    if _file_db is None:
+        with _file_db_lock:
+            if _file_db is None:
+                _file_db = FileIndexDB()
+    return _file_db
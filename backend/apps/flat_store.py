@@ -0,0 +1,351 @@
+import os
+import json
+import mmap
+import shutil
+import logging
+import threading
+from typing import List, Optional, Tuple, Any, Iterable
+
+import numpy as np
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, FLAT_DATA_PATH)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# collection 디렉토리 구성 (모두 행 단위로 append 되는 raw 파일 -> np.memmap 으로 복사 없이 open)
+META_FILE = "meta.json"
+IDS_FILE = "ids.txt"
+VECTORS_FILE = "vectors.f32"
+CODES_FILE = "codes.i8"
+SCALES_FILE = "scales.f32"
+NORMS_FILE = "sq_norms.f32"
+RECORDS_FILE = "records.jsonl"
+OFFSETS_FILE = "offsets.i64"
+
+QUANTIZATIONS = ("none", "int8")
+# int8 행렬을 float32로 변환하며 계산할 때의 행 block 크기 (임시 메모리 = block * dim * 4 bytes)
+BLOCK_ROWS = 4096
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # 행별 대칭 int8 양자화: vector ~= codes * scale
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _memmap(path: str, dtype, shape: tuple):
+    if shape[0] == 0 or not os.path.exists(path):
+        return None
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    if len(distances) > k:
+        top = np.argpartition(distances, k)[:k]
+    else:
+        top = np.arange(len(distances))
+    return top[np.argsort(distances[top], kind="stable")]
+
+class _View:
+    # 특정 시점(count)의 읽기 전용 snapshot, 이후 append 되어도 기존 행은 변하지 않음
+    # (upsert로 교체된 id는 새 행으로 추가하고 이전 행은 meta의 deleted에 기록, 행을 덮어쓰지 않음)
+    def __init__(self, path: str, meta: dict):
+        self.meta = meta
+        count, dim = meta["count"], meta["dim"]
+        self.count = count
+        self.deleted = np.asarray(meta.get("deleted", []), dtype=np.int64)
+        self.live_count = count - len(self.deleted)
+        self.vectors = _memmap(os.path.join(path, VECTORS_FILE), np.float32, (count, dim))
+        self.codes = _memmap(os.path.join(path, CODES_FILE), np.int8, (count, dim))
+        self.scales = _memmap(os.path.join(path, SCALES_FILE), np.float32, (count,))
+        self.sq_norms = _memmap(os.path.join(path, NORMS_FILE), np.float32, (count,))
+        self.offsets = _memmap(os.path.join(path, OFFSETS_FILE), np.int64, (count, 2))
+        self.ids = []
+        self.records = None
+        if count:
+            with open(os.path.join(path, IDS_FILE), "rb") as f:
+                self.ids = f.read().decode("utf-8").split("\n")[:count]
+            with open(os.path.join(path, RECORDS_FILE), "rb") as f:
+                self.records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._rows = None
+
+    @property
+    def rows(self) -> dict:
+        # chunk id -> 행 번호 (get(ids=...) 최초 호출시 생성), 같은 id는 마지막에 추가된 행이 유효
+        if self._rows is None:
+            self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        return self._rows
+
+    def live_rows(self) -> np.ndarray:
+        rows = np.arange(self.count)
+        return np.delete(rows, self.deleted) if len(self.deleted) else rows
+
+    def record(self, row: int) -> dict:
+        start, length = self.offsets[row]
+        return json.loads(self.records[start:start + length])
+
+    def dot(self, query: np.ndarray) -> np.ndarray:
+        if self.meta["quantization"] == "int8":
+            dots = np.empty(self.count, dtype=np.float32)
+            for start in range(0, self.count, BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, self.count)
+                dots[start:end] = self.codes[start:end].astype(np.float32) @ query
+            return dots * self.scales
+        return self.vectors @ query
+
+    def distances(self, query: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        # chroma 기본값과 같은 squared L2 거리, 교체된 행은 inf
+        if rows is None:
+            distances = self.sq_norms - 2 * self.dot(query) + query @ query
+            if len(self.deleted):
+                distances[self.deleted] = np.inf
+            return distances
+        distances = self.sq_norms[rows] - 2 * (self.vectors[rows] @ query) + query @ query
+        if len(self.deleted):
+            distances[np.isin(rows, self.deleted)] = np.inf
+        return distances
+
+class FlatCollection:
+    # chromadb Collection 중 검색/색인에서 사용하는 API(upsert, query, get, count)만 구현한 exact search 저장소
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self._lock = threading.Lock()
+        self._view = None
+
+    def _read_meta(self) -> Optional[dict]:
+        meta_path = os.path.join(self.path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, meta: dict):
+        # count & deleted가 commit 지점: meta 교체 전까지 append 된 행은 보이지 않고 교체된 행도 유효함
+        tmp_path = os.path.join(self.path, f"{META_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def get_view(self) -> Optional[_View]:
+        view = self._view
+        if view is None:
+            with self._lock:
+                if self._view is None:
+                    meta = self._read_meta()
+                    if meta is not None:
+                        self._view = _View(self.path, meta)
+                view = self._view
+        return view
+
+    def count(self) -> int:
+        view = self.get_view()
+        return view.live_count if view else 0
+
+    def disk_usage(self) -> int:
+        if not os.path.isdir(self.path):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+
+    def _new_meta(self, dim: int) -> dict:
+        config = CONFIG_DATA['vector_db']['flat']
+        quantization = config['quantization']
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"unknown quantization: {quantization}")
+        return {
+            "dim": dim,
+            "count": 0,
+            "quantization": quantization,
+            # int8에서 rescore 하려면 원본 float32 행렬도 저장
+            "vectors": quantization == "none" or config['rescore_factor'] > 0,
+        }
+
+    def _truncate(self, meta: dict):
+        # 이전 쓰기가 meta 갱신 전에 중단된 경우 commit 되지 않은 꼬리 제거
+        count, dim = meta["count"], meta["dim"]
+        sizes = {IDS_FILE: None, NORMS_FILE: count * 4, OFFSETS_FILE: count * 16}
+        if meta["vectors"]:
+            sizes[VECTORS_FILE] = count * dim * 4
+        if meta["quantization"] == "int8":
+            sizes[CODES_FILE] = count * dim
+            sizes[SCALES_FILE] = count * 4
+        if count:
+            # 행은 append만 하지만 이전 버전에서 덮어쓴 행은 나중에 append 된 record를 가리키므로 전체 offset 중 끝 위치
+            offsets = np.fromfile(os.path.join(self.path, OFFSETS_FILE), dtype=np.int64, count=count * 2).reshape(-1, 2)
+            sizes[RECORDS_FILE] = int((offsets.sum(axis=1) + 1).max())
+            with open(os.path.join(self.path, IDS_FILE), "rb") as f:
+                ids = f.read().split(b"\n")[:count]
+            sizes[IDS_FILE] = sum(len(chunk_id) for chunk_id in ids) + count
+        else:
+            sizes[RECORDS_FILE] = 0
+            sizes[IDS_FILE] = 0
+        for filename, size in sizes.items():
+            file_path = os.path.join(self.path, filename)
+            with open(file_path, "ab") as f:
+                f.truncate(size)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str] = None, metadatas: List[dict] = None):
+        if not ids:
+            return
+        if len(set(ids)) != len(ids):
+            raise ValueError("duplicate ids in upsert")
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        records = [
+            json.dumps({"document": document, "metadata": metadata}, ensure_ascii=False).encode("utf-8")
+            for document, metadata in zip(documents, metadatas)
+        ]
+
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            meta = self._read_meta()
+            if meta is None:
+                meta = self._new_meta(vectors.shape[1])
+            elif meta["dim"] != vectors.shape[1]:
+                raise ValueError(f"embedding dimension {vectors.shape[1]} does not match collection dimension {meta['dim']}")
+            self._truncate(meta)
+
+            view = self._view if self._view is not None and self._view.meta == meta else _View(self.path, meta)
+            # 기존 id의 행은 그대로 두고 (다른 프로세스가 mmap으로 읽는 중일 수 있음) 새 행을 추가한 뒤 meta에서 교체
+            replaced = [view.rows[chunk_id] for chunk_id in ids if chunk_id in view.rows]
+
+            records_path = os.path.join(self.path, RECORDS_FILE)
+            position = os.path.getsize(records_path)
+            offsets = np.zeros((len(ids), 2), dtype=np.int64)
+            with open(records_path, "ab") as f:
+                for i, record in enumerate(records):
+                    f.write(record + b"\n")
+                    offsets[i] = (position, len(record))
+                    position += len(record) + 1
+
+            columns = {NORMS_FILE: np.einsum("ij,ij->i", vectors, vectors).astype(np.float32), OFFSETS_FILE: offsets}
+            if meta["vectors"]:
+                columns[VECTORS_FILE] = vectors
+            if meta["quantization"] == "int8":
+                columns[CODES_FILE], columns[SCALES_FILE] = quantize(vectors)
+
+            for filename, values in columns.items():
+                with open(os.path.join(self.path, filename), "ab") as f:
+                    f.write(values.tobytes())
+            with open(os.path.join(self.path, IDS_FILE), "ab") as f:
+                f.write("".join(f"{chunk_id}\n" for chunk_id in ids).encode("utf-8"))
+
+            meta = {**meta, "count": meta["count"] + len(ids)}
+            if replaced:
+                meta["deleted"] = sorted(meta.get("deleted", []) + replaced)
+            self._write_meta(meta)
+            self._view = None
+
+    add = upsert
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, include: Iterable[str] = ("metadatas", "documents", "distances"), **kwargs) -> dict:
+        include = set(include)
+        result = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+        view = self.get_view()
+        rescore_factor = CONFIG_DATA['vector_db']['flat']['rescore_factor']
+        for query_embedding in query_embeddings:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            if view is not None:
+                # 교체된 행(inf)이 결과에 포함되지 않도록 유효한 행 수 이내로 제한
+                n_results = min(n_results, view.live_count)
+            if view is None or view.live_count == 0:
+                rows, distances = np.asarray([], dtype=np.int64), np.asarray([], dtype=np.float32)
+            elif view.meta["quantization"] == "int8" and view.vectors is not None and rescore_factor > 0:
+                # int8 근사 거리로 후보를 넓게 뽑은 후 float32 원본으로 재계산 (후보 행만 page-in)
+                candidates = np.sort(_top_k(view.distances(query), n_results * rescore_factor))
+                exact = view.distances(query, candidates)
+                top = _top_k(exact, n_results)
+                rows, distances = candidates[top], exact[top]
+            else:
+                all_distances = view.distances(query)
+                rows = _top_k(all_distances, n_results)
+                distances = all_distances[rows]
+            result["ids"].append([view.ids[row] for row in rows] if len(rows) else [])
+            result["distances"].append(distances.tolist())
+            records = [view.record(row) for row in rows] if include & {"documents", "metadatas"} else []
+            result["documents"].append([record["document"] for record in records])
+            result["metadatas"].append([record["metadata"] for record in records])
+        for key in ("distances", "documents", "metadatas"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def get(self, ids: List[str] = None, include: Iterable[str] = ("metadatas", "documents"), **kwargs) -> dict:
+        include = set(include)
+        view = self.get_view()
+        if view is None:
+            rows = []
+        elif ids is None:
+            rows = view.live_rows().tolist()
+        else:
+            rows = [view.rows[chunk_id] for chunk_id in ids if chunk_id in view.rows]
+        records = [view.record(row) for row in rows] if include & {"documents", "metadatas"} else []
+        embeddings = None
+        if "embeddings" in include:
+            # 색인 전(view 없음)이거나 빈 collection이면 빈 결과
+            embeddings = view.vectors[rows].tolist() if rows and view.vectors is not None else []
+        return {
+            "ids": [view.ids[row] for row in rows],
+            "documents": [record["document"] for record in records] if "documents" in include else None,
+            "metadatas": [record["metadata"] for record in records] if "metadatas" in include else None,
+            "embeddings": embeddings,
+        }
+
+def get_collection_path(collection_name: str) -> str:
+    return os.path.join(FLAT_DATA_PATH, collection_name)
+
+def get_collection(collection_name: str) -> FlatCollection:
+    return FlatCollection(collection_name, get_collection_path(collection_name))
+
+def delete_collection(collection_name: str):
+    shutil.rmtree(get_collection_path(collection_name), ignore_errors=True)
+
+def rename_collection(collection_name: str, new_name: str):
+    # 디렉토리 rename (이미 열린 view의 mmap은 이전 파일을 계속 사용), 없으면 FileNotFoundError
+    os.rename(get_collection_path(collection_name), get_collection_path(new_name))
+
+class FlatVectorStore(VectorStore):
+    # langchain VectorStore 인터페이스 (utils.get_vector_store 용)
+    def __init__(self, collection: FlatCollection, embedding_function: Embeddings):
+        self.collection = collection
+        self.embedding_function = embedding_function
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = ids or [f"{self.collection.name}_{self.collection.count() + i}" for i in range(len(texts))]
+        self.collection.upsert(
+            ids=ids,
+            embeddings=self.embedding_function.embed_documents(texts),
+            documents=texts,
+            metadatas=metadatas,
+        )
+        return ids
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        result = self.collection.query(query_embeddings=[embedding], n_results=k)
+        return [
+            (Document(id=chunk_id, page_content=document, metadata=metadata or {}), distance)
+            for chunk_id, document, metadata, distance in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]
+            )
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k=k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, collection_name: str = "langchain", **kwargs: Any) -> "FlatVectorStore":
+        store = cls(get_collection(collection_name), embedding)
+        store.add_texts(texts, metadatas=metadatas)
+        return store
@@ -0,0 +1,75 @@
+import logging
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from config import (GLOBAL_LOG_LEVEL)
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+METHODS = ("rrf", "score")
+
+def normalize_scores(scores: np.ndarray) -> np.ndarray:
+    # min-max 정규화 (retriever마다 점수 scale이 다르므로)
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+def encode_ids(id_lists: Sequence[Sequence[str]]) -> Tuple[List[np.ndarray], List[str]]:
+    # chunk id -> 정수 code (처음 나온 순서), 문자열 정렬(np.unique) 없이 1회 순회
+    codes = {}
+    encoded = []
+    for ids in id_lists:
+        ids = ids.tolist() if isinstance(ids, np.ndarray) else ids
+        encoded.append(np.fromiter((codes.setdefault(chunk_id, len(codes)) for chunk_id in ids), dtype=np.int64, count=len(ids)))
+    return encoded, list(codes)
+
+def fuse(
+    id_lists: Sequence[Sequence[str]],
+    score_lists: Sequence[np.ndarray],
+    weights: Sequence[float],
+    method: str = "rrf",
+    c: int = 60,
+    limit: int = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # retriever별 (chunk id, 점수 내림차순) 결과를 하나의 순위로 결합
+    # - rrf: weight / (rank + c) 의 합
+    # - score: retriever별로 정규화한 점수 * weight 의 합
+    # returns (chunk ids, fused scores) 점수 내림차순, 동점은 먼저 나온 순서
+    if method not in METHODS:
+        raise ValueError(f"unknown fusion method: {method}")
+
+    # weight가 0인 retriever는 순위에 영향이 없도록 제외
+    inputs = [(ids, scores, weight) for ids, scores, weight in zip(id_lists, score_lists, weights) if weight]
+    encoded, unique_ids = encode_ids([ids for ids, _, _ in inputs])
+    if not unique_ids:
+        return np.asarray([], dtype=object), np.asarray([], dtype=np.float64)
+
+    totals = np.zeros(len(unique_ids), dtype=np.float64)
+    for codes, (ids, scores, weight) in zip(encoded, inputs):
+        if method == "rrf":
+            fused = weight / (np.arange(1, len(codes) + 1, dtype=np.float64) + c)
+        else:
+            fused = weight * normalize_scores(scores)
+        # 한 retriever 안에서는 chunk id가 중복되지 않음
+        totals[codes] += fused
+
+    # code가 처음 나온 순서이므로 stable sort로 동점시 먼저 나온 chunk가 앞
+    order = np.argsort(-totals, kind="stable")
+    if limit:
+        order = order[:limit]
+    return np.asarray([unique_ids[i] for i in order.tolist()], dtype=object), totals[order]
+
+def recall_at_k(ranked_ids: List[Sequence[str]], relevant_ids: List[Sequence[str]], k: int) -> float:
+    # 질의별 정답 chunk 중 top-k 안에 포함된 비율의 평균
+    recalls = []
+    for ranked, relevant in zip(ranked_ids, relevant_ids):
+        relevant = set(relevant)
+        if relevant:
+            recalls.append(len(relevant & set(list(ranked)[:k])) / len(relevant))
+    return float(np.mean(recalls)) if recalls else 0.0
@@ -1,39 +1,275 @@
 import os
+import time
+import queue
 import logging
+import threading
+import multiprocessing
 import urllib.parse
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-from typing import List
-from config import (GLOBAL_LOG_LEVEL, UPLOAD_DIR, CONFIG_DATA, CHROMA_DATA_PATH)
-from apps.utils import load_embedding
-from langchain_community.document_loaders import PyPDFLoader
+import pypdf
+from typing import List, Iterable, Iterator
+from config import (GLOBAL_LOG_LEVEL, UPLOAD_DIR, CONFIG_DATA)
+from apps import model_registry
+from apps.utils import create_staging_collection, replace_collection, discard_previous_collection, delete_collection, process_lock
+from apps import bm25
+from apps import chunking
+from apps import embedding_cache
+from apps import metrics
+from apps.cache import LRUCache
+from apps.answer_cache import answer_cache
 from langchain_core.documents import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
 
 # log setting
 log = logging.getLogger(__name__)
 log.setLevel(GLOBAL_LOG_LEVEL)
 
 def get_loader(file_id:str, extract_images:bool=False):
+    from langchain_community.document_loaders import PyPDFLoader
     file_path = os.path.join(UPLOAD_DIR, file_id)
     return PyPDFLoader(file_path, extract_images=extract_images)
 
-def get_split_docs(data: List[Document], filename:str):
-    text_splitter = RecursiveCharacterTextSplitter(
+def get_text_splitter():
+    # index.splitter: "token" (임베딩 모델 tokenizer 기준) | "character" (기존 글자수 기준)
+    if CONFIG_DATA['index']['splitter'] == "token":
+        return chunking.get_token_text_splitter()
+
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
         chunk_size=CONFIG_DATA['index']['chunk_size'],
         chunk_overlap=CONFIG_DATA['index']['chunk_overlap'],
         add_start_index=True,
     )
+
+def get_split_docs(data: List[Document], filename:str=None, text_splitter=None):
+    text_splitter = text_splitter or get_text_splitter()
     docs = text_splitter.split_documents(data)
-    # insert filename to split_docs
-    [setattr(doc, 'page_content', f"{urllib.parse.unquote(filename)}\n\n{doc.page_content}") for doc in docs]
+    # 파일명은 chunk 본문이 아닌 metadata로 저장 (embedding & bm25 대상에서 제외, prompt 구성시 파일당 1번만 추가)
+    if filename:
+        filename = urllib.parse.unquote(filename)
+        for doc in docs:
+            doc.metadata["filename"] = filename
 
     return docs
 
-def store_docs_in_vector_db(docs:List[Document], collection_name:str):
-    Chroma.from_documents(
-        documents=docs, 
-        embedding=load_embedding(),
-        collection_name=collection_name,
-        persist_directory=CHROMA_DATA_PATH
-    )
\ No newline at end of file
+def get_chunk_ids(collection_name:str, count:int, start:int=0):
+    # chunk id를 고정해야 bm25 index에서 vector store의 chunk를 찾을 수 있음
+    return [f"{collection_name}_{i}" for i in range(start, start + count)]
+
+def _report(progress, stage:str=None, **counters):
+    if progress:
+        progress(stage, **counters)
+
+class PipelineStats:
+    # stage별 처리시간 & 처리량
+    STAGES = ("parsing", "splitting", "embedding", "persisting")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = {stage: 0.0 for stage in self.STAGES}
+        self.pages = 0
+        self.chunks = 0
+        self.cache_hits = 0
+
+    def add(self, stage:str, seconds:float):
+        self.seconds[stage] += seconds
+        metrics.observe(f"indexing_{stage}", seconds)
+
+    def to_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": round(self.cache_hits / self.chunks, 4) if self.chunks else 0.0,
+            "elapsed": round(elapsed, 3),
+            "pages_per_sec": round(self.pages / elapsed, 2) if elapsed else 0.0,
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.seconds.items()},
+            # stage 단독 처리량 (해당 stage에서 소비한 시간 기준)
+            "stage_pages_per_sec": {
+                stage: round(self.pages / seconds, 2) if seconds else None
+                for stage, seconds in self.seconds.items()
+            },
+        }
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    # PDF parsing은 CPU 작업이라 process pool에서 실행 (프로세스당 1개 공유)
+    # 색인 thread, torch/tokenizer & batcher thread가 실행 중인 프로세스를 fork하면 deadlock이 생길 수 있으므로 forkserver 사용
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=CONFIG_DATA['index']['parse_workers'],
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+    return _parse_pool
+
+# process pool worker별 PdfReader 재사용 (PdfReader는 열때마다 전체 page tree를 읽으므로 page 수에 비례)
+_reader_cache = LRUCache(maxsize=2)
+
+def _get_reader(file_path:str) -> pypdf.PdfReader:
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    reader = _reader_cache.get(key)
+    if reader is None:
+        reader = pypdf.PdfReader(file_path)
+        _reader_cache.put(key, reader)
+    return reader
+
+def _load_pages(file_path:str, start:int, end:int, extract_images:bool=False):
+    # process pool worker: [start, end) page를 PyPDFLoader와 같은 형태로 반환
+    from langchain_community.document_loaders.parsers.pdf import PyPDFParser
+    started = time.perf_counter()
+    reader = _get_reader(file_path)
+    parser = PyPDFParser(extract_images=extract_images)
+    pages = []
+    for page_number in range(start, end):
+        page = reader.pages[page_number]
+        pages.append(Document(
+            page_content=page.extract_text() + parser._extract_images_from_page(page),
+            metadata={"source": file_path, "page": page_number},
+        ))
+    return pages, time.perf_counter() - started
+
+def iter_pages(file_id:str, extract_images:bool=False, stats:PipelineStats=None) -> Iterator[Document]:
+    file_path = os.path.join(UPLOAD_DIR, file_id)
+    page_count = len(pypdf.PdfReader(file_path).pages)
+    step = CONFIG_DATA['index']['pages_per_task']
+    ranges = deque((start, min(start + step, page_count)) for start in range(0, page_count, step))
+
+    if CONFIG_DATA['index']['parse_workers'] <= 1:
+        for start, end in ranges:
+            pages, seconds = _load_pages(file_path, start, end, extract_images)
+            if stats:
+                stats.add("parsing", seconds)
+            yield from pages
+        return
+
+    # 동시에 처리중인 task 수를 제한하여 메모리 사용량을 PDF 크기와 무관하게 유지
+    pool = get_parse_pool()
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < CONFIG_DATA['index']['queue_size']:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(_load_pages, file_path, start, end, extract_images))
+            pages, seconds = in_flight.popleft().result()
+            if stats:
+                stats.add("parsing", seconds)
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+def iter_split_docs(pages:Iterable[Document], filename:str, stats:PipelineStats=None, progress=None) -> Iterator[Document]:
+    text_splitter = get_text_splitter()
+    # token splitter는 여러 page를 1번에 tokenize
+    for batch in _batched(pages, CONFIG_DATA['index']['pages_per_task']):
+        started = time.perf_counter()
+        docs = get_split_docs(batch, filename, text_splitter=text_splitter)
+        if stats:
+            stats.add("splitting", time.perf_counter() - started)
+            stats.pages += len(batch)
+            _report(progress, pages_done=stats.pages)
+        yield from docs
+
+def _batched(iterable:Iterable, size:int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def _persist_worker(collection, batches:queue.Queue, errors:list, stats:PipelineStats):
+    while (batch := batches.get()) is not None:
+        if errors:
+            # 에러 이후에는 producer가 막히지 않도록 queue만 비움
+            continue
+        try:
+            started = time.perf_counter()
+            collection.upsert(**batch)
+            stats.add("persisting", time.perf_counter() - started)
+        except Exception as e:
+            errors.append(e)
+
+def write_docs_to_vector_db(docs:Iterable[Document], collection_name:str, progress=None, stats:PipelineStats=None) -> int:
+    # 같은 collection을 여러 worker 프로세스에서 동시에 재색인하지 않도록 파일 lock
+    with process_lock(f"collection_{collection_name}"):
+        return _write_docs_to_vector_db(docs, collection_name, progress=progress, stats=stats)
+
+def _write_docs_to_vector_db(docs:Iterable[Document], collection_name:str, progress=None, stats:PipelineStats=None) -> int:
+    # docs를 batch 단위로 embedding -> bulk insert (embedding과 insert는 별도 thread에서 겹쳐서 실행)
+    stats = stats or PipelineStats()
+    embedding = model_registry.get_embedding()
+    builder = bm25.BM25IndexBuilder()
+
+    # 새 chunk는 임시 collection에 기록하고 색인이 끝난 뒤 교체 (재색인 중에도 기존 collection & bm25 index로 검색)
+    collection = create_staging_collection(collection_name)
+    batches = queue.Queue(maxsize=CONFIG_DATA['index']['queue_size'])
+    errors = []
+    persist_thread = threading.Thread(target=_persist_worker, args=(collection, batches, errors, stats), daemon=True)
+    persist_thread.start()
+
+    try:
+        try:
+            for batch in _batched(docs, CONFIG_DATA['index']['embed_batch_size']):
+                if errors:
+                    break
+                _report(progress, "embedding", chunks_total=stats.chunks + len(batch))
+                ids = get_chunk_ids(collection_name, len(batch), start=stats.chunks)
+                texts = [doc.page_content for doc in batch]
+
+                started = time.perf_counter()
+                embeddings, hits = embedding_cache.embed_documents(embedding, texts)
+                stats.cache_hits += hits
+                stats.add("embedding", time.perf_counter() - started)
+                metrics.count_chunks_embedded(len(batch), hits)
+
+                batches.put({
+                    "ids": ids,
+                    "embeddings": embeddings,
+                    "documents": texts,
+                    "metadatas": [doc.metadata for doc in batch],
+                })
+                for chunk_id, text in zip(ids, texts):
+                    builder.add(chunk_id, text)
+                stats.chunks += len(batch)
+                _report(progress, chunks_embedded=stats.chunks, stats=stats.to_dict())
+        finally:
+            batches.put(None)
+            _report(progress, "persisting")
+            persist_thread.join()
+        if errors:
+            raise errors[0]
+    except BaseException:
+        # 실패한 경우 임시 collection만 삭제하고 기존 collection & bm25 index를 그대로 사용
+        delete_collection(collection.name)
+        raise
+
+    # build sparse index
+    sparse_index = builder.build()
+    replace_collection(collection_name)
+    # bm25 index 교체로 다른 프로세스도 collection handle을 새로 생성하므로 이후 이전 collection 삭제
+    bm25.save_index(collection_name, sparse_index)
+    discard_previous_collection(collection_name)
+    answer_cache.invalidate(collection_name)
+    _report(progress, stats=stats.to_dict())
+
+    return stats.chunks
+
+def store_docs_in_vector_db(docs:List[Document], collection_name:str, progress=None):
+    return write_docs_to_vector_db(docs, collection_name, progress=progress)
+
+def index_file(file_id:str, filename:str, extract_images:bool=False, progress=None) -> int:
+    # parsing(process pool) -> splitting -> embedding -> persisting 을 page 단위로 흘려보내는 pipeline
+    stats = PipelineStats()
+    _report(progress, "parsing")
+    pages = iter_pages(file_id, extract_images=extract_images, stats=stats)
+    docs = iter_split_docs(pages, filename, stats=stats, progress=progress)
+    docs_count = write_docs_to_vector_db(docs, collection_name=file_id, progress=progress, stats=stats)
+    log.info(f"index_file(): {file_id} {stats.to_dict()}")
+
+    return docs_count
@@ -0,0 +1,301 @@
+# 디렉토리 단위 PDF 일괄 색인 (서버 없이 실행, 파일마다 checkpoint 기록 -> 중단 후 재실행시 이어서 진행)
+# usage: cd backend && python -m apps.ingest /path/to/pdfs
+# --workers > 0 (process pool)은 flat backend용: Chroma는 여러 프로세스의 동시 쓰기를 지원하지 않음
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, Optional
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, UPLOAD_DIR, CHECKPOINT_DIR)
+from apps import index
+from apps import upload
+from apps.utils import search_file_db, insert_file_db, update_index_complete, is_flat_backend, get_chroma_client
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+def scan_pdfs(root: str) -> Iterator[str]:
+    # 하위 디렉토리까지 경로 순으로 탐색 (재실행시에도 같은 순서)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(".pdf"):
+                yield os.path.join(dirpath, filename)
+
+def get_file_hash(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CONFIG_DATA['upload']['chunk_size']):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def get_checkpoint_path(root: str) -> str:
+    name = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CHECKPOINT_DIR, f"ingest_{name}.jsonl")
+
+class Checkpoint:
+    # 처리가 끝난 파일마다 1줄씩 append (path 기준 마지막 기록이 유효)
+    def __init__(self, path: str):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 기록 도중 중단된 마지막 줄
+                        continue
+                    self.records[record["path"]] = record
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_finished(self, path: str, stat: os.stat_result, retry_failed: bool) -> bool:
+        record = self.records.get(path)
+        if record is None or (record["size"], record["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            return False
+        return record["status"] != "failed" or not retry_failed
+
+    def add(self, path: str, stat: os.stat_result, status: str, **fields):
+        record = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "status": status, **fields}
+        self.records[path] = record
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+class IngestReport:
+    def __init__(self, files: int):
+        self.started = time.perf_counter()
+        self.files = files
+        self.indexed = 0
+        self.skipped = {"checkpoint": 0, "previously_failed": 0, "indexed": 0, "duplicate": 0}
+        self.failed = []
+        self.pages = 0
+        self.chunks = 0
+
+    def to_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "files": self.files,
+            "indexed": self.indexed,
+            "skipped": self.skipped,
+            "failed": len(self.failed),
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "elapsed": round(elapsed, 3),
+            "pages_per_sec": round(self.pages / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_sec": round(self.chunks / elapsed, 2) if elapsed else 0.0,
+            "failures": self.failed,
+        }
+
+def _init_worker(threads: int, worker_init=None):
+    # 파일 단위로 병렬 처리하므로 worker 안에서는 page parsing process pool을 띄우지 않음
+    CONFIG_DATA['index']['parse_workers'] = 1
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if worker_init is not None:
+        worker_init()
+
+def _index_file(file_id: str, name: str, extract_images: bool) -> dict:
+    result = {}
+    def progress(stage=None, stats=None, **counters):
+        if stats:
+            result.update(stats)
+    started = time.perf_counter()
+    docs_count = index.index_file(file_id=file_id, filename=name, extract_images=extract_images, progress=progress)
+    return {"docs_count": docs_count, "pages": result.get("pages", 0), "seconds": round(time.perf_counter() - started, 3)}
+
+def _register(path: str, content_hash: str, pending: set) -> dict:
+    # 색인 대상이면 file info, 건너뛸 파일이면 {"skipped": 사유}
+    if content_hash in pending:
+        return {"skipped": "duplicate"}
+    file_info = search_file_db(filename=os.path.basename(path), file_size=os.path.getsize(path), content_hash=content_hash)
+    if file_info and file_info["docs_count"] >= 0:
+        return {"skipped": "indexed", **file_info}
+
+    if file_info is None:
+        file_id = None
+    else:
+        # 등록만 되고 색인되지 않은 파일 (색인 도중 중단 등)은 같은 file_id로 다시 색인
+        file_id = file_info["file_id"]
+        if os.path.exists(os.path.join(UPLOAD_DIR, file_id)):
+            return file_info
+
+    with open(path, "rb") as f:
+        temp_path, file_size, content_hash = upload.stream_to_temp(f, upload_dir=UPLOAD_DIR)
+    file_id = file_id or str(uuid.uuid4())
+    upload.commit_upload(temp_path, file_id, upload_dir=UPLOAD_DIR)
+    if file_info is None:
+        insert_file_db(file_id, os.path.basename(path), file_size, content_hash)
+    return {"file_id": file_id, "name": os.path.basename(path), "file_size": file_size, "content_hash": content_hash}
+
+def _run_inline(func, *args) -> Future:
+    # workers=0: 현재 프로세스에서 순차 실행
+    future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def get_cpu_count() -> int:
+    # container 등에서 실제로 사용 가능한 CPU 수
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _create_pool(workers: int, worker_init=None) -> Optional[ProcessPoolExecutor]:
+    if workers <= 0:
+        return None
+    # torch thread가 worker 수만큼 CPU를 나눠 쓰도록 제한
+    threads = max(1, get_cpu_count() // workers)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads, worker_init),
+    )
+
+def ingest(root: str, workers: int = None, checkpoint_path: str = None, extract_images: bool = False,
+           retry_failed: bool = False, worker_init=None, progress=None) -> dict:
+    workers = CONFIG_DATA['ingest']['workers'] if workers is None else workers
+    checkpoint = Checkpoint(checkpoint_path or get_checkpoint_path(root))
+    paths = list(scan_pdfs(root))
+    report = IngestReport(len(paths))
+    if not is_flat_backend():
+        if workers > 0:
+            log.warning(f"ingest(): {workers} worker processes will write to the same Chroma sqlite, which Chroma does not support; use --workers 0 or the flat backend")
+        # chroma DB 생성 & migration은 worker 시작 전에 1번만 실행 (동시에 실행되면 실패함)
+        get_chroma_client()
+    pool = _create_pool(workers, worker_init)
+    # 처리중인 파일 수를 제한하여 checkpoint가 진행상황을 따라가도록 함
+    max_in_flight = workers * 2 if pool else 1
+    in_flight = {}
+    pending = set()
+
+    def finish(future: Future):
+        path, stat, file_info = in_flight.pop(future)
+        pending.discard(file_info["content_hash"])
+        try:
+            result = future.result()
+        except Exception as e:
+            log.exception(f"ingest(): {path} failed: {e}")
+            report.failed.append({"path": path, "error": str(e)})
+            checkpoint.add(path, stat, "failed", file_id=file_info["file_id"], error=str(e))
+        else:
+            update_index_complete(file_info["file_id"], result["docs_count"])
+            report.indexed += 1
+            report.pages += result["pages"]
+            report.chunks += result["docs_count"]
+            checkpoint.add(path, stat, "done", file_id=file_info["file_id"], content_hash=file_info["content_hash"], **result)
+        if progress:
+            progress(path, checkpoint.records[path])
+
+    def drain():
+        nonlocal pool
+        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        broken = False
+        for future in done:
+            if isinstance(future.exception(), BrokenProcessPool):
+                broken = True
+                continue
+            finish(future)
+        if broken:
+            # worker가 비정상 종료(OOM 등)되면 처리중이던 파일은 모두 실패로 기록하고 pool을 다시 생성
+            log.error("ingest(): worker process died, restarting the pool")
+            for future in list(in_flight):
+                path, stat, file_info = in_flight.pop(future)
+                pending.discard(file_info["content_hash"])
+                report.failed.append({"path": path, "error": "worker process died"})
+                checkpoint.add(path, stat, "failed", file_id=file_info["file_id"], error="worker process died")
+            pool.shutdown(cancel_futures=True)
+            pool = _create_pool(workers, worker_init)
+
+    try:
+        for path in paths:
+            relative_path = os.path.relpath(path, root)
+            stat = os.stat(path)
+            if checkpoint.is_finished(relative_path, stat, retry_failed):
+                # 이전 실행에서 실패한 파일은 --retry-failed 없이는 건너뛰고 따로 집계
+                previously_failed = checkpoint.records[relative_path]["status"] == "failed"
+                report.skipped["previously_failed" if previously_failed else "checkpoint"] += 1
+                continue
+            try:
+                content_hash = get_file_hash(path)
+                file_info = _register(path, content_hash, pending)
+            except Exception as e:
+                log.exception(f"ingest(): {relative_path} failed: {e}")
+                report.failed.append({"path": relative_path, "error": str(e)})
+                checkpoint.add(relative_path, stat, "failed", error=str(e))
+                if progress:
+                    progress(relative_path, checkpoint.records[relative_path])
+                continue
+            if "skipped" in file_info:
+                report.skipped[file_info["skipped"]] += 1
+                checkpoint.add(relative_path, stat, "skipped", reason=file_info["skipped"], file_id=file_info.get("file_id"))
+                continue
+
+            pending.add(content_hash)
+            submit = pool.submit if pool else _run_inline
+            future = submit(_index_file, file_info["file_id"], file_info["name"], extract_images)
+            in_flight[future] = (relative_path, stat, file_info)
+            if len(in_flight) >= max_in_flight:
+                drain()
+        while in_flight:
+            drain()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        checkpoint.close()
+
+    result = report.to_dict()
+    log.info(f"ingest(): {root} {result}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 디렉토리 일괄 색인")
+    parser.add_argument("root", help="PDF 파일을 찾을 디렉토리 (하위 디렉토리 포함)")
+    parser.add_argument("--workers", type=int, default=None, help="색인 process 수 (0이면 현재 프로세스에서 실행)")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint 파일 경로 (기본값: data/checkpoints/ingest_<root hash>.jsonl)")
+    parser.add_argument("--extract-images", action="store_true")
+    parser.add_argument("--retry-failed", action="store_true", help="이전 실행에서 실패한 파일도 다시 색인")
+    parser.add_argument("--report", default=None, help="결과(JSON) 저장 경로")
+    args = parser.parse_args()
+
+    def progress(path, record):
+        detail = record.get("error") or f"{record.get('pages', 0)} pages, {record.get('docs_count', 0)} chunks, {record.get('seconds', 0)}s"
+        print(f"{record['status']}: {path} ({detail})", file=sys.stderr)
+
+    result = ingest(
+        args.root,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        extract_images=args.extract_images,
+        retry_failed=args.retry_failed,
+        progress=progress,
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+    print(f"files: {result['files']}, indexed: {result['indexed']}, skipped: {result['skipped']}, failed: {result['failed']}")
+    print(f"pages: {result['pages']} ({result['pages_per_sec']} pages/s), chunks: {result['chunks']} ({result['chunks_per_sec']} chunks/s), elapsed: {result['elapsed']}s")
+    for failure in result["failures"]:
+        print(f"FAILED {failure['path']}: {failure['error']}")
+    sys.exit(1 if result["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+from apps import index
+from apps.file_db import get_file_db
+from apps.utils import update_index_complete
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# 진행상황(page, chunk 수)은 최대 이 간격으로만 DB에 기록 (status/stage 변경은 바로 기록)
+PROGRESS_INTERVAL = 0.5
+
+class JobQueueFull(Exception):
+    pass
+
+class IndexJob:
+    # job 상태는 파일관리 DB(jobs table)에 저장하여 모든 worker 프로세스에서 조회
+    def __init__(self, file_id: str, name: str, extract_images: bool):
+        self.job_id = str(uuid.uuid4())
+        self.file_id = file_id
+        self.name = name
+        self.extract_images = extract_images
+        # queued -> running -> done | failed
+        self.status = "queued"
+        # parsing -> splitting -> embedding -> persisting
+        self.stage = None
+        self.pages_done = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.docs_count = -1
+        self.error = None
+        self.stats = None
+        self.pid = os.getpid()
+        self.process = _get_process_identity(self.pid)
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._saved_at = 0.0
+
+    @classmethod
+    def from_row(cls, row: dict) -> "IndexJob":
+        job = cls.__new__(cls)
+        job.__dict__.update(row)
+        job.extract_images = bool(row["extract_images"])
+        job.stats = json.loads(row["stats"]) if row["stats"] else None
+        job._saved_at = row["updated_at"]
+        return job
+
+    def to_row(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "file_id": self.file_id,
+            "name": self.name,
+            "extract_images": int(self.extract_images),
+            "status": self.status,
+            "stage": self.stage,
+            "pages_done": self.pages_done,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "docs_count": self.docs_count,
+            "error": self.error,
+            "stats": json.dumps(self.stats) if self.stats is not None else None,
+            "pid": self.pid,
+            "process": self.process,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    def save(self):
+        row = self.to_row()
+        get_file_db().update_job(self.job_id, **{key: value for key, value in row.items() if key != "job_id"})
+        self._saved_at = self.updated_at
+
+    def update_progress(self, stage: str = None, **counters):
+        changed = (stage and stage != self.stage) or ("status" in counters and counters["status"] != self.status)
+        if stage:
+            self.stage = stage
+        for key, value in counters.items():
+            setattr(self, key, value)
+        self.updated_at = time.time()
+        if changed or self.updated_at - self._saved_at >= PROGRESS_INTERVAL:
+            self.save()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "file_id": self.file_id,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "pages_done": self.pages_done,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "docs_count": self.docs_count,
+            "error": self.error,
+            "stats": self.stats,
+            "elapsed": round(self.updated_at - self.created_at, 2),
+        }
+
+_executor = ThreadPoolExecutor(max_workers=CONFIG_DATA['indexing']['max_workers'], thread_name_prefix="indexing")
+_lock = threading.Lock()
+
+def _get_process_identity(pid: int) -> Optional[str]:
+    # pid는 재사용되므로 (컨테이너 재시작시 같은 pid 등) boot id + 프로세스 시작 시각으로 식별
+    # /proc이 없는 OS에서는 None (pid만으로 판단)
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot_id = f.read().strip()
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # 2번째 field(comm)에 공백이 있을 수 있으므로 ')' 이후부터 split, 22번째 field가 starttime
+    start_time = stat[stat.rindex(")") + 1:].split()[19]
+    return f"{boot_id}:{pid}:{start_time}"
+
+def _is_alive(pid: int, process: Optional[str]) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    current = _get_process_identity(pid)
+    # 같은 pid라도 시작 시각이 다르면 다른 프로세스 (식별자가 없는 이전 버전의 job도 종료된 것으로 처리)
+    return current is None or current == process
+
+def _fail_orphaned_jobs(active_jobs: list) -> list:
+    # 종료된 worker 프로세스의 job은 실패로 기록 (같은 파일을 다시 색인할 수 있도록)
+    alive = []
+    for row in active_jobs:
+        if _is_alive(row["pid"], row["process"]):
+            alive.append(row)
+        else:
+            log.warning(f"_fail_orphaned_jobs(): {row['job_id']} (pid {row['pid']}) exited while {row['status']}")
+            get_file_db().update_job(row["job_id"], status="failed", error="indexing process exited", updated_at=time.time())
+    return alive
+
+def _run_job(job: IndexJob):
+    job.update_progress(status="running")
+    try:
+        docs_count = index.index_file(
+            file_id=job.file_id,
+            filename=job.name,
+            extract_images=job.extract_images,
+            progress=job.update_progress,
+        )
+        # 색인이 끝난 경우에만 docs_count 기록
+        update_index_complete(job.file_id, docs_count)
+        job.update_progress(status="done", docs_count=docs_count)
+        log.info(f"_run_job(): {job.to_dict()}")
+    except Exception as e:
+        log.exception(e)
+        job.update_progress(status="failed", error=str(e))
+
+def submit_index_job(file_id: str, name: str, extract_images: bool = False) -> IndexJob:
+    file_db = get_file_db()
+    with _lock:
+        active_jobs = _fail_orphaned_jobs(file_db.get_active_jobs())
+        for row in active_jobs:
+            if row["file_id"] == file_id:
+                return IndexJob.from_row(row)
+        if len(active_jobs) >= CONFIG_DATA['indexing']['max_pending_jobs']:
+            raise JobQueueFull(f"too many indexing jobs in progress ({len(active_jobs)})")
+
+        job = IndexJob(file_id, name, extract_images)
+        try:
+            file_db.insert_job(job.to_row())
+        except sqlite3.IntegrityError:
+            # 다른 worker 프로세스가 먼저 같은 파일의 job을 등록한 경우
+            rows = file_db.get_active_jobs(file_id)
+            if not rows:
+                raise
+            return IndexJob.from_row(rows[0])
+        file_db.prune_jobs(CONFIG_DATA['indexing']['max_jobs_history'])
+
+    _executor.submit(_run_job, job)
+    return job
+
+def get_job(job_id: str) -> IndexJob:
+    row = get_file_db().get_job(job_id)
+    return IndexJob.from_row(row) if row else None
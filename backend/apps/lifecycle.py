@@ -0,0 +1,338 @@
+import os
+import re
+import time
+import shutil
+import logging
+import sqlite3
+import threading
+from typing import List, Optional
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, UPLOAD_DIR, CHROMA_DATA_PATH, FLAT_DATA_PATH, BM25_DATA_PATH)
+from apps import bm25
+from apps import flat_store
+from apps import metrics
+from apps.answer_cache import answer_cache
+from apps.file_db import get_file_db
+from apps.utils import delete_collection, is_flat_backend, process_lock, STAGING_SUFFIX, PREVIOUS_SUFFIX
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# 파일(collection) 삭제, TTL/LRU eviction, 디스크 compaction
+# 파일 1개 = upload 원본 + vector collection + bm25 index + 파일관리 DB row
+
+CHROMA_SQLITE_PATH = os.path.join(CHROMA_DATA_PATH, "chroma.sqlite3")
+_uuid_pattern = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+class FileNotFound(Exception):
+    pass
+
+class FileBusy(Exception):
+    pass
+
+def _path_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _connect_chroma_readonly() -> Optional[sqlite3.Connection]:
+    if not os.path.exists(CHROMA_SQLITE_PATH):
+        return None
+    return sqlite3.connect(f"file:{CHROMA_SQLITE_PATH}?mode=ro", uri=True, timeout=30)
+
+def _get_chroma_segments() -> Optional[List[str]]:
+    # chroma sqlite의 segment id (HNSW segment는 CHROMA_DATA_PATH/<segment id> 디렉토리에 저장)
+    try:
+        conn = _connect_chroma_readonly()
+        if conn is None:
+            return None
+        try:
+            rows = conn.execute("SELECT id FROM segments").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log.warning(f"_get_chroma_segments(): {e}")
+        return None
+    return [row[0] for row in rows]
+
+def _get_chroma_usage() -> dict:
+    # returns {collection name: 디스크 사용량 추정치}
+    # embedding, 문서, metadata는 모든 collection이 공유하는 chroma.sqlite3에 저장되고
+    # 작은 collection은 HNSW 파일을 만들지 않으므로, sqlite 사용 크기를 collection별 row 크기 비율로 나누고 HNSW segment 디렉토리 크기를 더함
+    try:
+        conn = _connect_chroma_readonly()
+        if conn is None:
+            return {}
+        try:
+            collections = dict(conn.execute("SELECT id, name FROM collections").fetchall())
+            segments = conn.execute("SELECT id, collection FROM segments").fetchall()
+            weights = dict.fromkeys(collections, 0)
+            # embedding vector (embeddings_queue, topic = .../<collection id>)
+            for topic, size in conn.execute(
+                "SELECT topic, SUM(COALESCE(LENGTH(vector), 0) + COALESCE(LENGTH(metadata), 0)) FROM embeddings_queue GROUP BY topic"
+            ):
+                collection_id = topic.rsplit("/", 1)[-1]
+                if collection_id in weights:
+                    weights[collection_id] += size or 0
+            # 문서 & metadata (embedding_metadata, metadata segment 기준)
+            for collection_id, size in conn.execute(
+                """SELECT s.collection, SUM(COALESCE(LENGTH(m.string_value), 8)) FROM embedding_metadata m
+                   JOIN embeddings e ON m.id = e.id JOIN segments s ON e.segment_id = s.id GROUP BY s.collection"""
+            ):
+                if collection_id in weights:
+                    weights[collection_id] += size or 0
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            used = (conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]) * page_size
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log.warning(f"_get_chroma_usage(): {e}")
+        return {}
+    total_weight = sum(weights.values())
+    usage = {
+        name: int(used * weights[collection_id] / total_weight) if total_weight else 0
+        for collection_id, name in collections.items()
+    }
+    for segment_id, collection_id in segments:
+        if collection_id in collections:
+            usage[collections[collection_id]] += _path_size(os.path.join(CHROMA_DATA_PATH, segment_id))
+    return usage
+
+def get_disk_usage(file_id: str, chroma_usage: dict = None) -> dict:
+    # chroma_usage: 여러 파일을 조회할 때 _get_chroma_usage() 결과를 재사용
+    if is_flat_backend():
+        vector = flat_store.get_collection(file_id).disk_usage()
+    else:
+        vector = (chroma_usage if chroma_usage is not None else _get_chroma_usage()).get(file_id, 0)
+    usage = {
+        "upload": _path_size(os.path.join(UPLOAD_DIR, file_id)),
+        "vector": vector,
+        "bm25": _path_size(bm25.get_index_path(file_id)),
+    }
+    usage["total"] = sum(usage.values())
+    return usage
+
+def get_storage() -> dict:
+    # 파일별 디스크 사용량 (오래 검색되지 않은 순서) & 저장 경로별 실제 크기
+    files = []
+    chroma_usage = None if is_flat_backend() else _get_chroma_usage()
+    for row in get_file_db().list_by_access():
+        files.append({**row, "disk_usage": get_disk_usage(row["file_id"], chroma_usage)})
+    paths = {
+        "uploads": _path_size(str(UPLOAD_DIR)),
+        "vector_db": _path_size(FLAT_DATA_PATH if is_flat_backend() else CHROMA_DATA_PATH),
+        "bm25": _path_size(BM25_DATA_PATH),
+    }
+    metrics.set_storage(len(files), paths)
+    return {
+        "collections": len(files),
+        "total_bytes": sum(file["disk_usage"]["total"] for file in files),
+        "paths": paths,
+        "files": files,
+    }
+
+def _is_indexing(file_id: str) -> bool:
+    return bool(get_file_db().get_active_jobs(file_id))
+
+def delete_file(file_id: str, reason: str = "delete") -> dict:
+    file_db = get_file_db()
+    if file_db.search(file_id=file_id) is None:
+        raise FileNotFound(f"file {file_id} not found")
+    # 색인과 같은 collection lock을 사용하여 색인 중인 collection은 삭제하지 않음
+    with process_lock(f"collection_{file_id}", blocking=False) as acquired:
+        if not acquired or _is_indexing(file_id):
+            raise FileBusy(f"file {file_id} is being indexed")
+        usage = get_disk_usage(file_id)
+        # 검색 대상에서 먼저 제외한 뒤 저장소 정리
+        file_db.delete(file_id)
+        answer_cache.invalidate(file_id)
+        bm25.invalidate_index(file_id, remove_file=True)
+        delete_collection(file_id)
+        # 재색인 도중 중단되어 남은 collection
+        delete_collection(file_id + STAGING_SUFFIX)
+        delete_collection(file_id + PREVIOUS_SUFFIX)
+        upload_path = os.path.join(UPLOAD_DIR, file_id)
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+    metrics.count_eviction(reason, usage["total"])
+    log.info(f"delete_file(): {file_id} ({reason}, {usage['total']} bytes)")
+    return {"file_id": file_id, "reason": reason, "freed_bytes": usage["total"]}
+
+# 프로세스별 마지막 last_accessed 기록 시각 (검색마다 DB에 쓰지 않도록)
+_touched = {}
+_touched_lock = threading.Lock()
+
+def record_access(file_ids: List[str]) -> set:
+    # 검색 요청의 파일 중 존재하는 파일을 반환하고 마지막 검색 시각 갱신
+    # 삭제/eviction된 파일은 검색하지 않음 (빈 collection이 다시 생성되지 않도록)
+    file_db = get_file_db()
+    existing = file_db.get_existing(list(set(file_ids)))
+    now = time.time()
+    interval = CONFIG_DATA['lifecycle']['touch_interval']
+    with _touched_lock:
+        stale = [file_id for file_id in existing if now - _touched.get(file_id, 0) >= interval]
+        for file_id in stale:
+            _touched[file_id] = now
+    if stale:
+        file_db.touch(stale, now)
+    return existing
+
+def get_eviction_candidates(files: List[dict], now: float) -> List[tuple]:
+    # returns [(file, reason)], files는 오래 검색되지 않은 순서
+    config = CONFIG_DATA['lifecycle']
+    candidates = []
+    remaining = list(files)
+    if config['ttl'] > 0:
+        expired = [file for file in remaining if now - file["last_accessed"] > config['ttl']]
+        candidates += [(file, "ttl") for file in expired]
+        remaining = [file for file in remaining if file not in expired]
+    if config['max_collections'] > 0:
+        while len(remaining) > config['max_collections']:
+            candidates.append((remaining.pop(0), "max_collections"))
+    if config['max_disk_bytes'] > 0:
+        total = sum(file["disk_usage"]["total"] for file in remaining)
+        while remaining and total > config['max_disk_bytes']:
+            file = remaining.pop(0)
+            total -= file["disk_usage"]["total"]
+            candidates.append((file, "max_disk_bytes"))
+    return candidates
+
+def evict(now: float = None) -> List[dict]:
+    config = CONFIG_DATA['lifecycle']
+    # 제한이 없으면 디스크 사용량(Chroma sqlite 조회 포함)을 계산하지 않음
+    if config['ttl'] <= 0 and config['max_collections'] <= 0 and config['max_disk_bytes'] <= 0:
+        return []
+    now = now or time.time()
+    files = get_storage()["files"]
+    evicted = []
+    for file, reason in get_eviction_candidates(files, now):
+        try:
+            evicted.append(delete_file(file["file_id"], reason=reason))
+        except FileBusy as e:
+            log.info(f"evict(): skipping {e}")
+        except FileNotFound:
+            pass
+    return evicted
+
+def _remove_orphans(file_ids: set, min_age: float) -> int:
+    # 파일관리 DB에 없는 파일의 upload, bm25 index, flat collection (삭제 도중 중단된 경우 등)
+    now = time.time()
+    paths = [(os.path.join(UPLOAD_DIR, name), name) for name in os.listdir(UPLOAD_DIR)]
+    paths += [(os.path.join(BM25_DATA_PATH, name), name[:-len(".npz")]) for name in os.listdir(BM25_DATA_PATH) if name.endswith(".npz")]
+    if os.path.isdir(FLAT_DATA_PATH):
+        paths += [
+            (os.path.join(FLAT_DATA_PATH, name), name.removesuffix(STAGING_SUFFIX).removesuffix(PREVIOUS_SUFFIX))
+            for name in os.listdir(FLAT_DATA_PATH)
+        ]
+    freed = 0
+    for path, file_id in paths:
+        # 업로드 중인 임시파일 & DB 등록 직전의 파일은 제외
+        if file_id in file_ids or now - os.path.getmtime(path) < min_age:
+            continue
+        size = _path_size(path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+        freed += size
+        log.info(f"_remove_orphans(): {path} ({size} bytes)")
+    return freed
+
+def _compact_chroma(min_age: float, vacuum: bool) -> int:
+    if not os.path.exists(CHROMA_SQLITE_PATH):
+        return 0
+    before = _path_size(CHROMA_DATA_PATH)
+    segments = _get_chroma_segments()
+    if segments is not None:
+        # 삭제된 collection의 HNSW segment 디렉토리
+        now = time.time()
+        for name in os.listdir(CHROMA_DATA_PATH):
+            path = os.path.join(CHROMA_DATA_PATH, name)
+            if _uuid_pattern.match(name) and name not in segments and os.path.isdir(path) and now - os.path.getmtime(path) >= min_age:
+                shutil.rmtree(path, ignore_errors=True)
+    if vacuum:
+        # 삭제된 문서 & embedding이 차지하던 sqlite page 반환
+        # VACUUM은 DB 전체를 다시 쓰며 Chroma의 검색/색인과 경쟁하므로 서버를 중지한 상태에서만 실행 (CLI)
+        conn = sqlite3.connect(CHROMA_SQLITE_PATH, timeout=60, isolation_level=None)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    return before - _path_size(CHROMA_DATA_PATH)
+
+def compact(vacuum_chroma: bool = False) -> dict:
+    config = CONFIG_DATA['lifecycle']
+    started = time.perf_counter()
+    file_db = get_file_db()
+    file_ids = {row["file_id"] for row in file_db.list_by_access()}
+    result = {"orphans_bytes": _remove_orphans(file_ids, config['orphan_min_age'])}
+    if not is_flat_backend():
+        result["chroma_bytes"] = _compact_chroma(config['orphan_min_age'], vacuum_chroma)
+    file_db.vacuum()
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    metrics.count_compaction(result["orphans_bytes"] + result.get("chroma_bytes", 0))
+    log.info(f"compact(): {result}")
+    return result
+
+_thread = None
+_thread_lock = threading.Lock()
+
+def _is_compaction_due(now: float) -> bool:
+    # 마지막 compaction 시각은 worker간 공유 (파일관리 DB meta), 처음 실행시에는 지금부터 계산
+    interval = CONFIG_DATA['lifecycle']['compact_interval']
+    if interval <= 0:
+        return False
+    file_db = get_file_db()
+    last_compaction = file_db.get_meta("last_compaction")
+    if last_compaction is None:
+        file_db.set_meta("last_compaction", str(now))
+        return False
+    return now - float(last_compaction) >= interval
+
+def _run():
+    config = CONFIG_DATA['lifecycle']
+    while True:
+        time.sleep(config['interval'])
+        # multi-worker: 1개 프로세스만 실행
+        with process_lock("lifecycle", blocking=False) as acquired:
+            if not acquired:
+                continue
+            try:
+                evicted = evict()
+                if evicted:
+                    log.info(f"_run(): evicted {len(evicted)} files")
+                if _is_compaction_due(time.time()):
+                    compact()
+                    get_file_db().set_meta("last_compaction", str(time.time()))
+            except Exception as e:
+                log.exception(e)
+
+def start():
+    # 주기적으로 eviction & compaction 실행 (interval <= 0이면 실행하지 않음)
+    global _thread
+    if CONFIG_DATA['lifecycle']['interval'] <= 0:
+        return
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="lifecycle", daemon=True)
+            _thread.start()
+
+if __name__ == "__main__":
+    # usage: cd backend && python -m apps.lifecycle --compact
+    # 서버(모든 worker)를 중지한 상태에서 실행 (Chroma sqlite VACUUM 포함)
+    import json
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compact", action="store_true", help="DB에 없는 파일 정리 & Chroma/파일관리 DB VACUUM")
+    args = parser.parse_args()
+    if args.compact:
+        with process_lock("lifecycle"):
+            print(json.dumps(compact(vacuum_chroma=True), indent=2))
@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+from contextvars import ContextVar
+from typing import Optional
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Latency of each search/indexing stage",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+RERANK_CANDIDATES = Counter("rag_rerank_candidates_total", "Candidates passed to the reranker")
+RERANK_PAIRS_SCORED = Counter("rag_rerank_pairs_scored_total", "(query, chunk) pairs scored by the cross-encoder")
+CHUNKS_EMBEDDED = Counter("rag_chunks_embedded_total", "Chunks embedded while indexing")
+CACHE_REQUESTS = Counter("rag_cache_requests_total", "Cache lookups", ["cache", "result"])
+CONTEXT_TOKENS = Counter("rag_context_tokens_total", "Prompt context tokens", ["kind"])
+CONTEXTUALIZE_REQUESTS = Counter("rag_contextualize_total", "Query contextualization by mode", ["mode"])
+BATCH_REQUESTS = Histogram(
+    "rag_batch_requests",
+    "Requests merged into one inference batch",
+    ["scheduler"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+BATCH_ITEMS = Counter("rag_batch_items_total", "Inputs run through the inference schedulers", ["scheduler"])
+EVICTIONS = Counter("rag_evictions_total", "Files removed from storage", ["reason"])
+EVICTED_BYTES = Counter("rag_evicted_bytes_total", "Disk bytes freed by file deletion/eviction", ["reason"])
+COMPACTED_BYTES = Counter("rag_compacted_bytes_total", "Disk bytes reclaimed by compaction")
+# multi-worker: 모든 worker가 같은 저장소를 보므로 가장 최근에 측정한 worker의 값 (eviction 이후 이전 값이 남지 않도록)
+STORAGE_BYTES = Gauge("rag_storage_bytes", "Disk usage by storage path", ["path"], multiprocess_mode="mostrecent")
+COLLECTIONS = Gauge("rag_collections", "Files (collections) in storage", multiprocess_mode="mostrecent")
+SCHEDULER_SHED = Counter("rag_scheduler_shed_total", "Requests rejected by a saturated inference scheduler", ["scheduler"])
+
+# /search debug_timings 요청시 현재 요청의 stage별 시간을 모음
+_timings: ContextVar[Optional[dict]] = ContextVar("timings", default=None)
+
+def is_enabled() -> bool:
+    return CONFIG_DATA['metrics']['enabled']
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ("stage", "timings", "started")
+
+    def __init__(self, stage: str, timings: Optional[dict]):
+        self.stage = stage
+        self.timings = timings
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.started, self.timings)
+        return False
+
+def span(stage: str):
+    # 비활성화 & debug_timings 미요청시에는 공유 no-op 객체를 반환 (측정 비용 없음)
+    timings = _timings.get()
+    if timings is None and not is_enabled():
+        return _NOOP_SPAN
+    return Span(stage, timings)
+
+def observe(stage: str, seconds: float, timings: Optional[dict] = None):
+    if is_enabled():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = timings if timings is not None else _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def count_cache(cache: str, hits: int, misses: int = 0):
+    if is_enabled():
+        if hits:
+            CACHE_REQUESTS.labels(cache, "hit").inc(hits)
+        if misses:
+            CACHE_REQUESTS.labels(cache, "miss").inc(misses)
+
+def count_rerank(stats: dict):
+    if is_enabled():
+        RERANK_CANDIDATES.inc(stats.get("candidates", 0))
+        RERANK_PAIRS_SCORED.inc(stats.get("pairs_scored", 0))
+        count_cache("rerank_score", stats.get("cache_hits", 0), stats.get("pairs_scored", 0))
+
+def count_contextualize(mode: str):
+    if is_enabled():
+        CONTEXTUALIZE_REQUESTS.labels(mode).inc()
+
+def count_context_tokens(stats: dict):
+    if is_enabled():
+        CONTEXT_TOKENS.labels("original").inc(stats.get("original_tokens", 0))
+        CONTEXT_TOKENS.labels("context").inc(stats.get("context_tokens", 0))
+
+def count_chunks_embedded(chunks: int, cache_hits: int):
+    if is_enabled():
+        CHUNKS_EMBEDDED.inc(chunks)
+        count_cache("embedding", cache_hits, chunks - cache_hits)
+
+def observe_batch(scheduler: str, requests: int, items: int):
+    if is_enabled():
+        BATCH_REQUESTS.labels(scheduler).observe(requests)
+        BATCH_ITEMS.labels(scheduler).inc(items)
+
+def count_shed(scheduler: str):
+    if is_enabled():
+        SCHEDULER_SHED.labels(scheduler).inc()
+
+def count_eviction(reason: str, freed_bytes: int):
+    if is_enabled():
+        EVICTIONS.labels(reason).inc()
+        EVICTED_BYTES.labels(reason).inc(freed_bytes)
+
+def count_compaction(freed_bytes: int):
+    if is_enabled():
+        COMPACTED_BYTES.inc(max(freed_bytes, 0))
+
+def set_storage(collections: int, paths: dict):
+    if is_enabled():
+        COLLECTIONS.set(collections)
+        for path, size in paths.items():
+            STORAGE_BYTES.labels(path).set(size)
+
+def start_timings():
+    return _timings.set({})
+
+def stop_timings(token) -> dict:
+    # returns {stage: milliseconds}
+    timings = _timings.get() or {}
+    _timings.reset(token)
+    return {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+
+def get_metrics() -> tuple:
+    # returns (body, content type)
+    # gunicorn multi-worker: 모든 worker의 값을 PROMETHEUS_MULTIPROC_DIR에서 합산 (gunicorn_conf.py 참고)
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
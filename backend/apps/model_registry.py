@@ -0,0 +1,119 @@
+import os
+import time
+import logging
+import threading
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
+from apps.utils import load_embedding, load_sentence_transformer, download_model
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# 프로세스당 1회만 모델을 로드하여 공유
+_lock = threading.Lock()
+_models = {}
+_model_stats = {}
+
+def get_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        # linux 외 환경에서는 peak RSS로 대체
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _get_memory_mb(device: str) -> float:
+    if device.startswith("cuda"):
+        import torch
+        return torch.cuda.memory_allocated() / (1024 * 1024)
+    return get_rss_mb()
+
+def resolve_device(device: str = None) -> str:
+    device = device or CONFIG_DATA['rag']['device']
+    if device == "cpu":
+        return device
+
+    import torch
+    if torch.cuda.is_available():
+        return "cuda" if device == "auto" else device
+    if device != "auto":
+        log.warning(f"resolve_device(): {device} is not available, falling back to cpu")
+    return "cpu"
+
+def _load(name: str, loader, model_name: str):
+    device = resolve_device()
+    start, memory = time.perf_counter(), _get_memory_mb(device)
+    try:
+        model = loader(model_name, device=device)
+    except Exception as e:
+        if device == "cpu":
+            raise
+        log.exception(f"_load(): failed to load {model_name} on {device}, falling back to cpu: {e}")
+        device = "cpu"
+        start, memory = time.perf_counter(), _get_memory_mb(device)
+        model = loader(model_name, device=device)
+
+    _model_stats[name] = {
+        "model": model_name,
+        "device": device,
+        "load_seconds": round(time.perf_counter() - start, 3),
+        "memory_mb": round(_get_memory_mb(device) - memory, 1),
+    }
+    log.info(f"_load(): {_model_stats[name]}")
+    return model
+
+def _get_or_load(name: str, loader, model_name: str):
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        # double-checked: 동시 요청시에도 1회만 로드
+        if name not in _models:
+            _models[name] = _load(name, loader, model_name)
+        return _models[name]
+
+def register(name: str, model):
+    # 이미 로드된 모델(또는 benchmark/test용 stand-in)을 등록
+    with _lock:
+        _models[name] = model
+        _model_stats[name] = {"model": type(model).__name__, "device": "cpu", "load_seconds": 0.0, "memory_mb": 0.0}
+
+def get_embedding():
+    return _get_or_load("embedding", load_embedding, CONFIG_DATA['rag']['embedding_model'])
+
+def get_reranker():
+    return _get_or_load("reranking", load_sentence_transformer, CONFIG_DATA['rag']['reranking_model'])
+
+def get_model_stats() -> dict:
+    return dict(_model_stats)
+
+def warmup():
+    # 첫 요청이 모델 로드/초기화 비용을 지불하지 않도록 서버 시작시 1회 추론
+    start = time.perf_counter()
+    get_embedding().embed_query("warmup")
+    get_reranker().predict([("warmup", "warmup")])
+    log.info(f"warmup(): done in {time.perf_counter() - start:.2f}s, rss {get_rss_mb():.1f}MB")
+
+
+def download_models() -> dict:
+    # 서버는 로컬 캐시의 모델만 사용하므로 배포/이미지 빌드시 1회 실행
+    paths = {}
+    for model_name in (CONFIG_DATA['rag']['embedding_model'], CONFIG_DATA['rag']['reranking_model']):
+        paths[model_name] = download_model(model_name)
+        log.info(f"download_models(): {model_name} -> {paths[model_name]}")
+    # context token budget 계산용 답변 생성 모델 tokenizer
+    from apps import context_builder
+    paths[CONFIG_DATA['rag']['llm_model']] = context_builder.download_tokenizer()
+    log.info(f"download_models(): {CONFIG_DATA['rag']['llm_model']} tokenizer -> {paths[CONFIG_DATA['rag']['llm_model']]}")
+    return paths
+
+if __name__ == "__main__":
+    # usage: cd backend && python -m apps.model_registry --download
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--download", action="store_true", help="임베딩/리랭킹 모델을 SENTENCE_TRANSFORMERS_HOME, 답변 생성 모델 tokenizer를 TIKTOKEN_CACHE_DIR에 다운로드")
+    args = parser.parse_args()
+    if args.download:
+        for model_name, path in download_models().items():
+            print(f"{model_name}: {path}")
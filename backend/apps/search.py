@@ -1,27 +1,111 @@
+import time
+import asyncio
 import logging
+from itertools import zip_longest
 from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA)
-from typing import List
+from typing import List, Tuple
+
+import numpy as np
 
 from apps.utils import (
     get_last_user_message, 
-    load_embedding, 
-    load_sentence_transformer, 
     get_collection_from_vector_store, 
-    get_vector_store,
-    get_contextualize_query,
     RerankCompressor
 )
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import (
-    ContextualCompressionRetriever,
-    EnsembleRetriever,
-)
+from apps import bm25
+from apps import batching
+from apps import executors
+from apps import fusion
+from apps import metrics
+from apps import model_registry
+from apps import contextualize
+from apps import context_builder
+from apps.cache import LRUCache
+from langchain_core.documents import Document
 
 # log setting
 log = logging.getLogger(__name__)
 log.setLevel(GLOBAL_LOG_LEVEL)
 
-def query_doc_with_hybrid_search(
+def get_bm25_index(collection_name: str, collection):
+    with metrics.span("bm25_load"):
+        index = bm25.load_index(collection_name)
+    if index is None:
+        # bm25 index가 없는 기존 collection은 최초 1회만 생성하여 저장
+        log.info(f"get_bm25_index(): building missing index for {collection_name}")
+        with metrics.span("bm25_build"):
+            documents = collection.get(include=["documents"])
+            index = bm25.BM25Index.from_texts(documents.get("documents"), documents.get("ids"))
+            bm25.save_index(collection_name, index)
+            index = bm25.load_index(collection_name)
+    return index
+
+def _to_query_result(documents):
+    return {
+        "distances": [[d.metadata.get("score") for d in documents]],
+        "documents": [[d.page_content for d in documents]],
+        "metadatas": [[d.metadata for d in documents]],
+    }
+
+def vector_search(collection, query_embedding: List[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # returns (chunk ids, 유사도) 유사도 내림차순, 문서는 fusion 이후 후보만 조회
+    with metrics.span("vector_search"):
+        result = collection.query(query_embeddings=[query_embedding], n_results=k, include=["distances"])
+    return np.asarray(result["ids"][0], dtype=str), -np.asarray(result["distances"][0], dtype=np.float64)
+
+def bm25_search(index, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    with metrics.span("bm25_search"):
+        return index.get_top_k_arrays(query, k)
+
+def get_documents(collection, chunk_ids: np.ndarray, scores: np.ndarray) -> List[Document]:
+    # fusion 순서대로 후보 chunk의 본문 & metadata 조회
+    if len(chunk_ids) == 0:
+        return []
+    with metrics.span("candidates_fetch"):
+        result = collection.get(ids=chunk_ids.tolist(), include=["documents", "metadatas"])
+    found = {
+        chunk_id: (text, metadata)
+        for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+    }
+    docs = []
+    for chunk_id, score in zip(chunk_ids.tolist(), scores.tolist()):
+        if chunk_id in found:
+            text, metadata = found[chunk_id]
+            docs.append(Document(id=chunk_id, page_content=text, metadata={**(metadata or {}), "fusion_score": score}))
+    return docs
+
+async def get_hybrid_candidates(
+    collection_name: str,
+    query: str,
+    query_embedding: List[float],
+    pool_size: int = None,
+):
+    # rerank 전 단계: 1개 collection에서 bm25 + vector 검색 결과(각 pool_size개)를 결합
+    fusion_config = CONFIG_DATA['fusion']
+    pool_size = pool_size or fusion_config['pool_size']
+    with metrics.span("vector_store_open"):
+        collection = await executors.run("search", get_collection_from_vector_store, collection_name=collection_name)
+    index = await executors.run("search", get_bm25_index, collection_name, collection)
+    # query embedding은 요청당 1회만 계산하여 모든 collection에서 재사용
+    (bm25_ids, bm25_scores), (vector_ids, vector_scores) = await asyncio.gather(
+        executors.run("search", bm25_search, index, query, pool_size),
+        executors.run("search", vector_search, collection, query_embedding, pool_size),
+    )
+    with metrics.span("fusion"):
+        chunk_ids, scores = fusion.fuse(
+            [bm25_ids, vector_ids],
+            [bm25_scores, vector_scores],
+            weights=[fusion_config['bm25_weight'], fusion_config['vector_weight']],
+            method=fusion_config['method'],
+            c=fusion_config['rrf_c'],
+            limit=pool_size,
+        )
+    docs = await executors.run("search", get_documents, collection, chunk_ids, scores)
+    for doc in docs:
+        doc.metadata["file_id"] = collection_name
+    return docs
+
+async def query_doc_with_hybrid_search(
     collection_name: str,
     query: str,
     embedding_function,
@@ -29,42 +113,14 @@ def query_doc_with_hybrid_search(
     reranking_function,
     r: float,
 ):
-    try:
-        collection = get_collection_from_vector_store(collection_name=collection_name)
-        documents = collection.get()  # get all documents
-        
-        bm25_retriever = BM25Retriever.from_texts(
-            texts=documents.get("documents"),
-            metadatas=documents.get("metadatas"),
-        )
-        bm25_retriever.k = k
-        chroma_vector_store = get_vector_store(collection_name=collection_name)
-        chroma_retriever = chroma_vector_store.as_retriever(search_kwargs={"k": k})
-        ensemble_retriever = EnsembleRetriever(
-            retrievers=[bm25_retriever, chroma_retriever], weights=[0.5, 0.5]
-        )
-        compressor = RerankCompressor(
-            embedding_function=embedding_function,
-            top_n=k,
-            reranking_function=reranking_function,
-            r_score=r,
-        )
-        compression_retriever = ContextualCompressionRetriever(
-            base_compressor=compressor, base_retriever=ensemble_retriever
-        )
-        result = compression_retriever.invoke(query)
-        result = {
-            "distances": [[d.metadata.get("score") for d in result]],
-            "documents": [[d.page_content for d in result]],
-            "metadatas": [[d.metadata for d in result]],
-        }
-
-        # log.info(f"query_doc_with_hybrid_search() result: {result}")
-        
-        return result
-    except Exception as e:
-        print(e)
-        raise e
+    return await query_collection_with_hybrid_search(
+        collection_names=[collection_name],
+        query=query,
+        embedding_function=embedding_function,
+        k=k,
+        reranking_function=reranking_function,
+        r=r,
+    )
     
 def merge_and_sort_query_results(query_results, k, reverse=False):
     # Initialize lists to store combined data
@@ -106,99 +162,153 @@ def merge_and_sort_query_results(query_results, k, reverse=False):
 
     return result
 
-def query_collection_with_hybrid_search(
+_rerank_score_cache = LRUCache(maxsize=CONFIG_DATA['rerank']['score_cache_size'])
+async def embed_query(query: str) -> List[float]:
+    with metrics.span("embed_query"):
+        if batching.is_enabled():
+            # 동시 요청의 query를 모아서 1번에 embedding
+            (embedding,) = await asyncio.wrap_future(batching.embedding_batcher.submit([query]))
+            return embedding
+        return await executors.run("embedding", model_registry.get_embedding().embed_query, query)
+
+async def query_collection_with_hybrid_search(
     collection_names: List[str],
     query: str,
     embedding_function,
     k: int,
     reranking_function,
     r: float,
+    query_embedding: List[float] = None,
 ):
-    results = []
-    # log.info(f'query_collection_with_hybrid_search() collection_names:{collection_names}')
-    for collection_name in collection_names:
+    # collection별 후보 검색은 동시에 실행하고, 전체 후보를 1번에 rerank
+    if query_embedding is None:
+        query_embedding = await embed_query(query)
+    tasks = {
+        asyncio.ensure_future(get_hybrid_candidates(collection_name, query, query_embedding)): collection_name
+        for collection_name in collection_names
+    }
+    # 느린 collection 하나가 전체 응답을 막지 않도록 timeout 이후의 결과는 제외
+    done, not_done = await asyncio.wait(tasks, timeout=CONFIG_DATA['search']['collection_timeout'])
+    for task in not_done:
+        task.cancel()
+        log.warning(f"query_collection_with_hybrid_search(): {tasks[task]} timed out")
+
+    candidate_lists = []
+    # 요청한 collection 순서 유지
+    for task in (task for task in tasks if task in done):
         try:
-            result = query_doc_with_hybrid_search(
-                collection_name=collection_name,
-                query=query,
-                embedding_function=embedding_function,
-                k=k,
-                reranking_function=reranking_function,
-                r=r,
-            )
-            results.append(result)
+            candidate_lists.append(task.result())
         except Exception as e:
-            print(e)
-    return merge_and_sort_query_results(results, k=k, reverse=True)
+            log.exception(f"query_collection_with_hybrid_search(): {tasks[task]} failed: {e}")
+    # collection별 순위를 번갈아 가며 합쳐서 후보 수 제한시에도 collection간 균형 유지
+    candidates = [doc for docs in zip_longest(*candidate_lists) for doc in docs if doc is not None]
+
+    if not candidates:
+        return merge_and_sort_query_results([], k=k, reverse=True)
 
-def get_rag_context(file_infos, messages, k, r, llm):
+    compressor = RerankCompressor(
+        embedding_function=embedding_function,
+        top_n=k,
+        reranking_function=reranking_function,
+        r_score=r,
+        batch_size=CONFIG_DATA['rerank']['batch_size'],
+        max_candidates=CONFIG_DATA['rerank']['max_candidates'],
+        score_cache=_rerank_score_cache,
+        model_name=CONFIG_DATA['rag']['reranking_model'],
+    )
+    with metrics.span("rerank"):
+        if hasattr(reranking_function, "apredict"):
+            # micro-batching: batch 결과를 event loop에서 기다림
+            result = await compressor.acompress_documents(candidates, query)
+        else:
+            result = await executors.run("rerank", compressor.compress_documents, candidates, query)
+    metrics.count_rerank(compressor.stats)
+    return merge_and_sort_query_results([_to_query_result(result)], k=k, reverse=True)
+
+def submit_rag_context(**kwargs) -> asyncio.Task:
+    return asyncio.ensure_future(get_rag_context(**kwargs))
+
+async def get_rag_query(messages, llm, speculate=None):
+    # returns (standalone query, 재작성 전 질의로 먼저 시작한 검색 Task or None)
+    started = time.perf_counter()
     query = get_last_user_message(messages)
     history = messages[:-1]
-    if history:
-        # rag_query = query
-        rag_query = get_contextualize_query(llm, query, history)
+    rag_query, mode = contextualize.lookup(query, history)
+    speculative = None
+    if rag_query is None:
+        # 대화 히스토리를 반영한 standalone query로 변환, 그동안 원래 질의로 검색을 미리 시작
+        if speculate is not None:
+            speculative = speculate(query)
+        try:
+            with metrics.span("contextualize"):
+                rag_query = await contextualize.rewrite(llm, query, history)
+        except BaseException:
+            # 호출한 쪽에서 await/cancel 하지 않으므로 미리 시작한 검색도 중단
+            if speculative is not None:
+                speculative.cancel()
+            raise
+    metrics.count_contextualize(mode)
+    log.info(f"get_rag_query(): mode={mode}, {time.perf_counter() - started:.3f}s")
+    return rag_query, speculative
 
-    extracted_collections = []
-    relevant_contexts = []
+async def get_rag_context(file_infos, messages, k, r, llm, rag_query=None, query_embedding=None, speculative=None):
+    if rag_query is None:
+        rag_query, _ = await get_rag_query(messages, llm)
 
+    if speculative is not None:
+        # 재작성된 질의가 원래 질의와 거의 같으면 미리 시작한 검색 결과를 사용
+        query = get_last_user_message(messages)
+        similarity = contextualize.query_similarity(query, rag_query)
+        if similarity >= CONFIG_DATA['contextualize']['reuse_threshold']:
+            log.info(f"get_rag_context(): reusing speculative retrieval (similarity={similarity:.2f})")
+            metrics.count_cache("speculative_retrieval", hits=1)
+            with metrics.span("retrieval_wait"):
+                return await speculative
+        metrics.count_cache("speculative_retrieval", hits=0, misses=1)
+        speculative.cancel()
+
+    # 공유 모델 인스턴스 (프로세스당 1회 로드), rerank는 batching 사용시 동시 요청과 묶어서 실행
+    embedding_function = model_registry.get_embedding().client.encode
+    reranking_function = batching.get_reranker()
+
+    file_names = {}
     for file_info in file_infos:
-        context = None
-        collection_names = [file_info['file_id']]
-        collection_names = set(collection_names).difference(extracted_collections)
-        if not collection_names:
-            log.debug(f"skipping {file_info['name']} as it has already been extracted")
-            continue
+        file_names.setdefault(file_info['file_id'], file_info['name'])
 
-        try:
-            context = query_collection_with_hybrid_search(
-                        collection_names=collection_names,
+    try:
+        with metrics.span("retrieval"):
+            context = await query_collection_with_hybrid_search(
+                        collection_names=list(file_names.keys()),
                         query=rag_query,
-                        embedding_function=load_sentence_transformer(CONFIG_DATA['rag']['embedding_model']),
+                        embedding_function=embedding_function,
                         k=k,
-                        reranking_function=load_sentence_transformer(CONFIG_DATA['rag']['reranking_model']),
+                        reranking_function=reranking_function,
                         r=r,
+                        query_embedding=query_embedding,
                     )
-        except Exception as e:
-            log.exception(e)
-            context = None
-
-        if context:
-            relevant_contexts.append({**context, "source": file_info['name']})
-
-        extracted_collections.extend(collection_names)
-
-    contexts = []
-    citations = []
+    except batching.SchedulerSaturated:
+        raise
+    except Exception as e:
+        log.exception(e)
+        context = None
 
-    for context in relevant_contexts:
-        try:
-            if "documents" in context:
-                contexts.append(
-                    "\n\n".join(
-                        [text for text in context["documents"][0] if text is not None]
-                    )
-                )
-
-                if "metadatas" in context:
-                    citations.append(
-                        {
-                            "source": context["source"],
-                            "document": context["documents"][0],
-                            "metadata": context["metadatas"][0],
-                        }
-                    )
-        except Exception as e:
-            log.exception(e)
+    # 파일별로 context & citation 구성 (겹치는 chunk 병합 & token budget 적용)
+    if not context:
+        return [], [], {}
+    with metrics.span("context_build"):
+        contexts, citations, stats = context_builder.build_context(context, file_names)
+    metrics.count_context_tokens(stats)
+    log.info(f"get_rag_context(): {stats}")
 
-    return contexts, citations
+    return contexts, citations, stats
 
 if __name__=='__main__':
     print(
-    query_doc_with_hybrid_search(
+    asyncio.run(query_doc_with_hybrid_search(
         collection_name='13ff8914-ba25-4bec-80b6-61b5b5b7ab9c',
         query='논문에서 제시된 vector DB중 어떤것이 가장 좋아?',
-        embedding_function=load_sentence_transformer(CONFIG_DATA['rag']['embedding_model']),
-        reranking_function=load_sentence_transformer(CONFIG_DATA['rag']['reranking_model']),
+        embedding_function=model_registry.get_embedding().client.encode,
+        reranking_function=model_registry.get_reranker(),
         k=CONFIG_DATA['rag']['top_k'],
         r=CONFIG_DATA['rag']['relevance_threshold'],
-    ))
\ No newline at end of file
+    )))
\ No newline at end of file
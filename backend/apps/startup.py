@@ -0,0 +1,67 @@
+import time
+import logging
+import threading
+from config import (GLOBAL_LOG_LEVEL)
+from apps import model_registry
+from apps import context_builder
+from apps.file_db import get_file_db
+from apps.utils import is_flat_backend, get_chroma_client
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+# 서버 시작 후 background thread에서 저장소 open & 모델 warmup
+# /healthz는 바로 응답하고, /readyz는 아래 step이 모두 끝난 뒤에 200을 반환
+_lock = threading.Lock()
+_thread = None
+_status = {"ready": False, "error": None, "steps": {}}
+
+def open_stores():
+    get_file_db()
+    if not is_flat_backend():
+        get_chroma_client()
+
+def warmup_models():
+    model_registry.warmup()
+    context_builder.get_tokenizer()
+
+STEPS = (
+    ("stores", open_stores),
+    ("models", warmup_models),
+)
+
+def _run():
+    started = time.perf_counter()
+    try:
+        for name, step in STEPS:
+            step_started = time.perf_counter()
+            step()
+            _status["steps"][name] = round(time.perf_counter() - step_started, 3)
+        _status["ready"] = True
+        log.info(f"_run(): ready in {time.perf_counter() - started:.2f}s {_status['steps']}")
+    except Exception as e:
+        log.exception(e)
+        _status["error"] = str(e)
+
+def start(background: bool = True):
+    # 프로세스당 1회만 실행 (gunicorn preload시 master에서 로드한 모델은 다시 로드하지 않음)
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_run, name="startup", daemon=True)
+        _thread.start()
+    if not background:
+        _thread.join()
+
+def is_ready() -> bool:
+    return _status["ready"]
+
+def get_status() -> dict:
+    return {
+        "ready": _status["ready"],
+        "error": _status["error"],
+        "steps": dict(_status["steps"]),
+        "models": model_registry.get_model_stats(),
+    }
@@ -0,0 +1,176 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import AsyncIterator, BinaryIO, Tuple
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, UPLOAD_DIR)
+
+# log setting
+log = logging.getLogger(__name__)
+log.setLevel(GLOBAL_LOG_LEVEL)
+
+PDF_MAGIC = b"%PDF-"
+
+class InvalidFileType(Exception):
+    pass
+
+class FileTooLarge(Exception):
+    pass
+
+class UploadWriter:
+    # 업로드 데이터를 받는 즉시 sha256, PDF 여부, 최대 크기를 검사하고 chunk_size 단위로 임시파일에 기록
+    def __init__(self, upload_dir=None, chunk_size: int = None, max_size: int = None):
+        self.chunk_size = chunk_size or CONFIG_DATA['upload']['chunk_size']
+        self.max_size = max_size or CONFIG_DATA['upload']['max_size']
+        self.sha256 = hashlib.sha256()
+        self.file_size = 0
+        self.head = b""
+        self.buffer = []
+        self.buffered = 0
+        # rename이 atomic하도록 최종 경로와 같은 디렉토리에 생성
+        fd, self.temp_path = tempfile.mkstemp(dir=upload_dir or UPLOAD_DIR, prefix=".upload-")
+        self.file = os.fdopen(fd, "wb")
+
+    def feed(self, data: bytes) -> bool:
+        # 검사만 하고 buffer에 추가, returns chunk_size 이상 쌓여 flush가 필요한지
+        if len(self.head) < len(PDF_MAGIC):
+            self.head += data[:len(PDF_MAGIC) - len(self.head)]
+            if not PDF_MAGIC.startswith(self.head):
+                raise InvalidFileType("Only PDF files are allowed.")
+        self.file_size += len(data)
+        if self.file_size > self.max_size:
+            raise FileTooLarge(f"File is larger than {self.max_size} bytes.")
+        self.sha256.update(data)
+        self.buffer.append(data)
+        self.buffered += len(data)
+        return self.buffered >= self.chunk_size
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(b"".join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+    def finish(self) -> Tuple[str, int, str]:
+        # returns (temp_path, file_size, content_hash)
+        self.flush()
+        self.file.close()
+        if self.file_size == 0:
+            raise InvalidFileType("Empty file is not allowed.")
+        if self.head != PDF_MAGIC:
+            raise InvalidFileType("Only PDF files are allowed.")
+        return self.temp_path, self.file_size, self.sha256.hexdigest()
+
+    def abort(self):
+        self.file.close()
+        discard_upload(self.temp_path)
+
+def stream_to_temp(file: BinaryIO, upload_dir=None, chunk_size: int = None, max_size: int = None) -> Tuple[str, int, str]:
+    # 파일 객체를 고정 크기 chunk로 읽어 임시파일에 기록 (batch ingest 등)
+    # returns (temp_path, file_size, content_hash)
+    writer = UploadWriter(upload_dir, chunk_size=chunk_size, max_size=max_size)
+    try:
+        while chunk := file.read(writer.chunk_size):
+            writer.feed(chunk)
+            writer.flush()
+        return writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+
+def _get_multipart_parser():
+    # python-multipart 0.0.13부터 패키지명 변경
+    try:
+        from python_multipart.multipart import MultipartParser, parse_options_header
+    except ImportError:
+        from multipart.multipart import MultipartParser, parse_options_header
+    return MultipartParser, parse_options_header
+
+async def receive_upload(stream: AsyncIterator[bytes], content_type: str, field: str = "file", upload_dir=None, max_size: int = None) -> Tuple[str, str, int, str]:
+    # multipart/form-data 요청 body를 받는 대로 parse하여 field 파트만 임시파일에 기록
+    # 확장자는 파트 header를 받은 직후, magic bytes & 최대 크기는 데이터를 받는 즉시 검사하므로
+    # 잘못된 요청은 body를 끝까지 받기 전에 실패함 (Starlette의 UploadFile처럼 body 전체를 먼저 spool하지 않음)
+    # returns (filename, temp_path, file_size, content_hash)
+    MultipartParser, parse_options_header = _get_multipart_parser()
+    media_type, params = parse_options_header(content_type or "")
+    boundary = params.get(b"boundary")
+    if media_type != b"multipart/form-data" or not boundary:
+        raise InvalidFileType("multipart/form-data request is required.")
+
+    part = {}
+    state = {"filename": None, "writer": None, "done": False}
+
+    def on_part_begin():
+        part.clear()
+        part.update({"headers": {}, "field": b"", "value": b""})
+
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode() != field or state["writer"] or state["done"]:
+            return
+        filename = os.path.basename(options.get(b"filename", b"").decode("utf-8", "replace"))
+        # 파일 내용을 받기 전에 확장자 검사
+        if filename.split(".")[-1].lower() != "pdf":
+            raise InvalidFileType("Only PDF files are allowed.")
+        state["filename"] = filename
+        state["writer"] = UploadWriter(upload_dir, max_size=max_size)
+        part["upload"] = True
+
+    def on_part_data(data, start, end):
+        if part.get("upload"):
+            part["flush"] = state["writer"].feed(data[start:end]) or part.get("flush", False)
+
+    def on_part_end():
+        if part.get("upload"):
+            state["done"] = True
+            part["upload"] = False
+
+    parser = MultipartParser(boundary, callbacks={
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in stream:
+            parser.write(chunk)
+            if state["writer"] and (part.get("flush") or state["done"]):
+                # 디스크 기록은 event loop 밖에서 실행
+                await asyncio.to_thread(state["writer"].flush)
+                part["flush"] = False
+            if state["done"]:
+                break
+        if not state["done"]:
+            raise InvalidFileType(f"'{field}' file part is missing.")
+        temp_path, file_size, content_hash = await asyncio.to_thread(state["writer"].finish)
+    except BaseException:
+        if state["writer"]:
+            state["writer"].abort()
+        raise
+    return state["filename"], temp_path, file_size, content_hash
+
+def get_upload_path(file_id: str, upload_dir=None) -> str:
+    return os.path.join(upload_dir or UPLOAD_DIR, file_id)
+
+def commit_upload(temp_path: str, file_id: str, upload_dir=None) -> str:
+    file_path = get_upload_path(file_id, upload_dir)
+    os.replace(temp_path, file_path)
+    return file_path
+
+def discard_upload(temp_path: str):
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
@@ -1,85 +1,223 @@
 import os
+import time
+import sqlite3
+import hashlib
 import logging
 import operator
-from tinydb import TinyDB, Query
+import threading
+import contextlib
 from typing import Optional, List, Any, Sequence
-from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, CHROMA_DATA_PATH, SENTENCE_TRANSFORMERS_HOME, DATA_DIR)
+from config import (GLOBAL_LOG_LEVEL, CONFIG_DATA, CHROMA_DATA_PATH, SENTENCE_TRANSFORMERS_HOME, LOCK_DIR)
 
-import sentence_transformers
-from huggingface_hub import snapshot_download
-
-import chromadb
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+# sentence_transformers, huggingface_hub, chromadb, langchain_community는 import 비용이 커서 사용하는 함수 안에서 import
+# (서버 시작 & /healthz 응답이 모델/vector db 초기화를 기다리지 않도록)
 from langchain_core.documents import BaseDocumentCompressor, Document
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.callbacks import Callbacks
+from apps.cache import LRUCache
+from apps import flat_store
+from apps import bm25
+from apps.file_db import get_file_db
 
 # log setting
 log = logging.getLogger(__name__)
 log.setLevel(GLOBAL_LOG_LEVEL)
 
-def load_embedding():
-    model_name = CONFIG_DATA['rag']['embedding_model']
-    return HuggingFaceEmbeddings(model_name=model_name, multi_process=True, model_kwargs = {'device':'cuda'})
-
-def get_model_path(model: str):
-    # Construct huggingface_hub kwargs with local_files_only to return the snapshot path
-    cache_dir = os.getenv("SENTENCE_TRANSFORMERS_HOME")
-
-    snapshot_kwargs = {
-        "cache_dir": cache_dir
-    }
+class ModelNotCached(Exception):
+    pass
 
-    log.debug(f"model: {model}")
-    log.debug(f"snapshot_kwargs: {snapshot_kwargs}")
+def load_embedding(model_name: str, device: str = "cpu"):
+    from langchain_huggingface import HuggingFaceEmbeddings
+    # 공유 인스턴스로 사용하므로 요청마다 multi-process pool을 띄우지 않음
+    return HuggingFaceEmbeddings(model_name=get_model_path(model_name), model_kwargs = {'device':device})
 
+def get_model_repo_id(model: str) -> Optional[str]:
     # Inspiration from upstream sentence_transformers
     if (
         os.path.exists(model)
         or ("\\" in model or model.count("/") > 1)
     ):
-        # If fully qualified path exists, return input, else set repo_id
-        return model
+        # fully qualified path
+        return None
     elif "/" not in model:
         # Set valid repo_id for model short-name
         model = "sentence-transformers" + "/" + model
+    return model
+
+def get_model_cache_dir() -> str:
+    return os.getenv("SENTENCE_TRANSFORMERS_HOME") or SENTENCE_TRANSFORMERS_HOME
 
-    snapshot_kwargs["repo_id"] = model
+def get_model_path(model: str):
+    # 로컬 캐시(SENTENCE_TRANSFORMERS_HOME)에서만 snapshot 경로를 찾음 (서버 시작/요청 중 network 조회 없음)
+    repo_id = get_model_repo_id(model)
+    if repo_id is None:
+        return model
 
-    # Attempt to query the huggingface_hub library to determine the local path and/or to update
+    from huggingface_hub import snapshot_download
+    snapshot_kwargs = {
+        "repo_id": repo_id,
+        "cache_dir": get_model_cache_dir(),
+        "local_files_only": True,
+    }
+    log.debug(f"snapshot_kwargs: {snapshot_kwargs}")
     try:
         model_repo_path = snapshot_download(**snapshot_kwargs)
-        log.debug(f"model_repo_path: {model_repo_path}")
-        return model_repo_path
     except Exception as e:
-        log.exception(f"Cannot determine model snapshot path: {e}")
+        raise ModelNotCached(
+            f"{repo_id} is not in {snapshot_kwargs['cache_dir']}: run `python -m apps.model_registry --download` first ({e})"
+        ) from e
+    log.debug(f"model_repo_path: {model_repo_path}")
+    return model_repo_path
+
+def download_model(model: str) -> str:
+    # 배포/이미지 빌드시 1회 실행하여 로컬 캐시에 모델을 받아둠
+    repo_id = get_model_repo_id(model)
+    if repo_id is None:
         return model
 
-def load_sentence_transformer(model_path):
+    from huggingface_hub import snapshot_download
+    return snapshot_download(repo_id=repo_id, cache_dir=get_model_cache_dir())
+
+def load_sentence_transformer(model_path, device: str = "cpu"):
+    import sentence_transformers
     return sentence_transformers.CrossEncoder(
         get_model_path(model_path),
-        device="cuda",
+        device=device,
         trust_remote_code=True,
     )
 
+@contextlib.contextmanager
+def process_lock(name: str, blocking: bool = True):
+    # 같은 데이터 경로를 사용하는 프로세스간 배타 lock (gunicorn worker, 일괄 색인 등)
+    # blocking=False: 다른 프로세스가 lock을 잡고 있으면 기다리지 않고 False를 yield
+    import fcntl
+    with open(os.path.join(LOCK_DIR, f"{name}.lock"), "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# 프로세스당 1개의 chroma client를 공유
+_chroma_client = None
+_chroma_client_lock = threading.Lock()
+# collection_name -> {"collection": Collection, "vector_store": Chroma}
+_vector_store_cache = LRUCache(maxsize=CONFIG_DATA['vector_db']['max_open_collections'])
+
+def get_chroma_client():
+    global _chroma_client
+    if _chroma_client is None:
+        with _chroma_client_lock:
+            if _chroma_client is None:
+                import chromadb
+                from chromadb.config import Settings
+                settings = Settings(anonymized_telemetry=False)
+                if CONFIG_DATA['vector_db']['segment_memory_limit_bytes'] > 0:
+                    # 메모리에 올라가는 HNSW segment 크기 제한
+                    settings.chroma_segment_cache_policy = "LRU"
+                    settings.chroma_memory_limit_bytes = CONFIG_DATA['vector_db']['segment_memory_limit_bytes']
+                # 최초 실행시 DB 생성 & migration이 여러 프로세스에서 동시에 실행되지 않도록 함
+                with process_lock("chroma_client"):
+                    _chroma_client = chromadb.PersistentClient(path=CHROMA_DATA_PATH, settings=settings)
+    return _chroma_client
+
+def _get_cached_handles(collection_name:str) -> dict:
+    # 다른 프로세스에서 재색인된 collection은 handle을 새로 생성
+    version = bm25.get_index_version(collection_name)
+    handles = _vector_store_cache.get(collection_name)
+    if handles is None or handles["version"] != version:
+        handles = {"version": version}
+        _vector_store_cache.put(collection_name, handles)
+    return handles
+
+def is_flat_backend() -> bool:
+    # vector_db.backend: "chroma" | "flat" (collection별 mmap 행렬 exact search)
+    return CONFIG_DATA['vector_db']['backend'] == "flat"
+
 def get_collection_from_vector_store(collection_name:str):
-    persistent_client = chromadb.PersistentClient(path=CHROMA_DATA_PATH)
-    collection = persistent_client.get_or_create_collection(collection_name)
+    handles = _get_cached_handles(collection_name)
+    if "collection" not in handles:
+        if is_flat_backend():
+            handles["collection"] = flat_store.get_collection(collection_name)
+        else:
+            handles["collection"] = get_chroma_client().get_or_create_collection(collection_name)
 
-    return collection
+    return handles["collection"]
+
+def get_vector_store(collection_name:str, embedding_function):
+    handles = _get_cached_handles(collection_name)
+    if "vector_store" not in handles:
+        if is_flat_backend():
+            handles["vector_store"] = flat_store.FlatVectorStore(
+                collection=get_collection_from_vector_store(collection_name),
+                embedding_function=embedding_function,
+            )
+        else:
+            from langchain_community.vectorstores import Chroma
+            handles["vector_store"] = Chroma(
+                client=get_chroma_client(),
+                collection_name=collection_name,
+                embedding_function=embedding_function,
+            )
 
-def get_vector_store(collection_name:str):
-    persistent_client = chromadb.PersistentClient(path=CHROMA_DATA_PATH)
+    return handles["vector_store"]
 
-    vector_store = Chroma(
-        client=persistent_client,
-        collection_name=collection_name,
-        embedding_function=load_embedding(),
-    )
+def invalidate_vector_store(collection_name:str):
+    _vector_store_cache.pop(collection_name)
 
-    return vector_store
+def delete_collection(collection_name:str):
+    invalidate_vector_store(collection_name)
+    if is_flat_backend():
+        flat_store.delete_collection(collection_name)
+        return
+    try:
+        get_chroma_client().delete_collection(collection_name)
+    except ValueError:
+        pass
+
+# 재색인 중인 collection & 교체된 이전 collection 이름 (collection_name + suffix)
+STAGING_SUFFIX = ".staging"
+PREVIOUS_SUFFIX = ".previous"
+
+def _rename_collection(collection_name:str, new_name:str):
+    if is_flat_backend():
+        flat_store.rename_collection(collection_name, new_name)
+    else:
+        get_chroma_client().get_collection(collection_name).modify(name=new_name)
+
+def create_staging_collection(collection_name:str):
+    # 재색인은 임시 collection에 기록하고 끝난 뒤 replace_collection으로 교체 (그 동안 검색은 기존 collection 사용)
+    staging_name = collection_name + STAGING_SUFFIX
+    # 이전에 실패한 재색인이 남긴 collection
+    delete_collection(staging_name)
+    if is_flat_backend():
+        return flat_store.get_collection(staging_name)
+    return get_chroma_client().create_collection(staging_name)
+
+def replace_collection(collection_name:str):
+    # 기존 collection은 PREVIOUS_SUFFIX로 옮겨두고 (다른 프로세스가 열어둔 handle용) discard_previous_collection에서 삭제
+    previous_name = collection_name + PREVIOUS_SUFFIX
+    delete_collection(previous_name)
+    try:
+        _rename_collection(collection_name, previous_name)
+    except (ValueError, FileNotFoundError):
+        # 처음 색인하는 경우
+        pass
+    try:
+        _rename_collection(collection_name + STAGING_SUFFIX, collection_name)
+    except (sqlite3.IntegrityError, OSError):
+        # 교체 도중 검색에서 같은 이름의 빈 collection을 생성한 경우
+        delete_collection(collection_name)
+        _rename_collection(collection_name + STAGING_SUFFIX, collection_name)
+    invalidate_vector_store(collection_name)
+
+def discard_previous_collection(collection_name:str):
+    delete_collection(collection_name + PREVIOUS_SUFFIX)
 
 def get_last_user_message_item(messages: List[dict]) -> Optional[dict]:
     for message in reversed(messages):
@@ -103,7 +241,7 @@ def get_last_user_message(messages: List[dict]) -> Optional[str]:
 
     return get_content_from_message(message)
 
-def get_contextualize_query(llm, query, history):
+def get_contextualize_chain(llm):
     contextualize_q_system_prompt = """Given a chat history and the latest user question \
     which might reference context in the chat history, formulate a standalone question \
     which can be understood without the chat history. Do NOT answer the question, \
@@ -116,83 +254,123 @@ def get_contextualize_query(llm, query, history):
         ]
     )
 
-    chain = contextualize_q_prompt | llm | StrOutputParser()
+    return contextualize_q_prompt | llm | StrOutputParser()
 
-    return chain.invoke({
+def get_contextualize_query(llm, query, history):
+    return get_contextualize_chain(llm).invoke({
+        "question": query,
+        "chat_history": history
+    })
+
+async def aget_contextualize_query(llm, query, history):
+    return await get_contextualize_chain(llm).ainvoke({
         "question": query,
         "chat_history": history
     })
 
-def search_file_db(file_id=None, filename=None, file_size=None):
+def search_file_db(file_id=None, filename=None, file_size=None, content_hash=None):
     file_info = None
     try:
-        db = TinyDB(os.path.join(DATA_DIR, 'file_index_db.json'), indent=2)
-        query = Query()
-        if db:
-            if file_id:
-                result = db.search(query.file_id == file_id)
-            elif filename and file_size:
-                result = db.search((query.name == filename) & (query.file_size == file_size))
-
-            if result:
-                file_info = result[0]
+        file_info = get_file_db().search(file_id=file_id, filename=filename, file_size=file_size, content_hash=content_hash)
     except Exception as e:
-        print(e)
-    finally:
-        db.close()
+        log.exception(e)
 
     return file_info
 
-def insert_file_db(file_id, filename, file_size):
+def insert_file_db(file_id, filename, file_size, content_hash=None):
     try:
-        db = TinyDB(os.path.join(DATA_DIR, 'file_index_db.json'), indent=2)
-        db.insert({'file_id': file_id, 'name': filename, 'file_size': file_size, 'docs_count': -1})
+        get_file_db().insert(file_id, filename, file_size, content_hash)
     except Exception as e:
-        print(e)
-    finally:
-        db.close()
+        log.exception(e)
 
 def update_index_complete(file_id, docs_count):
     try:
-        db = TinyDB(os.path.join(DATA_DIR, 'file_index_db.json'), indent=2)
-        db.update({'docs_count': docs_count}, Query().file_id==file_id)
+        get_file_db().update_docs_count(file_id, docs_count)
     except Exception as e:
-        print(e)
-    finally:
-        db.close()
+        log.exception(e)
 
 class RerankCompressor(BaseDocumentCompressor):
     embedding_function: Any
     top_n: int
     reranking_function: Any
     r_score: float
+    # 1번의 predict 호출에서 사용할 batch 크기
+    batch_size: int = 32
+    # rerank할 최대 후보 수 (0이면 제한 없음)
+    max_candidates: int = 0
+    # (query hash, chunk id, chunk 내용 hash, model) -> score LRU 캐시
+    # chunk id는 파일 내 순번이라 재색인시 재사용되므로 내용 hash를 함께 사용
+    score_cache: Any = None
+    model_name: str = ""
+    stats: dict = {}
 
     class Config:
         extra = 'forbid'
         arbitrary_types_allowed = True
 
-    def compress_documents(
-        self,
-        documents: Sequence[Document],
-        query: str,
-        callbacks: Optional[Callbacks] = None
-    ) -> Sequence[Document]:
-        reranking = self.reranking_function is not None
-
-        if reranking:
-            scores = self.reranking_function.predict(
-                [(query, doc.page_content) for doc in documents]
-            )
-        else:
+    def _lookup(self, query: str, documents: Sequence[Document]) -> tuple:
+        # returns (cache keys, 점수 or None, cache miss인 문서 index)
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        keys = [
+            (query_hash, doc.id, hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest(), self.model_name)
+            for doc in documents
+        ]
+        scores = [self.score_cache.get(key) if self.score_cache is not None else None for key in keys]
+        return keys, scores, [i for i, score in enumerate(scores) if score is None]
+
+    def _store(self, keys: list, scores: list, missing: List[int], predicted: List[float]) -> List[float]:
+        for i, score in zip(missing, predicted):
+            scores[i] = score
+            if self.score_cache is not None:
+                self.score_cache.put(keys[i], score)
+        self.stats["pairs_scored"] = len(missing)
+        self.stats["cache_hits"] = len(keys) - len(missing)
+        return scores
+
+    def _score(self, query: str, documents: Sequence[Document]) -> List[float]:
+        if self.reranking_function is None:
             from sentence_transformers import util
 
             query_embedding = self.embedding_function(query)
             document_embedding = self.embedding_function(
                 [doc.page_content for doc in documents]
             )
-            scores = util.cos_sim(query_embedding, document_embedding)[0]
-
-        docs_with_scores = list(zip(documents, scores.tolist()))
+            return util.cos_sim(query_embedding, document_embedding)[0].tolist()
+
+        keys, scores, missing = self._lookup(query, documents)
+        predicted = []
+        if missing:
+            # cache miss인 pair만 1번의 batch predict로 scoring
+            predicted = self.reranking_function.predict(
+                [(query, documents[i].page_content) for i in missing],
+                batch_size=self.batch_size,
+            ).tolist()
+        return self._store(keys, scores, missing, predicted)
+
+    async def _ascore(self, query: str, documents: Sequence[Document]) -> List[float]:
+        # reranking_function.apredict (micro-batching scheduler)의 결과를 thread를 점유하지 않고 기다림
+        keys, scores, missing = self._lookup(query, documents)
+        predicted = []
+        if missing:
+            predicted = (await self.reranking_function.apredict(
+                [(query, documents[i].page_content) for i in missing],
+                batch_size=self.batch_size,
+            )).tolist()
+        return self._store(keys, scores, missing, predicted)
+
+    def _candidates(self, documents: Sequence[Document]) -> List[Document]:
+        # 여러 collection에서 같은 chunk가 들어온 경우 1번만 scoring
+        unique_documents = {}
+        for doc in documents:
+            unique_documents.setdefault(doc.id or doc.page_content, doc)
+        documents = list(unique_documents.values())
+        if self.max_candidates:
+            documents = documents[: self.max_candidates]
+        self.stats = {"candidates": len(documents)}
+        return documents
+
+    def _select(self, documents: List[Document], scores: List[float], started: float) -> List[Document]:
+        docs_with_scores = list(zip(documents, scores))
         if self.r_score:
             docs_with_scores = [
                 (d, s) for d, s in docs_with_scores if s >= self.r_score
@@ -204,8 +382,35 @@ class RerankCompressor(BaseDocumentCompressor):
             metadata = doc.metadata
             metadata["score"] = doc_score
             doc = Document(
+                id=doc.id,
                 page_content=doc.page_content,
                 metadata=metadata,
             )
             final_results.append(doc)
+
+        self.stats["seconds"] = round(time.perf_counter() - started, 4)
+        log.info(f"RerankCompressor.compress_documents(): {self.stats}")
         return final_results
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None
+    ) -> Sequence[Document]:
+        started = time.perf_counter()
+        documents = self._candidates(documents)
+        scores = self._score(query, documents) if documents else []
+        return self._select(documents, scores, started)
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None
+    ) -> Sequence[Document]:
+        # reranking_function에 apredict가 있는 경우만 사용 (없으면 compress_documents를 executor에서 실행)
+        started = time.perf_counter()
+        documents = self._candidates(documents)
+        scores = await self._ascore(query, documents) if documents else []
+        return self._select(documents, scores, started)
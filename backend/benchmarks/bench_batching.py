@@ -0,0 +1,138 @@
+# 동시 사용자 수별 query embedding + rerank 처리량 & p99: 요청별 추론 vs micro-batching scheduler
+# usage: cd backend && python -m benchmarks.bench_batching --concurrency 1,8,32,64 --requests 512 --output bench_batching.json
+# --real: stand-in 대신 로컬 캐시의 실제 임베딩/리랭킹 모델 사용
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+from benchmarks.common import percentiles, print_result
+from benchmarks.stand_ins import HashEmbedding, TinyCrossEncoder
+from benchmarks.synthetic import get_page_texts, get_queries
+
+class _CallOverhead:
+    # 실제 모델 호출마다 드는 고정 비용(tokenizer, kernel 실행, framework overhead)을 행렬곱으로 흉내
+    def __init__(self, size: int):
+        rng = np.random.default_rng(0)
+        self.matrix = rng.standard_normal((size, size)).astype(np.float32) if size else None
+
+    def pay(self):
+        if self.matrix is not None:
+            self.matrix @ self.matrix
+
+class OverheadEmbedding(HashEmbedding):
+    def __init__(self, overhead_size: int):
+        super().__init__()
+        self.overhead = _CallOverhead(overhead_size)
+
+    def encode(self, texts, **kwargs):
+        self.overhead.pay()
+        return super().encode(texts, **kwargs)
+
+class OverheadCrossEncoder(TinyCrossEncoder):
+    def __init__(self, overhead_size: int):
+        super().__init__()
+        self.overhead = _CallOverhead(overhead_size)
+
+    def predict(self, pairs, batch_size: int = 32, **kwargs):
+        # batch_size마다 1번의 forward 호출
+        for _ in range(0, len(pairs), batch_size):
+            self.overhead.pay()
+        return super().predict(pairs, batch_size=batch_size, **kwargs)
+
+def get_candidates(count: int, seed: int):
+    from langchain_core.documents import Document
+    return [
+        Document(id=f"chunk_{seed}_{i}", page_content=text, metadata={"page": i})
+        for i, text in enumerate(get_page_texts(count, words_per_page=80, seed=seed))
+    ]
+
+async def handle_request(query: str, candidates) -> None:
+    from config import CONFIG_DATA
+    from apps import search
+    from apps import batching
+    from apps import executors
+    from apps import model_registry
+    from apps.utils import RerankCompressor
+
+    await search.embed_query(query)
+    compressor = RerankCompressor(
+        embedding_function=model_registry.get_embedding().client.encode,
+        top_n=CONFIG_DATA['rag']['top_k'],
+        reranking_function=batching.get_reranker(),
+        r_score=0.0,
+        batch_size=CONFIG_DATA['rerank']['batch_size'],
+    )
+    if hasattr(compressor.reranking_function, "apredict"):
+        await compressor.acompress_documents(candidates, query)
+    else:
+        await executors.run("rerank", compressor.compress_documents, candidates, query)
+
+def run(batching_enabled: bool, concurrency: int, queries: list, candidate_sets: list) -> dict:
+    from config import CONFIG_DATA
+    CONFIG_DATA['batching']['enabled'] = batching_enabled
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        samples = []
+
+        async def user(i):
+            async with semaphore:
+                started = time.perf_counter()
+                await handle_request(queries[i], candidate_sets[i % len(candidate_sets)])
+                samples.append(time.perf_counter() - started)
+
+        # warmup
+        await asyncio.gather(*[user(i) for i in range(min(concurrency, len(queries)))])
+        samples.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*[user(i) for i in range(len(queries))])
+        elapsed = time.perf_counter() - started
+        return {"requests_per_sec": round(len(queries) / elapsed, 2), "latency": percentiles(samples)}
+    return asyncio.run(main())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--candidates", type=int, default=50, help="요청당 rerank 후보 수")
+    parser.add_argument("--overhead-size", type=int, default=384, help="stand-in 모델 호출당 고정 비용 (행렬 크기)")
+    parser.add_argument("--real", action="store_true")
+    parser.add_argument("--output", default="bench_batching.json")
+    args = parser.parse_args()
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    from config import CONFIG_DATA
+    from apps import model_registry
+    if args.real:
+        model_registry.warmup()
+    else:
+        model_registry.register("embedding", OverheadEmbedding(args.overhead_size))
+        model_registry.register("reranking", OverheadCrossEncoder(args.overhead_size))
+
+    queries = get_queries(args.requests, seed=1)
+    candidate_sets = [get_candidates(args.candidates, seed) for seed in range(8)]
+    results = {
+        "cpu_count": os.cpu_count(),
+        "real_models": args.real,
+        "candidates": args.candidates,
+        "batching": {key: value for key, value in CONFIG_DATA['batching'].items() if key != "enabled"},
+        "runs": {},
+    }
+    for concurrency in [int(value) for value in args.concurrency.split(",")]:
+        for batching_enabled in (False, True):
+            name = f"{'batched' if batching_enabled else 'per_request'}_{concurrency}"
+            results["runs"][name] = run(batching_enabled, concurrency, queries, candidate_sets)
+            print(f"{name}: {results['runs'][name]['requests_per_sec']} req/s, "
+                  f"p99 {results['runs'][name]['latency']['p99_ms']}ms", file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_result(results)
+
+if __name__ == "__main__":
+    main()
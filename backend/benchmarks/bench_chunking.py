@@ -0,0 +1,107 @@
+# chunking 비교: 기존(글자수 기준 + chunk마다 파일명) vs token splitter(임베딩 모델 tokenizer 기준, 파일명은 metadata)
+# 임베딩 입력 token 수, 파일명 header token 수, 모델 최대 길이를 넘어 잘리는 chunk 수, splitting 시간
+# usage: cd backend && python -m benchmarks.bench_chunking --pages 200 --max-seq-length 512 --output bench_chunking.json
+# --real: 로컬 캐시의 임베딩 모델 tokenizer 사용 (기본: 단어 단위 근사), --pdf: 실제 PDF 사용
+import os
+import json
+import time
+import argparse
+
+from benchmarks.common import print_result
+from benchmarks.synthetic import get_page_texts
+
+FILENAME = "2024%20annual%20report%20(final).pdf"
+
+def load_pages(args):
+    from langchain_core.documents import Document
+    if args.pdf:
+        import pypdf
+        pages = []
+        for path in args.pdf:
+            for number, page in enumerate(pypdf.PdfReader(path).pages):
+                pages.append(Document(page_content=page.extract_text(), metadata={"source": path, "page": number}))
+        return pages
+    texts = get_page_texts(args.pages, words_per_page=args.words_per_page, seed=0)
+    return [Document(page_content=text, metadata={"source": "synthetic", "page": i}) for i, text in enumerate(texts)]
+
+def get_tokenizer(real: bool):
+    from apps import chunking
+    if not real:
+        return chunking.WordTokenizer()
+    from transformers import AutoTokenizer
+    from config import CONFIG_DATA
+    from apps.utils import get_model_path
+    return chunking.ModelTokenizer(AutoTokenizer.from_pretrained(get_model_path(CONFIG_DATA['rag']['embedding_model'])))
+
+def summarize(texts, tokenizer, max_seq_length: int, seconds: float) -> dict:
+    counts = tokenizer.count(texts)
+    truncated = [count for count in counts if count > max_seq_length]
+    return {
+        "chunks": len(texts),
+        "embedding_tokens": sum(counts),
+        # 모델에 실제로 들어가는 token 수 (최대 길이 이후는 잘려서 버려짐)
+        "embedded_tokens": sum(min(count, max_seq_length) for count in counts),
+        "truncated_chunks": len(truncated),
+        "truncated_rate": round(len(truncated) / len(texts), 4) if texts else 0.0,
+        "truncated_tokens": sum(count - max_seq_length for count in truncated),
+        "max_chunk_tokens": max(counts, default=0),
+        "split_seconds": round(seconds, 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--pdf", action="append", help="synthetic 대신 사용할 PDF 경로 (여러번 지정 가능)")
+    parser.add_argument("--real", action="store_true")
+    parser.add_argument("--max-seq-length", type=int, default=128, help="임베딩 모델 최대 입력 token 수")
+    parser.add_argument("--output", default="bench_chunking.json")
+    args = parser.parse_args()
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    from config import CONFIG_DATA
+    from apps import chunking
+    from apps.index import get_split_docs
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    pages = load_pages(args)
+    tokenizer = get_tokenizer(args.real)
+    header = f"{FILENAME}\n\n"
+
+    # 기존: 글자수 기준 split 후 chunk마다 파일명 추가
+    started = time.perf_counter()
+    before_docs = RecursiveCharacterTextSplitter(
+        chunk_size=CONFIG_DATA['index']['chunk_size'],
+        chunk_overlap=CONFIG_DATA['index']['chunk_overlap'],
+        add_start_index=True,
+    ).split_documents(pages)
+    before_texts = [f"{header}{doc.page_content}" for doc in before_docs]
+    before = summarize(before_texts, tokenizer, args.max_seq_length, time.perf_counter() - started)
+    before["header_tokens"] = len(tokenizer.offsets([header])[0]) * len(before_texts)
+
+    started = time.perf_counter()
+    splitter = chunking.TokenTextSplitter(
+        tokenizer,
+        chunk_tokens=CONFIG_DATA['index']['chunk_tokens'],
+        chunk_overlap=CONFIG_DATA['index']['chunk_overlap_tokens'],
+        max_seq_length=args.max_seq_length,
+    )
+    after_docs = get_split_docs(pages, FILENAME, text_splitter=splitter)
+    after = summarize([doc.page_content for doc in after_docs], tokenizer, args.max_seq_length, time.perf_counter() - started)
+    after["header_tokens"] = 0
+
+    results = {
+        "pages": len(pages),
+        "tokenizer": type(tokenizer).__name__,
+        "max_seq_length": args.max_seq_length,
+        "chunk_tokens": splitter.chunk_tokens,
+        "before": before,
+        "after": after,
+        "embedding_tokens_saved": before["embedding_tokens"] - after["embedding_tokens"],
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_result(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# 업로드 ~ /search 까지의 end-to-end benchmark (GPU/네트워크 불필요)
+# usage: cd backend && python -m benchmarks.bench_e2e --sizes 10,1000,100000 --output bench_e2e.json
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import asyncio
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from benchmarks.common import measure_each, print_result
+from benchmarks.stand_ins import HashEmbedding, TinyCrossEncoder, get_fake_chat_model
+from benchmarks.synthetic import make_pdf, get_page_texts, get_queries
+
+CHUNKS_PER_PAGE = 10
+# synthetic 단어의 평균 길이 (공백 포함)
+AVG_WORD_CHARS = 7.5
+
+def get_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def get_peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def get_dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return round(total / (1024 * 1024), 2)
+
+def wait_job(client, job: dict, timeout: float) -> dict:
+    deadline = time.time() + timeout
+    while job["status"] not in ("done", "failed"):
+        if time.time() > deadline:
+            raise TimeoutError(f"indexing job {job['job_id']} did not finish in {timeout}s")
+        time.sleep(0.05)
+        job = client.get(f"/indexing/{job['job_id']}").json()
+    if job["status"] == "failed":
+        raise RuntimeError(job["error"])
+    return job
+
+def run_size(client, chunks: int, args) -> dict:
+    from config import CONFIG_DATA, DATA_DIR
+    from apps import bm25, search
+    from apps.model_registry import get_rss_mb, get_embedding, get_reranker
+    from apps.utils import get_collection_from_vector_store, RerankCompressor
+
+    k = CONFIG_DATA['rag']['top_k']
+    name = f"synthetic_{chunks}.pdf"
+    # 페이지당 최대 CHUNKS_PER_PAGE개의 chunk가 되도록 페이지 길이 결정 (실제 chunk 수는 docs_count)
+    pages = math.ceil(chunks / CHUNKS_PER_PAGE)
+    if CONFIG_DATA['index']['splitter'] == "token":
+        # stand-in embedding은 tokenizer가 없으므로 단어 1개 = token 1개
+        chunk_size, chunk_overlap = CONFIG_DATA['index']['chunk_tokens'], CONFIG_DATA['index']['chunk_overlap_tokens']
+        unit = 1
+    else:
+        chunk_size, chunk_overlap = CONFIG_DATA['index']['chunk_size'], CONFIG_DATA['index']['chunk_overlap']
+        unit = AVG_WORD_CHARS
+    page_units = (chunk_size - chunk_overlap) * (chunks / pages - 1) + chunk_size * 0.9
+    pdf = make_pdf(get_page_texts(pages, words_per_page=int(page_units / unit), seed=chunks))
+    result = {"chunks": chunks, "pages": pages, "pdf_mb": round(len(pdf) / (1024 * 1024), 2)}
+
+    # upload: 매번 내용이 다른 파일이 되도록 trailer 뒤에 comment 추가 (sha256 dedupe 회피)
+    uploads = []
+    def upload(i):
+        response = client.post("/file", files={"file": (name, pdf + b"%% %d\n" % i, "application/pdf")})
+        response.raise_for_status()
+        uploads.append(response.json())
+    result["upload"] = measure_each(upload, list(range(args.upload_repeat + 1)))
+    file_info = uploads[-1]
+
+    # indexing: /indexing job 완료까지의 시간
+    rss_before = get_rss_mb()
+    started = time.perf_counter()
+    job = client.post("/indexing", json={**file_info, "extract_images": False}).json()
+    job = wait_job(client, job, timeout=args.index_timeout)
+    seconds = time.perf_counter() - started
+    result["indexing"] = {
+        "seconds": round(seconds, 3),
+        "docs_count": job["docs_count"],
+        "chunks_per_sec": round(job["docs_count"] / seconds, 1),
+        "rss_delta_mb": round(get_rss_mb() - rss_before, 1),
+        "stats": job.get("stats"),
+    }
+
+    file_id = file_info["file_id"]
+    queries = get_queries(args.queries, seed=chunks)
+    embedding = get_embedding()
+    query_embeddings = {query: embedding.embed_query(query) for query in queries}
+    collection = get_collection_from_vector_store(collection_name=file_id)
+    index = bm25.load_index(file_id)
+
+    result["bm25"] = measure_each(lambda query: index.get_top_k_arrays(query, k), queries)
+    result["vector_search"] = measure_each(lambda query: search.vector_search(collection, query_embeddings[query], k), queries)
+
+    # rerank: 후보 검색은 제외하고 cross-encoder 점수 계산 & 정렬만 측정 (score cache 미사용)
+    candidates = {
+        query: asyncio.run(search.get_hybrid_candidates(file_id, query, query_embeddings[query]))
+        for query in queries
+    }
+    compressor = RerankCompressor(
+        embedding_function=embedding.client.encode,
+        top_n=k,
+        reranking_function=get_reranker(),
+        r_score=CONFIG_DATA['rag']['relevance_threshold'],
+        batch_size=CONFIG_DATA['rerank']['batch_size'],
+        max_candidates=CONFIG_DATA['rerank']['max_candidates'],
+    )
+    result["rerank"] = measure_each(lambda query: compressor.compress_documents(candidates[query], query), queries)
+
+    def search_request(query):
+        response = client.post("/search", json={
+            "file_infos": [file_info],
+            "messages": [{"role": "user", "content": query}],
+        })
+        response.raise_for_status()
+    result["search"] = measure_each(search_request, get_queries(args.queries, seed=chunks + 1))
+
+    result["memory"] = {
+        "rss_mb": round(get_rss_mb(), 1),
+        "peak_rss_mb": round(get_peak_rss_mb(), 1),
+        "data_dir_mb": get_dir_size_mb(str(DATA_DIR)),
+    }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,1000,100000", help="corpus sizes in chunks (comma separated)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--upload-repeat", type=int, default=5)
+    parser.add_argument("--index-timeout", type=float, default=3600)
+    parser.add_argument("--output", default="bench_e2e.json")
+    parser.add_argument("--keep-data", action="store_true")
+    args = parser.parse_args()
+
+    # 실제 데이터와 분리된 임시 데이터 경로 (config import 전에 설정)
+    data_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    os.environ["RAG_DATA_DIR"] = data_dir
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    from config import CONFIG_DATA
+    CONFIG_DATA['openai_api_key'] = CONFIG_DATA['openai_api_key'] or "benchmark"
+    # 매 요청마다 검색 경로를 측정하기 위해 답변 캐시 비활성화
+    CONFIG_DATA['answer_cache']['enabled'] = False
+
+    from apps import model_registry
+    model_registry.register("embedding", HashEmbedding())
+    model_registry.register("reranking", TinyCrossEncoder())
+
+    from fastapi.testclient import TestClient
+    import main as server
+    server.llm = get_fake_chat_model()
+    client = TestClient(server.app)
+
+    results = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sizes": {},
+    }
+    try:
+        for chunks in [int(size) for size in args.sizes.split(",")]:
+            started = time.perf_counter()
+            results["sizes"][str(chunks)] = run_size(client, chunks, args)
+            print(f"{chunks} chunks: done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_result(results)
+
+if __name__ == "__main__":
+    main()
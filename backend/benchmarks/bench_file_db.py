@@ -0,0 +1,42 @@
+# 파일관리 DB lookup latency 측정
+# usage: cd backend && python -m benchmarks.bench_file_db --files 100000
+import os
+import uuid
+import random
+import hashlib
+import argparse
+import tempfile
+
+from apps.file_db import FileIndexDB
+from benchmarks.common import measure, print_result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = FileIndexDB(path=os.path.join(tmp_dir, "file_index_db.sqlite3"), legacy_json_path=None)
+        conn = db._connect()
+        rows = [
+            (str(uuid.uuid4()), f"file_{i}.pdf", 1000 + i, hashlib.sha256(str(i).encode()).hexdigest(), 10, 0.0)
+            for i in range(args.files)
+        ]
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO files (file_id, name, file_size, content_hash, docs_count, created_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+
+        sample = lambda: random.choice(rows)
+        result = {
+            "files": args.files,
+            "by_file_id": measure(lambda: db.search(file_id=sample()[0]), args.repeat),
+            "by_content_hash": measure(lambda: db.search(content_hash=sample()[3]), args.repeat),
+            "by_name_size": measure(lambda: (lambda row: db.search(filename=row[1], file_size=row[2]))(sample()), args.repeat),
+            "update_docs_count": measure(lambda: db.update_docs_count(sample()[0], 20), args.repeat),
+        }
+        db.close()
+    print_result(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# hybrid fusion 설정별 recall@k & fusion 비용 측정 (labelled synthetic set, GPU/네트워크 불필요)
+# usage: cd backend && python -m benchmarks.bench_fusion --docs 5000 --queries 500 --output bench_fusion.json
+import json
+import uuid
+import random
+import argparse
+import itertools
+from collections import defaultdict
+
+import numpy as np
+
+from apps.bm25 import BM25Index
+from apps.fusion import fuse, recall_at_k
+from benchmarks.common import measure, print_result
+from benchmarks.stand_ins import HashEmbedding
+from benchmarks.synthetic import get_page_texts, get_vocabulary
+
+WEIGHTS = [(0.5, 0.5), (0.7, 0.3), (0.3, 0.7), (1.0, 0.0), (0.0, 1.0)]
+RECALL_AT = (1, 3, 10)
+
+def get_labelled_queries(texts, count: int, doc_words: int, noise_words: int, seed: int = 2):
+    # 정답 문서의 단어 일부 + 관련없는 단어로 질의 생성, 정답은 해당 문서
+    rng = random.Random(seed)
+    vocabulary = get_vocabulary()
+    queries, relevant = [], []
+    for _ in range(count):
+        target = rng.randrange(len(texts))
+        words = rng.sample(texts[target].split(), doc_words) + rng.sample(vocabulary, noise_words)
+        rng.shuffle(words)
+        queries.append(" ".join(words))
+        relevant.append([f"doc_{target}"])
+    return queries, relevant
+
+def python_rrf(id_lists, weights, c=60):
+    # 기존 방식(dict 기반 weighted RRF)과의 비용 비교용
+    scores = defaultdict(float)
+    for ids, weight in zip(id_lists, weights):
+        for rank, chunk_id in enumerate(ids, start=1):
+            scores[chunk_id] += weight / (rank + c)
+    return sorted(scores, key=scores.get, reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--doc-words", type=int, default=3)
+    parser.add_argument("--noise-words", type=int, default=2)
+    parser.add_argument("--pool-sizes", default="3,10,50,200")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    pool_sizes = [int(size) for size in args.pool_sizes.split(",")]
+    max_pool = max(pool_sizes)
+
+    texts = get_page_texts(args.docs, words_per_page=60, seed=3)
+    chunk_ids = [f"doc_{i}" for i in range(args.docs)]
+    queries, relevant = get_labelled_queries(texts, args.queries, args.doc_words, args.noise_words)
+
+    # retriever별 결과는 최대 pool 크기로 1번만 계산
+    index = BM25Index.from_texts(texts, chunk_ids)
+    embedding = HashEmbedding()
+    doc_vectors = embedding.encode(texts)
+    query_vectors = embedding.encode(queries)
+    bm25_results = [index.get_top_k_arrays(query, max_pool) for query in queries]
+    vector_results = []
+    for query_vector in query_vectors:
+        similarities = doc_vectors @ query_vector
+        top = np.argsort(-similarities)[:max_pool]
+        vector_results.append((np.asarray(chunk_ids, dtype=str)[top], similarities[top]))
+
+    settings = []
+    for method, (bm25_weight, vector_weight), pool_size in itertools.product(("rrf", "score"), WEIGHTS, pool_sizes):
+        ranked = [
+            fuse(
+                [bm25_ids[:pool_size], vector_ids[:pool_size]],
+                [bm25_scores[:pool_size], vector_scores[:pool_size]],
+                weights=[bm25_weight, vector_weight],
+                method=method,
+                limit=pool_size,
+            )[0]
+            for (bm25_ids, bm25_scores), (vector_ids, vector_scores) in zip(bm25_results, vector_results)
+        ]
+        result = {"method": method, "bm25_weight": bm25_weight, "vector_weight": vector_weight, "pool_size": pool_size}
+        for k in RECALL_AT:
+            result[f"recall@{k}"] = round(recall_at_k(ranked, relevant, k), 4)
+        # reranker가 보는 후보 집합의 recall (rerank 이후 recall의 상한)
+        result["pool_recall"] = round(recall_at_k(ranked, relevant, pool_size), 4)
+        settings.append(result)
+
+    # pool 크기별 fusion 비용 (실제 chunk id 형식: {file_id}_{i})
+    rng = np.random.default_rng(0)
+    collection_name = str(uuid.uuid4())
+    fusion_cost = {}
+    for pool_size in (50, 1000, 5000):
+        id_lists = [
+            np.asarray([f"{collection_name}_{i}" for i in rng.choice(pool_size * 10, pool_size, replace=False)], dtype=str)
+            for _ in range(2)
+        ]
+        score_lists = [np.sort(rng.random(pool_size))[::-1] for _ in range(2)]
+        fusion_cost[str(pool_size)] = {
+            "numpy_rrf": measure(lambda: fuse(id_lists, score_lists, [0.5, 0.5], method="rrf", limit=pool_size), repeat=200),
+            "numpy_score": measure(lambda: fuse(id_lists, score_lists, [0.5, 0.5], method="score", limit=pool_size), repeat=200),
+            "python_rrf": measure(lambda: python_rrf([ids.tolist() for ids in id_lists], [0.5, 0.5])[:pool_size], repeat=200),
+        }
+
+    results = {
+        "docs": args.docs,
+        "queries": args.queries,
+        "settings": sorted(settings, key=lambda result: result["recall@3"], reverse=True),
+        "fusion_cost": fusion_cost,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print_result(results)
+
+if __name__ == "__main__":
+    main()
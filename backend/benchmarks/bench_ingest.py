@@ -0,0 +1,81 @@
+# 디렉토리 일괄 색인(apps.ingest) worker 수별 처리량 측정 (synthetic PDF + hash embedding, GPU/네트워크 불필요)
+# usage: cd backend && python -m benchmarks.bench_ingest --files 200 --pages 20 --workers 0,1,2,4 --output bench_ingest.json
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+from benchmarks.common import print_result
+from benchmarks.synthetic import make_pdf, get_page_texts
+
+def get_cpu_count() -> int:
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+def register_stand_ins():
+    # ingest worker process에서 실행 (spawn이므로 부모에서 등록한 모델은 전달되지 않음)
+    from apps import model_registry
+    from benchmarks.stand_ins import HashEmbedding
+    model_registry.register("embedding", HashEmbedding())
+
+def write_pdfs(root: str, files: int, pages: int, words_per_page: int):
+    # 100개씩 하위 디렉토리로 나누어 저장
+    for i in range(files):
+        directory = os.path.join(root, f"{i // 100:04d}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"doc_{i}.pdf"), "wb") as f:
+            f.write(make_pdf(get_page_texts(pages, words_per_page=words_per_page, seed=i)))
+
+def run(pdf_dir: str, data_dir: str, workers: int) -> dict:
+    code = (
+        "import json, sys\n"
+        "from benchmarks.bench_ingest import register_stand_ins\n"
+        "register_stand_ins()\n"
+        "from apps import ingest\n"
+        f"result = ingest.ingest({pdf_dir!r}, workers={workers}, worker_init=register_stand_ins)\n"
+        "print(json.dumps(result))\n"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", code],
+        env={**os.environ, "RAG_DATA_DIR": data_dir},
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        text=True,
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--workers", default="0,1,2,4", help="ingest worker 수 (comma separated)")
+    parser.add_argument("--output", default="bench_ingest.json")
+    args = parser.parse_args()
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    pdf_dir = tempfile.mkdtemp(prefix="rag_bench_pdfs_")
+    write_pdfs(pdf_dir, args.files, args.pages, args.words_per_page)
+    results = {"files": args.files, "pages_per_file": args.pages, "cpu_count": get_cpu_count(), "workers": {}}
+    try:
+        for workers in [int(workers) for workers in args.workers.split(",")]:
+            # worker 수마다 빈 데이터 경로에서 새 프로세스로 실행 (이미 색인된 파일로 건너뛰지 않도록)
+            data_dir = tempfile.mkdtemp(prefix="rag_bench_ingest_")
+            try:
+                result = run(pdf_dir, data_dir, workers)
+                # 같은 checkpoint로 재실행: 모든 파일을 건너뛰어야 함
+                resumed = run(pdf_dir, data_dir, workers)
+                results["workers"][str(workers)] = {**result, "resume_seconds": resumed["elapsed"], "resume_skipped": resumed["skipped"]}
+                print(f"workers={workers}: {result['pages_per_sec']} pages/s, {result['chunks_per_sec']} chunks/s", file=sys.stderr)
+            finally:
+                shutil.rmtree(data_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(pdf_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_result(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# 서버 cold start benchmark: main import 시간(모듈별), warmup step별 시간, /healthz & /readyz 응답까지의 시간
+# usage: cd backend && python -m benchmarks.bench_startup --repeat 3 --output bench_startup.json
+# --stand-ins: 실제 모델 대신 benchmark용 stand-in 모델 사용 (모델 캐시/GPU 불필요)
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import tempfile
+import argparse
+import subprocess
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.common import print_result
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import 비용이 큰 모듈 (main import 시점에 로드되지 않아야 함)
+HEAVY_MODULES = ("torch", "sentence_transformers", "huggingface_hub", "chromadb", "langchain_community", "langchain_openai", "openai")
+
+# 별도 프로세스에서 main import 후 warmup step별 시간 측정
+WARMUP_SCRIPT = """
+import sys, json, time
+started = time.perf_counter()
+import main
+import_seconds = time.perf_counter() - started
+loaded = [name for name in {heavy_modules!r} if name in sys.modules]
+if {stand_ins!r}:
+    from benchmarks.bench_startup import register_stand_ins
+    register_stand_ins()
+from apps import startup
+steps = {{}}
+for name, step in startup.STEPS:
+    step_started = time.perf_counter()
+    step()
+    steps[name] = round(time.perf_counter() - step_started, 3)
+from apps import model_registry
+print(json.dumps({{
+    "import_seconds": round(import_seconds, 3),
+    "heavy_modules_loaded_by_import": loaded,
+    "warmup_seconds": steps,
+    "models": model_registry.get_model_stats(),
+}}))
+"""
+
+# uvicorn 서버 실행 (stand-in 사용시 모델 등록 후 실행)
+SERVER_SCRIPT = """
+import uvicorn
+if {stand_ins!r}:
+    from benchmarks.bench_startup import register_stand_ins
+    register_stand_ins()
+import main
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+def register_stand_ins():
+    from apps import model_registry
+    from benchmarks.stand_ins import HashEmbedding, TinyCrossEncoder
+    model_registry.register("embedding", HashEmbedding())
+    model_registry.register("reranking", TinyCrossEncoder())
+
+def get_env(data_dir: str) -> dict:
+    return {
+        **os.environ,
+        "RAG_DATA_DIR": data_dir,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "PYTHONPATH": BACKEND_DIR,
+        "HF_HUB_OFFLINE": os.environ.get("HF_HUB_OFFLINE", "1"),
+    }
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def parse_importtime(stderr: str, top: int) -> dict:
+    # -X importtime 출력: "import time: self [us] | cumulative | imported package"
+    by_package = defaultdict(int)
+    by_module = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        by_package[module.split(".")[0]] += int(self_us)
+        if module.startswith("apps.") or module in ("main", "config"):
+            by_module[module] = int(cumulative_us)
+    packages = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_ms": round(sum(by_package.values()) / 1000, 1),
+        # 패키지별 self time 합계 (상위 N개)
+        "packages_ms": {name: round(us / 1000, 1) for name, us in packages},
+        # 이 repo 모듈별 cumulative time
+        "modules_ms": {name: round(us / 1000, 1) for name, us in sorted(by_module.items())},
+    }
+
+def measure_imports(env: dict, top: int) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(completed.stderr, top)
+
+def measure_warmup(env: dict, stand_ins: bool) -> dict:
+    script = WARMUP_SCRIPT.format(heavy_modules=HEAVY_MODULES, stand_ins=stand_ins)
+    completed = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def measure_server(env: dict, stand_ins: bool, timeout: float) -> dict:
+    port = get_free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVER_SCRIPT.format(stand_ins=stand_ins, port=port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {}
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and "readyz_seconds" not in result:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with {process.returncode}")
+            for endpoint in ("healthz", "readyz"):
+                key = f"{endpoint}_seconds"
+                if key in result:
+                    continue
+                try:
+                    response = httpx.get(f"http://127.0.0.1:{port}/{endpoint}", timeout=1)
+                except httpx.HTTPError:
+                    break
+                if response.status_code == 200:
+                    result[key] = round(time.perf_counter() - started, 3)
+            time.sleep(0.02)
+        if "readyz_seconds" not in result:
+            raise TimeoutError(f"server was not ready in {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20, help="import 시간 상위 패키지 수")
+    parser.add_argument("--stand-ins", action="store_true", help="stand-in 모델 사용")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", default="bench_startup.json")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="rag_bench_startup_")
+    env = get_env(data_dir)
+    results = {"stand_ins": args.stand_ins, "runs": []}
+    try:
+        # 첫 실행은 .pyc 생성 & OS page cache 적재 비용이 포함되므로 별도 기록
+        for i in range(args.repeat + 1):
+            run = {
+                "imports": measure_imports(env, args.top),
+                "warmup": measure_warmup(env, args.stand_ins),
+                "server": measure_server(env, args.stand_ins, args.timeout),
+            }
+            if i == 0:
+                results["cold"] = run
+            else:
+                results["runs"].append(run)
+            print(f"run {i}: import {run['warmup']['import_seconds']}s, healthz {run['server']['healthz_seconds']}s, "
+                  f"readyz {run['server']['readyz_seconds']}s", file=sys.stderr)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_result(results)
+
+if __name__ == "__main__":
+    main()
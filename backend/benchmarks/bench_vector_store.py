@@ -0,0 +1,155 @@
+# vector backend(chroma / flat mmap / int8) 별 색인 시간, 검색 latency, recall, 메모리 & 디스크 사용량 비교
+# usage: cd backend && python -m benchmarks.bench_vector_store --sizes 1000,10000,100000 --output bench_vector_store.json
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from benchmarks.common import measure_each, print_result
+
+# name -> (vector_db.backend, flat quantization, flat rescore_factor)
+BACKENDS = {
+    "chroma": ("chroma", "none", 0),
+    "flat": ("flat", "none", 0),
+    "flat_int8": ("flat", "int8", 4),
+    "flat_int8_no_rescore": ("flat", "int8", 0),
+}
+BATCH_SIZE = 1000
+
+def get_vectors(count: int, dim: int, seed: int, clusters: int = 100) -> np.ndarray:
+    # 실제 embedding처럼 군집이 있는 단위 vector
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(0).standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=count)] + rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def get_memory_mb() -> dict:
+    # RssAnon: 프로세스 전용 메모리, RssFile: mmap 등 page cache와 공유되는 메모리
+    memory = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("RssAnon", "RssFile"):
+                memory[key] = int(value.split()[0]) / 1024
+    return memory
+
+def get_dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return round(total / (1024 * 1024), 2)
+
+def configure(data_dir: str, backend: str):
+    os.environ["RAG_DATA_DIR"] = data_dir
+    from config import CONFIG_DATA
+    vector_db, quantization, rescore_factor = BACKENDS[backend]
+    CONFIG_DATA['vector_db']['backend'] = vector_db
+    CONFIG_DATA['vector_db']['flat'] = {"quantization": quantization, "rescore_factor": rescore_factor}
+
+def build(data_dir: str, backend: str, collection_name: str, vectors: np.ndarray) -> float:
+    configure(data_dir, backend)
+    from apps.utils import get_collection_from_vector_store
+    started = time.perf_counter()
+    collection = get_collection_from_vector_store(collection_name)
+    for start in range(0, len(vectors), BATCH_SIZE):
+        end = min(start + BATCH_SIZE, len(vectors))
+        collection.upsert(
+            ids=[f"{collection_name}_{i}" for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            documents=[f"chunk {i}" for i in range(start, end)],
+            metadatas=[{"page": i // 10, "start_index": i} for i in range(start, end)],
+        )
+    return time.perf_counter() - started
+
+def search_worker(data_dir: str, backend: str, collection_name: str, queries: list, pool_size: int, output):
+    # 새 프로세스에서 open -> 검색만 실행하여 cold start & 메모리 사용량 측정
+    configure(data_dir, backend)
+    from apps.utils import get_collection_from_vector_store
+    memory_before = get_memory_mb()
+
+    started = time.perf_counter()
+    collection = get_collection_from_vector_store(collection_name)
+    collection.query(query_embeddings=[queries[0]], n_results=pool_size, include=["distances"])
+    first_query = time.perf_counter() - started
+
+    found = []
+    def query(query_embedding):
+        result = collection.query(query_embeddings=[query_embedding], n_results=pool_size, include=["distances"])
+        found.append(result["ids"][0])
+    latency = measure_each(query, queries, warmup=0)
+    # search.get_documents 와 같이 fusion 이후 후보의 본문 & metadata 조회
+    fetch = measure_each(lambda ids: collection.get(ids=ids, include=["documents", "metadatas"]), found)
+
+    memory_after = get_memory_mb()
+    output.put({
+        "first_query_ms": round(first_query * 1000, 2),
+        "query": latency,
+        "fetch": fetch,
+        "rss_anon_delta_mb": round(memory_after["RssAnon"] - memory_before["RssAnon"], 1),
+        "rss_file_delta_mb": round(memory_after["RssFile"] - memory_before["RssFile"], 1),
+        "found": found,
+    })
+
+def recall_at_k(found: list, exact: np.ndarray, ids: np.ndarray, k: int) -> float:
+    return float(np.mean([len(set(f[:k]) & set(ids[e[:k]])) / k for f, e in zip(found, exact)]))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000", help="corpus sizes in chunks (comma separated)")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=50)
+    parser.add_argument("--output", default="bench_vector_store.json")
+    args = parser.parse_args()
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    context = multiprocessing.get_context("spawn")
+    results = {"dim": args.dim, "pool_size": args.pool_size, "cpu_count": os.cpu_count(), "sizes": {}}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        vectors = get_vectors(size, args.dim, seed=size)
+        queries = get_vectors(args.queries, args.dim, seed=size + 1)
+        # 정답: brute-force 정확한 top-k
+        exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+        results["sizes"][str(size)] = {}
+
+        for backend in args.backends.split(","):
+            data_dir = tempfile.mkdtemp(prefix="rag_bench_vs_")
+            collection_name = f"bench_{size}"
+            try:
+                # 색인은 별도 프로세스에서 (backend별 client/설정이 섞이지 않도록)
+                with context.Pool(1) as pool:
+                    build_seconds = pool.apply(build, (data_dir, backend, collection_name, vectors))
+                output = context.Queue()
+                worker = context.Process(
+                    target=search_worker,
+                    args=(data_dir, backend, collection_name, queries.tolist(), args.pool_size, output),
+                )
+                worker.start()
+                result = output.get()
+                worker.join()
+
+                found = result.pop("found")
+                ids = np.asarray([f"{collection_name}_{i}" for i in range(size)])
+                results["sizes"][str(size)][backend] = {
+                    "build_seconds": round(build_seconds, 2),
+                    "disk_mb": get_dir_size_mb(data_dir),
+                    "recall_at_10": round(recall_at_k(found, exact, ids, 10), 4),
+                    **result,
+                }
+                print(f"{size} {backend}: {results['sizes'][str(size)][backend]['query']}", file=sys.stderr)
+            finally:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_result(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# gunicorn worker 수별 /search 처리량 & 메모리(RSS/PSS/USS) 측정 (preload로 모델 weight 공유 여부 비교)
+# usage: cd backend && python -m benchmarks.bench_workers --workers 1,2,4 --weight-mb 300 --output bench_workers.json
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import socket
+import tempfile
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+from benchmarks.common import percentiles, print_result
+from benchmarks.stand_ins import HashEmbedding, TinyCrossEncoder
+from benchmarks.synthetic import make_pdf, get_page_texts, get_queries
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 임시 gunicorn 설정: gunicorn_conf.py를 그대로 사용하고 모델만 stand-in으로 등록
+CONF_TEMPLATE = """
+import gunicorn_conf
+from gunicorn_conf import *
+from benchmarks.bench_workers import register_stand_ins
+
+preload_app = {preload}
+
+def when_ready(server):
+    if preload_app:
+        register_stand_ins({weight_mb})
+        gunicorn_conf.when_ready(server)
+
+def post_fork(server, worker):
+    if not preload_app:
+        # preload 미사용: worker마다 모델을 따로 로드
+        register_stand_ins({weight_mb})
+    gunicorn_conf.post_fork(server, worker)
+"""
+
+class WeightedCrossEncoder(TinyCrossEncoder):
+    # 실제 reranker처럼 큰 weight를 가진 stand-in (점수 계산에는 사용하지 않음)
+    def __init__(self, weight_mb: int):
+        super().__init__()
+        self.weights = np.random.default_rng(0).standard_normal(weight_mb * 1024 * 1024 // 4).astype(np.float32)
+
+def register_stand_ins(weight_mb: int):
+    from config import CONFIG_DATA
+    from apps import model_registry
+    # 매 요청마다 검색 경로를 측정하기 위해 답변 캐시 비활성화
+    CONFIG_DATA['answer_cache']['enabled'] = False
+    model_registry.register("embedding", HashEmbedding())
+    model_registry.register("reranking", WeightedCrossEncoder(weight_mb))
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def get_children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+def get_memory_mb(pid: int) -> dict:
+    # Pss: 공유 page를 공유하는 프로세스 수로 나눈 값, Uss(Private): 프로세스 전용 page
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                memory[key] = int(value.split()[0]) / 1024
+    return {
+        "rss_mb": memory["Rss"],
+        "pss_mb": memory["Pss"],
+        "uss_mb": memory["Private_Clean"] + memory["Private_Dirty"],
+    }
+
+def start_server(conf_path: str, data_dir: str, workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "RAG_DATA_DIR": data_dir,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "PROMETHEUS_MULTIPROC_DIR": os.path.join(data_dir, "metrics"),
+        "PYTHONPATH": BACKEND_DIR,
+    }
+    os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", conf_path, "-w", str(workers), "-b", f"127.0.0.1:{port}", "main:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}")
+        # 모든 worker가 뜰 때까지 대기
+        if len(get_children(process.pid)) >= workers:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=5).raise_for_status()
+                return process
+            except httpx.HTTPError:
+                pass
+        time.sleep(0.5)
+    process.kill()
+    raise TimeoutError("gunicorn did not start in 300s")
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def index_corpus(base_url: str, files: int, pages: int) -> list:
+    file_infos = []
+    with httpx.Client(base_url=base_url, timeout=300) as client:
+        for i in range(files):
+            pdf = make_pdf(get_page_texts(pages, words_per_page=300, seed=i))
+            response = client.post("/file", files={"file": (f"doc_{i}.pdf", pdf, "application/pdf")})
+            response.raise_for_status()
+            file_info = response.json()
+            job = client.post("/indexing", json={**file_info, "extract_images": False}).json()
+            while job["status"] not in ("done", "failed"):
+                time.sleep(0.1)
+                job = client.get(f"/indexing/{job['job_id']}").json()
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            file_infos.append({"file_id": file_info["file_id"], "name": file_info["name"]})
+    return file_infos
+
+def load_test(base_url: str, file_infos: list, queries: list, concurrency: int) -> dict:
+    def search(query):
+        started = time.perf_counter()
+        response = client.post("/search", json={
+            "file_infos": file_infos,
+            "messages": [{"role": "user", "content": query}],
+        })
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    limits = httpx.Limits(max_connections=concurrency)
+    with httpx.Client(base_url=base_url, timeout=120, limits=limits) as client:
+        # warmup (worker별 collection open & bm25 index load)
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(search, queries[:concurrency * 2]))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(search, queries))
+        elapsed = time.perf_counter() - started
+    return {"requests_per_sec": round(len(queries) / elapsed, 2), "latency": percentiles(samples)}
+
+def get_descendants(pid: int) -> list:
+    children = get_children(pid)
+    return children + [descendant for child in children for descendant in get_descendants(child)]
+
+def measure_memory(process: subprocess.Popen) -> dict:
+    workers = [get_memory_mb(pid) for pid in get_children(process.pid)]
+    # 색인시 worker가 띄운 page parsing process도 같은 page를 공유하므로 합산에 포함
+    processes = [process.pid] + get_descendants(process.pid)
+    memory = [get_memory_mb(pid) for pid in processes]
+    total = {key: round(sum(item[key] for item in memory), 1) for key in memory[0]}
+    return {"master": memory[0], "workers": workers, "processes": len(processes), "total": total}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="gunicorn worker 수 (comma separated)")
+    parser.add_argument("--weight-mb", type=int, default=300, help="stand-in reranker weight 크기")
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-preload", action="store_true", help="preload 미사용(worker마다 모델 로드)도 함께 측정")
+    parser.add_argument("--output", default="bench_workers.json")
+    args = parser.parse_args()
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    data_dir = tempfile.mkdtemp(prefix="rag_bench_workers_")
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    results = {"cpu_count": cpu_count, "weight_mb": args.weight_mb, "concurrency": args.concurrency, "runs": {}}
+    queries = get_queries(args.requests, seed=1)
+    modes = [True, False] if args.no_preload else [True]
+    try:
+        file_infos = None
+        for preload in modes:
+            conf_path = os.path.join(data_dir, f"gunicorn_bench_{int(preload)}.py")
+            with open(conf_path, "w") as f:
+                f.write(CONF_TEMPLATE.format(preload=preload, weight_mb=args.weight_mb))
+            for workers in [int(workers) for workers in args.workers.split(",")]:
+                port = get_free_port()
+                process = start_server(conf_path, data_dir, workers, port)
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    if file_infos is None:
+                        file_infos = index_corpus(base_url, args.files, args.pages)
+                    # 모델 로드 직후 & 부하 이후 (요청 처리 중 copy-on-write 된 page 확인)
+                    memory_idle = measure_memory(process)
+                    result = load_test(base_url, file_infos, queries, args.concurrency)
+                    result["memory_idle"] = memory_idle
+                    result["memory"] = measure_memory(process)
+                finally:
+                    stop_server(process)
+                name = f"{'preload' if preload else 'no_preload'}_{workers}"
+                results["runs"][name] = result
+                print(f"{name}: {result['requests_per_sec']} req/s, p99 {result['latency']['p99_ms']}ms, "
+                      f"pss {result['memory']['total']['pss_mb']}MB", file=sys.stderr)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_result(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import time
+import json
+import numpy as np
+
+def percentiles(samples, points=(50, 99)) -> dict:
+    # seconds -> milliseconds
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    result = {f"p{p}_ms": round(float(np.percentile(values, p)), 4) for p in points}
+    result["mean_ms"] = round(float(values.mean()), 4)
+    result["n"] = len(values)
+    return result
+
+def measure(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+def print_result(result: dict):
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+def measure_each(fn, items, warmup: int = 1) -> dict:
+    # 입력(질의 등)마다 1회씩 실행한 latency 분포
+    for item in items[:warmup]:
+        fn(item)
+    samples = []
+    for item in items:
+        started = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
@@ -0,0 +1,59 @@
+# GPU/네트워크 없이 동작하는 모델 stand-in (benchmark용)
+import re
+import hashlib
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+_word_pattern = re.compile(r"\w+")
+
+def _hash_features(text: str, dim: int) -> np.ndarray:
+    # 단어별 hash bucket & 부호로 만든 bag-of-words vector
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _word_pattern.findall(text.lower()):
+        digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[digest % dim] += 1.0 if (digest >> 32) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class HashEmbedding(Embeddings):
+    # 같은 텍스트는 항상 같은 vector, 단어가 겹칠수록 cosine 유사도가 높음
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        # RerankCompressor는 embedding.client.encode를 사용
+        self.client = self
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            return _hash_features(texts, self.dim)
+        return np.stack([_hash_features(text, self.dim) for text in texts])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode(text).tolist()
+
+class TinyCrossEncoder:
+    # CrossEncoder.predict와 같은 interface, 질의/문서 feature를 1-layer MLP로 점수화
+    def __init__(self, dim: int = 256, hidden: int = 64, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.w1 = rng.standard_normal((dim * 2, hidden)).astype(np.float32) / np.sqrt(dim)
+        self.w2 = rng.standard_normal(hidden).astype(np.float32) / np.sqrt(hidden)
+
+    def predict(self, pairs, batch_size: int = 32, **kwargs) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            queries = np.stack([_hash_features(query, self.dim) for query, _ in batch])
+            docs = np.stack([_hash_features(doc, self.dim) for _, doc in batch])
+            hidden = np.maximum(np.concatenate([queries * docs, np.abs(queries - docs)], axis=1) @ self.w1, 0)
+            # 단어 겹침(cosine) + MLP 출력
+            scores.append((queries * docs).sum(axis=1) * 10 + hidden @ self.w2)
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+def get_fake_chat_model(answer: str = "This is a benchmark answer.") -> FakeListChatModel:
+    return FakeListChatModel(responses=[answer])
@@ -0,0 +1,52 @@
+# synthetic PDF corpus 생성 (benchmark용)
+import random
+from typing import List
+
+def get_vocabulary(size: int = 5000) -> List[str]:
+    # corpus와 질의가 같은 단어집합을 사용하도록 seed 고정
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+def get_page_texts(pages: int, words_per_page: int = 50, seed: int = 0) -> List[str]:
+    # zipf 분포로 단어를 뽑아 실제 문서와 비슷한 term 빈도를 만듦
+    rng = random.Random(seed)
+    vocabulary = get_vocabulary()
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    return [" ".join(rng.choices(vocabulary, weights=weights, k=words_per_page)) for _ in range(pages)]
+
+def get_queries(count: int, words: int = 4, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = get_vocabulary()
+    return [" ".join(rng.sample(vocabulary[:2000], words)) for _ in range(count)]
+
+def make_pdf(page_texts: List[str]) -> bytes:
+    # 페이지당 1줄의 텍스트를 가진 최소한의 PDF (pypdf로 추출 가능)
+    count = len(page_texts)
+    font_ref = 3 + 2 * count
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(count))}] /Count {count} >>".encode(),
+    ]
+    for i, text in enumerate(page_texts):
+        stream = f"BT /F1 10 Tf 36 750 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_ref} 0 R >> >> /Contents {4 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    parts = [b"%PDF-1.4\n"]
+    offsets = []
+    position = len(parts[0])
+    for number, body in enumerate(objects, start=1):
+        obj = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        offsets.append(position)
+        parts.append(obj)
+        position += len(obj)
+    xref = [b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)]
+    xref += [b"%010d 00000 n \n" % offset for offset in offsets]
+    parts += xref
+    parts.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, position))
+    return b"".join(parts)
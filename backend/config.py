@@ -7,8 +7,10 @@ import os
 BACKEND_DIR = Path(__file__).parent
 # 프로젝트 경로
 BASE_DIR = BACKEND_DIR.parent
-# 데이터 저장 경로
-DATA_DIR = Path(os.path.join(BACKEND_DIR, "data")).resolve()
+# 설정 파일 경로
+CONFIG_PATH = Path(os.path.join(BACKEND_DIR, "data", "config.json")).resolve()
+# 데이터 저장 경로 (RAG_DATA_DIR 환경변수로 변경 가능, 예: benchmark)
+DATA_DIR = Path(os.environ.get("RAG_DATA_DIR") or os.path.join(BACKEND_DIR, "data")).resolve()
 # 프론트엔드 소스 경로
 FRONTEND_DIR = Path(os.path.join(BASE_DIR, "frontend")).resolve()
 
@@ -16,15 +18,44 @@ FRONTEND_DIR = Path(os.path.join(BASE_DIR, "frontend")).resolve()
 UPLOAD_DIR = Path(os.path.join(DATA_DIR, "uploads")).resolve()
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# 파일관리 DB 경로
+FILE_DB_PATH = os.path.join(DATA_DIR, 'file_index_db.sqlite3')
+
 # vector db path
 CHROMA_DATA_PATH = os.path.join(DATA_DIR, 'vector_db')
 
+# flat(mmap) vector index path (vector_db.backend == "flat")
+FLAT_DATA_PATH = os.path.join(DATA_DIR, 'flat_index')
+
+# bm25 index path
+BM25_DATA_PATH = os.path.join(DATA_DIR, 'bm25_index')
+Path(BM25_DATA_PATH).mkdir(parents=True, exist_ok=True)
+
+# 프로세스간 lock 파일 경로 (multi-worker 실행시 collection 쓰기 등)
+LOCK_DIR = os.path.join(DATA_DIR, "locks")
+Path(LOCK_DIR).mkdir(parents=True, exist_ok=True)
+
+# gunicorn multi-worker 실행시 prometheus metric 공유 경로 (PROMETHEUS_MULTIPROC_DIR)
+METRICS_MULTIPROC_DIR = os.path.join(DATA_DIR, "metrics")
+
+# 일괄 색인(apps.ingest) checkpoint 경로
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "checkpoints")
+Path(CHECKPOINT_DIR).mkdir(parents=True, exist_ok=True)
+
 # 임베딩 모델 다운로드 경로
 SENTENCE_TRANSFORMERS_HOME = os.path.join(DATA_DIR, "cache", "embedding", "models")
 Path(SENTENCE_TRANSFORMERS_HOME).mkdir(parents=True, exist_ok=True)
 
+# 답변 생성 모델 tokenizer(tiktoken) 파일 경로, tiktoken은 첫 사용시 다운로드하므로 배포시 미리 받아둠
+TIKTOKEN_CACHE_DIR = os.path.join(DATA_DIR, "cache", "tiktoken")
+Path(TIKTOKEN_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+
+# chunk embedding 캐시 경로
+EMBEDDING_CACHE_PATH = os.path.join(DATA_DIR, "cache", "embedding", "embedding_cache.db")
+
 try:
-    CONFIG_DATA = json.loads((DATA_DIR / "config.json").read_text())
+    CONFIG_DATA = json.loads(CONFIG_PATH.read_text())
 except:
     CONFIG_DATA = {}
 
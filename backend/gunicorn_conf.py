@@ -0,0 +1,61 @@
+# gunicorn multi-worker 설정
+# usage: cd backend && gunicorn -c gunicorn_conf.py main:app
+# - preload_app: master에서 app import & 모델 로드/warmup 후 fork -> worker들이 모델 weight 메모리(copy-on-write)를 공유
+# - worker 수 & worker당 torch thread 수는 data/config.json의 server 항목으로 설정
+import gc
+import os
+import shutil
+
+from config import (CONFIG_DATA, METRICS_MULTIPROC_DIR)
+
+# fork 이후 huggingface tokenizers의 thread pool이 deadlock 되지 않도록
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+# prometheus metric을 worker간 파일로 공유 (prometheus_client import 전에 설정해야 함)
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    # 이전 실행에서 남은 metric 파일 제거
+    shutil.rmtree(METRICS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = METRICS_MULTIPROC_DIR
+
+bind = f"{CONFIG_DATA['server']['host']}:{CONFIG_DATA['server']['port']}"
+workers = CONFIG_DATA['server']['workers']
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# 모델 로드 & 대용량 PDF 색인 요청을 고려
+timeout = 300
+graceful_timeout = 60
+
+def get_cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def get_threads_per_worker(workers: int) -> int:
+    # 0이면 CPU를 worker 수만큼 나눠서 사용 (worker마다 전체 CPU 수만큼 thread를 띄우면 서로 경합)
+    threads = CONFIG_DATA['server']['threads_per_worker']
+    return threads or max(1, get_cpu_count() // workers)
+
+def _set_torch_threads(threads: int):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+def when_ready(server):
+    # fork 전에 master에서 모델 로드 & warmup (master의 torch thread pool은 fork 후 사용할 수 없으므로 1개로 제한)
+    from apps import startup
+    _set_torch_threads(1)
+    startup.warmup_models()
+    # 이후 생성된 객체만 GC 대상으로 (GC가 공유 page의 객체 header를 수정하여 copy-on-write 되는 것을 방지)
+    gc.freeze()
+    server.log.info(f"when_ready(): models loaded, {server.cfg.workers} workers x {get_threads_per_worker(server.cfg.workers)} threads")
+
+def post_fork(server, worker):
+    # -w 옵션으로 변경한 worker 수 기준
+    _set_torch_threads(get_threads_per_worker(server.cfg.workers))
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
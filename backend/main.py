@@ -1,24 +1,29 @@
 import os
+import json
+import time
 import logging
+from typing import Optional
 from config import (
     GLOBAL_LOG_LEVEL,
-    UPLOAD_DIR,
     CONFIG_DATA
 )
 
 if CONFIG_DATA['openai_api_key']:
     os.environ["OPENAI_API_KEY"] = CONFIG_DATA['openai_api_key']
-else:
-    import getpass
-    os.environ["OPENAI_API_KEY"] = getpass.getpass("OpenAI API Key:")
+elif not os.environ.get("OPENAI_API_KEY"):
+    # multi-worker/서비스 환경에서는 입력을 기다릴 수 없으므로 바로 종료
+    raise SystemExit("OpenAI API key is not set: set openai_api_key in data/config.json or the OPENAI_API_KEY environment variable.")
 
 from fastapi import (
     FastAPI,
-    UploadFile,
-    File,
+    Request,
+    Response,
     HTTPException,
     status
 )
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from sse_starlette.sse import EventSourceResponse
 import uuid
 import uvicorn
 from langchain_core.pydantic_v1 import BaseModel
@@ -26,11 +31,18 @@ from langserve import add_routes, CustomUserType
 from langchain.schema.runnable import RunnablePassthrough
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableLambda
 
-from apps import index
 from apps import search
-from apps.utils import get_last_user_message, search_file_db, insert_file_db, update_index_complete
+from apps import jobs
+from apps import upload
+from apps import answer_cache
+from apps import metrics
+from apps import startup
+from apps import batching
+from apps import executors
+from apps import lifecycle
+from apps.utils import get_last_user_message, search_file_db, insert_file_db
 
 # log setting
 log = logging.getLogger(__name__)
@@ -42,47 +54,90 @@ app = FastAPI(
     description="RAG Chatbot API Server",
 )
 
+@app.on_event("startup")
+def load_models():
+    # 임베딩/리랭킹 모델 로드 & warmup은 background에서 실행 (완료 여부는 /readyz)
+    startup.start()
+    # 오래 검색되지 않은 파일 eviction & 디스크 compaction (lifecycle 설정)
+    lifecycle.start()
+
+@app.exception_handler(batching.SchedulerSaturated)
+def scheduler_saturated(request: Request, exc: batching.SchedulerSaturated):
+    # 추론 대기열이 가득 찬 경우 기다리게 하지 않고 재시도 요청
+    log.warning(exc)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
+@app.get("/healthz")
+def healthz():
+    # liveness: 프로세스가 요청을 받을 수 있는지만 확인
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz(response: Response):
+    # readiness: 모델 warmup & 저장소 open이 끝난 경우에만 200
+    result = startup.get_status()
+    if not result["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return result
+
 @app.post("/file")
-def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request):
+    # UploadFile(File(...))은 handler 실행 전에 body 전체를 임시파일로 spool하므로 request stream을 직접 parse
     try:
-        log.info(f"upload_file(): {file.filename}")
-        # metadata
-        unsanitized_filename = file.filename
-        filename = os.path.basename(unsanitized_filename)
-        file_ext = filename.split(".")[-1].lower()
-        file_size = file.size
-        
-        # 파일관리 DB 검색 - 중복방지
-        result = search_file_db(filename=filename, file_size=file_size)
+        # 파일 내용을 읽기 전에 크기 검사 (chunked 요청은 받는 도중 receive_upload에서 검사)
+        content_length = int(request.headers.get("content-length") or 0)
+        if content_length > CONFIG_DATA['upload']['max_size'] + CONFIG_DATA['upload']['chunk_size']:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File is larger than {CONFIG_DATA['upload']['max_size']} bytes."
+            )
+
+        # Check if the file is a PDF
+        # python magic은 운영체제에 따라 설치 및 사용방법이 달라 사용 보류, 확장자 & magic bytes는 받는 도중 검사
+        # chunk 단위로 UPLOAD_DIR의 임시파일에 저장하면서 sha256 계산
+        filename, temp_path, file_size, content_hash = await upload.receive_upload(
+            request.stream(), request.headers.get("content-type")
+        )
+        log.info(f"upload_file(): {filename}")
+
+        # 파일관리 DB 검색 - 내용(sha256)이 같은 파일은 중복 업로드/색인 방지
+        # content_hash가 없는 이전 버전 파일은 이름 & 크기로 확인
+        result = await run_in_threadpool(search_file_db, filename=filename, file_size=file_size, content_hash=content_hash)
         if result:
+            if os.path.exists(upload.get_upload_path(result['file_id'])):
+                upload.discard_upload(temp_path)
+            else:
+                # 업로드 파일이 없는 이전 버전 파일은 다시 색인할 수 있도록 복원
+                upload.commit_upload(temp_path, result['file_id'])
             return {'file_id': result['file_id'], 'name': result['name']}
             
         id = str(uuid.uuid4())
-        file_path = os.path.join(UPLOAD_DIR, id)
-        contents = file.file.read()
-        
-        # Check if the file is a PDF
-        # python magic은 운영체제에 따라 설치 및 사용방법이 달라 사용 보류
-
-        # mimeType = magic.from_buffer(contents, mime=True)
-        # if mimeType != "application/pdf":
-        if file_ext != "pdf":
-            log.exception(f"{file.content_type} content_type not allowed.")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Only PDF files are allowed."
-            )
-        
-        with open(file_path, "wb") as f:
-            f.write(contents)
-            f.close()
-        insert_file_db(id, filename, file_size)
+        upload.commit_upload(temp_path, id)
+        await run_in_threadpool(insert_file_db, id, filename, file_size, content_hash)
         return {'file_id': id, 'name': filename}
+    except HTTPException:
+        raise
+    except upload.InvalidFileType as e:
+        log.warning(e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except upload.FileTooLarge as e:
+        log.warning(e)
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         log.exception(e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=e
+            detail=str(e)
         )
 
 class IndexParams(BaseModel):
@@ -97,20 +152,17 @@ def indexing(index_params: IndexParams):
         # 파일관리 DB 검색 - 중복작업방지
         result = search_file_db(file_id=index_params.file_id)
         if result and result['docs_count'] > 0:
-            return {'file_id': result['file_id'], 'name': result['name'], "docs_count": result['docs_count']}
+            return {'file_id': result['file_id'], 'name': result['name'], "docs_count": result['docs_count'], "status": "done"}
         
-        # get loader
-        loader = index.get_loader(index_params.file_id, extract_images=index_params.extract_images)
-        data = loader.load()
-        # log.info(f"indexing() len(data): {len(data)}")
-        # split chunk
-        docs = index.get_split_docs(data, index_params.name)
-        # log.info(f"indexing() len(docs): {len(docs)}")
-        # store vector DB
-        index.store_docs_in_vector_db(docs=docs, collection_name=index_params.file_id)
-        
-        update_index_complete(index_params.file_id, len(docs))
-        return {"file_id": index_params.file_id, "name": index_params.name, "docs_count": len(docs)}
+        # 색인은 background job으로 실행하고 job id를 바로 반환
+        job = jobs.submit_index_job(index_params.file_id, index_params.name, extract_images=index_params.extract_images)
+        return job.to_dict()
+    except jobs.JobQueueFull as e:
+        log.warning(e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         log.exception(e)
         raise HTTPException(
@@ -118,28 +170,123 @@ def indexing(index_params: IndexParams):
             detail=str(e)
         )
 
-llm = ChatOpenAI(model="gpt-3.5-turbo")
+@app.delete("/file/{file_id}")
+def delete_file(file_id: str):
+    # 업로드 원본, vector collection, bm25 index, 파일관리 DB row 삭제
+    try:
+        return lifecycle.delete_file(file_id)
+    except lifecycle.FileNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except lifecycle.FileBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+@app.get("/storage")
+def storage():
+    # 파일(collection)별 디스크 사용량 & 마지막 검색 시각
+    return lifecycle.get_storage()
+
+@app.get("/indexing/{job_id}")
+def indexing_status(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"job {job_id} not found"
+        )
+    return job.to_dict()
+
+# 답변 생성 모델은 첫 사용시 생성 (langchain_openai import 비용을 서버 시작에서 제외)
+llm = None
+
+def get_llm():
+    global llm
+    if llm is None:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model=CONFIG_DATA['rag']['llm_model'])
+    return llm
+
 # generation parameters
 class SearchRequest(CustomUserType):
     file_infos: list[dict] = None
     messages: list[dict]
+    # stage별 소요시간(ms)을 응답에 포함
+    debug_timings: bool = False
 
-@app.post("/search")
-def searching(request: SearchRequest):
+async def retrieve(request: SearchRequest) -> dict:
+    if not request.debug_timings:
+        with metrics.span("search"):
+            return await _retrieve(request)
+
+    token = metrics.start_timings()
+    try:
+        with metrics.span("search"):
+            result = await _retrieve(request)
+    finally:
+        timings = metrics.stop_timings(token)
+    return {**result, "debug_timings": timings}
+
+async def _retrieve(request: SearchRequest) -> dict:
     context = ""
     citations = []
+    context_stats = {}
+    question = get_last_user_message(request.messages)
+    cache_token = None
+    file_infos = request.file_infos
+    if file_infos:
+        # 삭제/eviction된 파일은 제외하고 마지막 검색 시각 갱신
+        existing = await executors.run("search", lifecycle.record_access, [file_info['file_id'] for file_info in file_infos])
+        file_infos = [file_info for file_info in file_infos if file_info['file_id'] in existing]
     # search
-    if request.file_infos:
-        contexts, citations = search.get_rag_context(
-            file_infos=request.file_infos,
-            messages=request.messages,
-            k=CONFIG_DATA['rag']['top_k'],
-            r=CONFIG_DATA['rag']['relevance_threshold'],
-            llm=llm
+    if file_infos:
+        search_params = {
+            "file_infos": file_infos,
+            "messages": request.messages,
+            "k": CONFIG_DATA['rag']['top_k'],
+            "r": CONFIG_DATA['rag']['relevance_threshold'],
+            "llm": get_llm(),
+        }
+        rag_query, speculative = await search.get_rag_query(
+            request.messages,
+            search_params["llm"],
+            speculate=lambda query: search.submit_rag_context(**search_params, rag_query=query),
+        )
+        file_ids = [file_info['file_id'] for file_info in file_infos]
+        query_embedding = None
+        if answer_cache.is_enabled():
+            # 같은 파일들에 대한 유사 질문은 캐시된 context & 답변을 반환
+            query_embedding = await search.embed_query(rag_query)
+            with metrics.span("answer_cache_lookup"):
+                entry = answer_cache.answer_cache.lookup(query_embedding, file_ids)
+            metrics.count_cache("answer", hits=int(entry is not None), misses=int(entry is None))
+            if entry:
+                # 재작성 전 질의로 미리 시작한 검색은 사용하지 않으므로 중단
+                if speculative is not None:
+                    speculative.cancel()
+                return {"context": entry.context, "question": question, "citations": entry.citations, "answer": entry.answer, "cached": True}
+
+        contexts, citations, context_stats = await search.get_rag_context(
+            **search_params,
+            rag_query=rag_query,
+            query_embedding=query_embedding,
+            speculative=speculative,
         )
-        context = "/n".join(contexts).strip()
+        context = "\n\n".join(contexts).strip()
+        if answer_cache.is_enabled():
+            answer_cache.answer_cache.add(query_embedding, file_ids, question, context, citations)
+            # /invoke 요청은 다른 worker 프로세스에서 처리될 수 있으므로 캐시 항목을 token으로 전달
+            cache_token = answer_cache.answer_cache.get_token(query_embedding, file_ids, question, context, citations)
 
-    return {"context": context, "question": get_last_user_message(request.messages), "citations": citations}
+    return {"context": context, "question": question, "citations": citations, "cached": False, "context_stats": context_stats, "cache_token": cache_token}
+
+@app.post("/search")
+async def searching(request: SearchRequest):
+    return await retrieve(request)
 
 prompt = ChatPromptTemplate.from_messages([
     ("system","""Use the following context as your learned knowledge, inside <context></context> XML tags.
@@ -158,15 +305,69 @@ prompt = ChatPromptTemplate.from_messages([
     ("human", "{question}")
 ])
 
+class GenerateInput(BaseModel):
+    question: str
+    context: str
+    # /search 응답의 cache_token (답변 캐시 저장용)
+    cache_token: Optional[str] = None
+
+def cache_answer(run):
+    if run.end_time and run.start_time:
+        metrics.observe("generation", (run.end_time - run.start_time).total_seconds())
+    # /search에서 등록한 캐시 항목에 생성된 답변을 저장 (다른 worker의 항목은 cache_token으로 등록)
+    if answer_cache.is_enabled() and run.outputs and not run.error:
+        answer_cache.answer_cache.set_answer(
+            run.inputs.get('question'), run.inputs.get('context'), run.outputs.get('output'), token=run.inputs.get('cache_token')
+        )
+
+# RunnableLambda가 반환한 모델로 prompt를 실행 (stream 포함)
+chain = (prompt | RunnableLambda(lambda _: get_llm(), name="llm") | StrOutputParser()).with_types(input_type=GenerateInput).with_listeners(on_end=cache_answer)
+
 add_routes(
     app,
-    prompt | llm | StrOutputParser()
+    chain
 )
 
+@app.get("/metrics")
+def get_metrics():
+    body, content_type = metrics.get_metrics()
+    return Response(content=body, media_type=content_type)
+
+def sse_event(event: str, data) -> dict:
+    return {"event": event, "data": json.dumps(data, ensure_ascii=False)}
+
+@app.post("/chat")
+async def chat(request: SearchRequest):
+    # 검색 & 답변 생성을 하나의 요청으로 처리
+    # citations -> token(반복) -> end 순서의 SSE 이벤트로 전달
+    async def event_stream():
+        started = time.perf_counter()
+        try:
+            result = await retrieve(request)
+            yield sse_event("citations", {"citations": result['citations'], "cached": result['cached']})
+            log.info(f"chat(): citations sent, {time.perf_counter() - started:.3f}s")
+
+            if result['cached'] and result.get('answer'):
+                yield sse_event("token", result['answer'])
+            else:
+                first_token = True
+                async for token in chain.astream({"context": result['context'], "question": result['question']}):
+                    if first_token:
+                        log.info(f"chat(): first token, {time.perf_counter() - started:.3f}s")
+                        first_token = False
+                    yield sse_event("token", token)
+            yield sse_event("end", {"seconds": round(time.perf_counter() - started, 3)})
+        except Exception as e:
+            log.exception(e)
+            yield sse_event("error", {"detail": str(e)})
+
+    return EventSourceResponse(event_stream())
+
 if __name__ == "__main__":
     # stream_hander = logging.StreamHandler()
     # log.addHandler(stream_hander)
     # request = GenerateRequest(file_infos=[{'file_id': 'fa3dab54-1bfa-4dc7-a1c4-4b56d6610c21', 'name':'2407.01219v1.pdf'}], messages=[{'role': 'assistant', 'content': 'How can I help you?'}, {'role': 'user', 'content': '논문에서 제시된 vector DB중 어떤것이 가장 좋아?'}])
     # print(generate(request))
-    uvicorn.run('main:app', host="0.0.0.0", port=8080)
+    # 단일 프로세스 실행 (multi-worker는 gunicorn -c gunicorn_conf.py main:app)
+    uvicorn.run('main:app', host=CONFIG_DATA['server']['host'], port=CONFIG_DATA['server']['port'])
     # uvicorn.run('main:app', host="0.0.0.0", port=8080, reload=True)
\ No newline at end of file
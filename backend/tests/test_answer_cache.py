@@ -0,0 +1,109 @@
+import time
+import pytest
+from apps import bm25
+from apps.answer_cache import AnswerCache
+from apps.bm25 import BM25Index
+
+# 질의 embedding 대신 단위 vector 사용 (cosine similarity = 내적)
+QUESTION = [1.0, 0.0, 0.0]
+PARAPHRASE = [0.99, 0.141, 0.0]
+OTHER = [0.0, 1.0, 0.0]
+
+def create_cache(**kwargs) -> AnswerCache:
+    params = {"max_size": 8, "ttl": 3600, "similarity_threshold": 0.95}
+    params.update(kwargs)
+    return AnswerCache(**params)
+
+def add_answered(cache: AnswerCache, embedding, file_ids, question="q", answer="answer"):
+    cache.add(embedding, file_ids, question, f"context of {question}", [{"file_id": file_ids[0]}])
+    cache.set_answer(question, f"context of {question}", answer)
+
+def test_similar_question_hits():
+    cache = create_cache()
+    add_answered(cache, QUESTION, ["file-a", "file-b"])
+    entry = cache.lookup(PARAPHRASE, ["file-b", "file-a"])
+    assert entry.answer == "answer"
+    assert entry.citations == [{"file_id": "file-a"}]
+
+    # 유사도가 threshold 미만이거나 파일 집합이 다르면 miss
+    assert cache.lookup(OTHER, ["file-a", "file-b"]) is None
+    assert cache.lookup(QUESTION, ["file-a"]) is None
+
+def test_entry_without_answer_misses():
+    # /search 에서 등록만 되고 답변 생성 전인 항목
+    cache = create_cache()
+    cache.add(QUESTION, ["file-a"], "q", "context", [])
+    assert cache.lookup(QUESTION, ["file-a"]) is None
+    cache.set_answer("q", "other context", "answer")
+    assert cache.lookup(QUESTION, ["file-a"]) is None
+    cache.set_answer("q", "context", "answer")
+    assert cache.lookup(QUESTION, ["file-a"]).answer == "answer"
+
+def test_expired_entry_is_removed(monkeypatch):
+    cache = create_cache(ttl=60)
+    add_answered(cache, QUESTION, ["file-a"])
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.lookup(QUESTION, ["file-a"]) is None
+    assert len(cache) == 0
+
+def test_size_is_bounded_by_lru():
+    cache = create_cache(max_size=2)
+    add_answered(cache, QUESTION, ["file-a"], question="q1", answer="a1")
+    add_answered(cache, QUESTION, ["file-b"], question="q2", answer="a2")
+    # 최근 hit된 항목은 남기고 가장 오래 사용하지 않은 항목부터 제거
+    assert cache.lookup(QUESTION, ["file-a"]).answer == "a1"
+    add_answered(cache, QUESTION, ["file-c"], question="q3", answer="a3")
+    assert len(cache) == 2
+    assert cache.lookup(QUESTION, ["file-b"]) is None
+    assert cache.lookup(QUESTION, ["file-a"]).answer == "a1"
+    assert cache.lookup(QUESTION, ["file-c"]).answer == "a3"
+
+def test_invalidate_removes_entries_of_file():
+    cache = create_cache()
+    add_answered(cache, QUESTION, ["file-a", "file-b"], question="q1")
+    add_answered(cache, QUESTION, ["file-b"], question="q2")
+    add_answered(cache, QUESTION, ["file-c"], question="q3")
+    cache.invalidate("file-b")
+    assert len(cache) == 1
+    assert cache.lookup(QUESTION, ["file-c"]) is not None
+
+def test_reindex_by_other_process_invalidates(tmp_path, monkeypatch):
+    # 다른 worker 프로세스에서 재색인한 경우 invalidate 호출 없이 bm25 index 파일의 version으로 무효화
+    monkeypatch.setattr(bm25, "BM25_DATA_PATH", str(tmp_path))
+    index = BM25Index.from_texts(["test document"], ["file-a_0"])
+    index.save(bm25.get_index_path("file-a"))
+    cache = create_cache(version_fn=bm25.get_index_version)
+    add_answered(cache, QUESTION, ["file-a"])
+    assert cache.lookup(QUESTION, ["file-a"]) is not None
+
+    # 이 프로세스의 invalidate는 호출되지 않고 index 파일만 교체됨
+    BM25Index.from_texts(["new document"], ["file-a_0"]).save(bm25.get_index_path("file-a"))
+    assert cache.lookup(QUESTION, ["file-a"]) is None
+    assert len(cache) == 0
+
+def test_answer_stored_by_other_worker_with_token():
+    # /search 와 /invoke 가 다른 worker 프로세스에서 처리된 경우
+    search_worker = create_cache(secret_fn=lambda: b"secret")
+    invoke_worker = create_cache(secret_fn=lambda: b"secret")
+    search_worker.add(QUESTION, ["file-a"], "q", "context", [{"file_id": "file-a"}])
+    token = search_worker.get_token(QUESTION, ["file-a"], "q", "context", [{"file_id": "file-a"}])
+
+    invoke_worker.set_answer("q", "context", "answer", token=token)
+    entry = invoke_worker.lookup(PARAPHRASE, ["file-a"])
+    assert entry.answer == "answer"
+    assert entry.citations == [{"file_id": "file-a"}]
+
+def test_invalid_token_is_ignored():
+    search_worker = create_cache(secret_fn=lambda: b"secret")
+    token = search_worker.get_token(QUESTION, ["file-a"], "q", "context", [])
+
+    # question/context가 token과 다르거나 서명이 맞지 않으면 저장하지 않음
+    cache = create_cache(secret_fn=lambda: b"secret")
+    cache.set_answer("q", "other context", "answer", token=token)
+    cache.set_answer("q", "context", "answer", token=token[:-1] + "x")
+    cache.set_answer("q", "context", "answer", token="not a token")
+    assert len(cache) == 0
+    other = create_cache(secret_fn=lambda: b"other")
+    other.set_answer("q", "context", "answer", token=token)
+    assert len(other) == 0
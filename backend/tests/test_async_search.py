@@ -0,0 +1,168 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+import pytest
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from apps import search
+
+LATENCY = 0.2
+
+# 동시에 실행중인 LLM 호출 수
+_in_flight = {"current": 0, "peak": 0}
+
+class SlowChatModel(BaseChatModel):
+    # OpenAI 대신 고정 지연 후 응답하는 local LLM
+    latency: float = LATENCY
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-chat"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"answer: {messages[-1].content}"))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        _in_flight["current"] += 1
+        _in_flight["peak"] = max(_in_flight["peak"], _in_flight["current"])
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            _in_flight["current"] -= 1
+        return self._result(messages)
+
+async def handle_request(llm, i: int) -> str:
+    # 질의 재작성(LLM 1회) + 답변 생성(LLM 1회)
+    messages = [
+        {"role": "user", "content": f"Tell me about product {i}"},
+        {"role": "assistant", "content": f"Product {i} is a camera."},
+        {"role": "user", "content": f"How much is it? ({i})"},
+    ]
+    rag_query, _ = await search.get_rag_query(messages, llm)
+    chain = ChatPromptTemplate.from_messages([("human", "{question}")]) | llm | StrOutputParser()
+    return await chain.ainvoke({"question": rag_query})
+
+def measure_peak_concurrency(concurrency: int, requests: int) -> int:
+    async def main():
+        # blocking 작업이 있다면 thread 1개에서 직렬화되도록 기본 executor 크기를 1로 제한
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        llm = SlowChatModel()
+        semaphore = asyncio.Semaphore(concurrency)
+        _in_flight.update(current=0, peak=0)
+
+        async def limited(i):
+            async with semaphore:
+                return await handle_request(llm, i)
+
+        answers = await asyncio.gather(*[limited(i + concurrency * 1000) for i in range(requests)])
+        assert len(answers) == requests
+        return _in_flight["peak"]
+    return asyncio.run(main())
+
+def test_llm_calls_overlap_across_requests():
+    assert measure_peak_concurrency(concurrency=1, requests=4) == 1
+    # thread 1개에서도 모든 요청의 LLM 호출이 event loop에서 동시에 대기 (timing과 무관)
+    assert measure_peak_concurrency(concurrency=32, requests=32) == 32
+
+def test_speculative_retrieval_cancelled_when_rewrite_fails(monkeypatch):
+    from apps import contextualize
+    async def failing_rewrite(llm, query, history):
+        raise RuntimeError("rewrite failed")
+    monkeypatch.setattr(contextualize, "rewrite", failing_rewrite)
+    messages = [
+        {"role": "user", "content": "What is the refund policy?"},
+        {"role": "assistant", "content": "Refunds are available within 30 days."},
+        {"role": "user", "content": "What about it?"},
+    ]
+
+    async def main():
+        tasks = []
+        def speculate(query):
+            tasks.append(asyncio.ensure_future(asyncio.sleep(10)))
+            return tasks[0]
+        with pytest.raises(RuntimeError):
+            await search.get_rag_query(messages, None, speculate=speculate)
+        await asyncio.sleep(0)
+        # asyncio.run 종료시 남은 task는 모두 취소되므로 event loop 안에서 확인
+        return tasks[0].cancelled()
+    assert asyncio.run(main())
+
+BLOCKING = 0.1
+
+class SlowCollection:
+    # vector store 조회마다 BLOCKING초 동안 thread를 막는 collection
+    def __init__(self, name: str):
+        self.name = name
+        self.ids = [f"{name}_{i}" for i in range(5)]
+
+    def query(self, query_embeddings, n_results, include):
+        time.sleep(BLOCKING)
+        return {"ids": [self.ids[:n_results]], "distances": [[float(i) for i in range(min(n_results, len(self.ids)))]]}
+
+    def get(self, ids, include):
+        time.sleep(BLOCKING)
+        return {"ids": ids, "documents": [f"camera text {chunk_id}" for chunk_id in ids], "metadatas": [{"page": 0} for _ in ids]}
+
+class SlowBM25Index:
+    def get_top_k_arrays(self, query, k):
+        import numpy as np
+        time.sleep(BLOCKING)
+        return np.asarray([], dtype=str), np.asarray([], dtype=np.float64)
+
+def test_hybrid_search_keeps_event_loop_free(monkeypatch):
+    from benchmarks.stand_ins import TinyCrossEncoder
+
+    class SlowCrossEncoder(TinyCrossEncoder):
+        def predict(self, pairs, batch_size: int = 32, **kwargs):
+            time.sleep(BLOCKING)
+            return super().predict(pairs, batch_size=batch_size, **kwargs)
+
+    monkeypatch.setattr(search, "get_collection_from_vector_store", lambda collection_name: SlowCollection(collection_name))
+    monkeypatch.setattr(search, "get_bm25_index", lambda collection_name, collection: SlowBM25Index())
+    collection_names = [f"file{i}" for i in range(4)]
+
+    async def main():
+        # 검색 도중 event loop가 다른 작업을 처리하는지 heartbeat 간격으로 확인
+        gaps = []
+        stopped = asyncio.Event()
+
+        async def heartbeat():
+            last = time.perf_counter()
+            while not stopped.is_set():
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        beat = asyncio.ensure_future(heartbeat())
+        started = time.perf_counter()
+        result = await search.query_collection_with_hybrid_search(
+            collection_names=collection_names,
+            query="camera",
+            embedding_function=None,
+            k=3,
+            reranking_function=SlowCrossEncoder(),
+            r=-1e9,
+            query_embedding=[0.0] * 8,
+        )
+        elapsed = time.perf_counter() - started
+        stopped.set()
+        await beat
+        return result, elapsed, max(gaps)
+
+    result, elapsed, max_gap = asyncio.run(main())
+    assert len(result["documents"][0]) == 3
+    # collection별 bm25/vector 조회, 문서 조회, rerank는 executor에서 실행되어 event loop를 막지 않음
+    assert max_gap < BLOCKING / 2
+    # collection 4개 x (bm25 + vector + 문서 조회)를 동시에 실행 (순차 실행시 4 * 3 * BLOCKING + rerank)
+    assert elapsed < (len(collection_names) * 3 + 1) * BLOCKING / 2
@@ -0,0 +1,94 @@
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from apps.batching import MicroBatcher, BatchedCrossEncoder, SchedulerSaturated
+
+def test_concurrent_requests_share_one_batch():
+    calls = []
+    def fn(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher("test", fn, max_batch_size=64, max_wait=0.2, max_queue=64)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda i: batcher([i, i + 100]), range(8)))
+    # 요청별 결과는 입력 순서대로 돌려받음
+    assert results == [[i * 2, (i + 100) * 2] for i in range(8)]
+    # 동시 요청은 max_wait 동안 모여서 적은 수의 batch로 실행
+    assert len(calls) < 8
+    assert sum(len(items) for items in calls) == 16
+
+def test_batch_size_limit():
+    calls = []
+    def fn(items):
+        calls.append(len(items))
+        return items
+
+    batcher = MicroBatcher("test", fn, max_batch_size=4, max_wait=0.2, max_queue=64)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: batcher([i]), range(8)))
+    assert max(calls) <= 4
+
+def test_saturated_queue_sheds_load():
+    started, release = threading.Event(), threading.Event()
+    def fn(items):
+        started.set()
+        release.wait()
+        return items
+
+    batcher = MicroBatcher("test", fn, max_batch_size=1, max_wait=0, max_queue=2)
+    running = batcher.submit([0])
+    assert started.wait(timeout=5)
+    queued = [batcher.submit([1]), batcher.submit([2])]
+    # 실행중인 batch가 끝나지 않은 상태에서 대기열이 가득 차면 기다리지 않고 바로 실패
+    with pytest.raises(SchedulerSaturated):
+        batcher.submit([3])
+    release.set()
+    assert [future.result(timeout=5) for future in [running] + queued] == [[0], [1], [2]]
+
+def test_batch_error_is_raised_to_every_caller():
+    def fn(items):
+        raise RuntimeError("inference failed")
+
+    batcher = MicroBatcher("test", fn, max_batch_size=8, max_wait=0.05, max_queue=8)
+    futures = [batcher.submit([i]) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+def test_batched_cross_encoder():
+    batcher = MicroBatcher("test", lambda pairs: [float(len(a) + len(b)) for a, b in pairs], max_batch_size=8, max_wait=0, max_queue=8)
+    scores = BatchedCrossEncoder(batcher).predict([("a", "bb"), ("ccc", "d")])
+    assert scores.tolist() == [3.0, 4.0]
+    assert len(BatchedCrossEncoder(batcher).predict([])) == 0
+
+def test_batched_cross_encoder_apredict_merges_concurrent_requests():
+    import asyncio
+    calls = []
+    def fn(pairs):
+        calls.append(len(pairs))
+        return [float(len(a) + len(b)) for a, b in pairs]
+
+    batcher = MicroBatcher("test", fn, max_batch_size=64, max_wait=0.2, max_queue=64)
+    encoder = BatchedCrossEncoder(batcher)
+
+    async def main():
+        # event loop에서 기다리므로 thread 없이 동시 요청이 1개 batch로 합쳐짐
+        return await asyncio.gather(*[encoder.apredict([("q", "d" * i)]) for i in range(8)])
+    scores = asyncio.run(main())
+    assert [score.tolist() for score in scores] == [[1.0 + i] for i in range(8)]
+    assert calls == [8]
+
+def test_merged_rerank_batch_keeps_forward_batch_size(monkeypatch):
+    # 여러 요청을 합친 batch도 cross-encoder의 1번 forward pass는 rerank.batch_size로 제한
+    import numpy as np
+    from apps import batching
+    calls = []
+    class FakeCrossEncoder:
+        def predict(self, pairs, batch_size=32):
+            calls.append((len(pairs), batch_size))
+            return np.zeros(len(pairs))
+    monkeypatch.setattr(batching.model_registry, "get_reranker", lambda: FakeCrossEncoder())
+    monkeypatch.setitem(batching.CONFIG_DATA['rerank'], "batch_size", 16)
+    batching._rerank([("q", "d")] * 200)
+    assert calls == [(200, 16)]
@@ -0,0 +1,50 @@
+import pytest
+from apps import bm25
+from apps.bm25 import BM25Index, save_index, load_index, invalidate_index, get_index_path
+
+TEXTS = [
+    "vector database comparison chroma faiss",
+    "hybrid search combines bm25 and vector search",
+    "reranking improves retrieval quality",
+    "bm25 is a sparse retrieval method",
+]
+CHUNK_IDS = [f"test_{i}" for i in range(len(TEXTS))]
+
+def test_get_top_k_arrays():
+    index = BM25Index.from_texts(TEXTS, CHUNK_IDS)
+    chunk_ids, _ = index.get_top_k_arrays("sparse hybrid", 2)
+    assert sorted(chunk_ids.tolist()) == ["test_1", "test_3"]
+    chunk_ids, scores = index.get_top_k_arrays("sparse method retrieval", 2)
+    assert chunk_ids.tolist() == ["test_3", "test_2"]
+    assert scores[0] > scores[1]
+    assert len(index.get_top_k_arrays("unknown", 2)[0]) == 0
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    # backend/data에 index 파일을 남기지 않도록 임시 경로 사용
+    monkeypatch.setattr(bm25, "BM25_DATA_PATH", str(tmp_path))
+    return tmp_path
+
+def test_save_and_load_index(index_dir):
+    collection_name = "test_bm25"
+    save_index(collection_name, BM25Index.from_texts(TEXTS, CHUNK_IDS))
+    try:
+        index = load_index(collection_name)
+        assert load_index(collection_name) is index
+        assert index.get_top_k_arrays("hybrid", 1)[0].tolist() == ["test_1"]
+    finally:
+        invalidate_index(collection_name, remove_file=True)
+    assert load_index(collection_name) is None
+
+def test_load_index_reloads_file_replaced_by_other_process(index_dir):
+    collection_name = "test_bm25_reload"
+    save_index(collection_name, BM25Index.from_texts(TEXTS, CHUNK_IDS))
+    try:
+        index = load_index(collection_name)
+        # 다른 worker 프로세스에서 재색인 (이 프로세스의 캐시는 invalidate 되지 않음)
+        BM25Index.from_texts(TEXTS[:2], CHUNK_IDS[:2]).save(get_index_path(collection_name))
+        reloaded = load_index(collection_name)
+        assert reloaded is not index
+        assert len(reloaded) == 2
+    finally:
+        invalidate_index(collection_name, remove_file=True)
@@ -0,0 +1,69 @@
+from apps.chunking import ModelTokenizer, TokenTextSplitter, WordTokenizer
+from apps.index import get_split_docs
+from langchain_core.documents import Document
+
+TEXT = " ".join(f"word{i}" for i in range(100))
+
+class SubwordTokenizer(WordTokenizer):
+    # 단어를 3글자씩 나누는 tokenizer, [CLS] + [SEP]
+    special_tokens = 2
+
+    def offsets(self, texts):
+        return [
+            [(start + i, min(start + i + 3, end)) for start, end in words for i in range(0, end - start, 3)]
+            for words in super().offsets(texts)
+        ]
+
+class FakeFastTokenizer:
+    # sentencepiece처럼 단어마다 빈 offset의 "▁" token + 3글자씩 나눈 token, [CLS] + [SEP]
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False, **kwargs):
+        offset_mapping = [
+            [(0, 0) if i < 0 else (start + i, min(start + i + 3, end)) for start, end in words for i in range(-3, end - start, 3)]
+            for words in WordTokenizer().offsets(texts)
+        ]
+        special = 2 if add_special_tokens else 0
+        encoded = {"input_ids": [[0] * (len(offsets) + special) for offsets in offset_mapping]}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = offset_mapping
+        return encoded
+
+def test_chunks_fit_model_length():
+    splitter = TokenTextSplitter(WordTokenizer(), chunk_tokens=30, chunk_overlap=5)
+    docs = splitter.split_documents([Document(page_content=TEXT, metadata={"page": 3})])
+    assert all(doc.metadata["tokens"] <= 30 for doc in docs)
+    assert docs[0].page_content.startswith("word0 ")
+    assert docs[-1].page_content.endswith("word99")
+    # start_index는 page 원문에서의 위치 (context_builder에서 겹치는 chunk 병합)
+    for doc in docs:
+        assert TEXT[doc.metadata["start_index"]:].startswith(doc.page_content)
+        assert doc.metadata["page"] == 3
+    # 이전 chunk와 overlap만큼 겹침
+    assert docs[1].metadata["start_index"] == TEXT.index("word25 ")
+
+def test_chunk_tokens_capped_by_max_seq_length():
+    splitter = TokenTextSplitter(SubwordTokenizer(), chunk_tokens=512, chunk_overlap=8, max_seq_length=32)
+    assert splitter.chunk_tokens == 30
+    docs = splitter.split_documents([Document(page_content=TEXT, metadata={})])
+    assert all(doc.metadata["tokens"] <= 32 for doc in docs)
+    # 단어 중간에서 자르지 않음
+    assert all(doc.page_content.split()[-1] in TEXT.split() for doc in docs)
+
+def test_filename_kept_out_of_chunk_text():
+    splitter = TokenTextSplitter(WordTokenizer(), chunk_tokens=30, chunk_overlap=5)
+    docs = get_split_docs([Document(page_content=TEXT, metadata={})], "my%20doc.pdf", text_splitter=splitter)
+    assert all(doc.metadata["filename"] == "my doc.pdf" for doc in docs)
+    assert all("my doc.pdf" not in doc.page_content for doc in docs)
+
+def test_empty_offset_tokens_count_toward_model_length():
+    # 빈 offset token도 입력 길이에 포함하여 special token 포함 input_ids 길이가 최대 길이를 넘지 않음
+    tokenizer = ModelTokenizer(FakeFastTokenizer())
+    splitter = TokenTextSplitter(tokenizer, chunk_tokens=512, chunk_overlap=8, max_seq_length=32)
+    docs = splitter.split_documents([Document(page_content=TEXT, metadata={})])
+    counts = tokenizer.count([doc.page_content for doc in docs])
+    assert [doc.metadata["tokens"] for doc in docs] == counts
+    assert max(counts) <= 32
+    assert docs[0].page_content.startswith("word0 ")
+    assert docs[-1].page_content.endswith("word99")
@@ -0,0 +1,47 @@
+from apps.context_builder import Tokenizer, build_context
+
+PAGE = "Vector databases store embeddings. " * 20
+
+def chunk(start, length, page=0, score=1.0, file_id="f1"):
+    return f"doc.pdf\n\n{PAGE[start:start + length]}", {"file_id": file_id, "page": page, "start_index": start, "score": score}
+
+def to_result(chunks):
+    return {"documents": [[text for text, _ in chunks]], "metadatas": [[metadata for _, metadata in chunks]]}
+
+def test_merges_overlapping_chunks_and_drops_headers():
+    chunks = [chunk(0, 300, score=0.9), chunk(200, 300, score=0.8), chunk(0, 100, page=1, score=0.5)]
+    contexts, citations, stats = build_context(to_result(chunks), {"f1": "doc.pdf"}, max_tokens=0, tokenizer=Tokenizer())
+
+    assert contexts == [f"doc.pdf\n\n{PAGE[0:500]}\n\n{PAGE[0:100]}"]
+    assert stats["segments"] == 2
+    assert stats["tokens_saved"] > 0
+    # citation은 원본 chunk 단위로 유지
+    assert [metadata["start_index"] for metadata in citations[0]["metadata"]] == [0, 200, 0]
+    assert citations[0]["document"][1] == chunks[1][0]
+
+def test_packs_by_score_within_budget():
+    chunks = [chunk(0, 100, page=0, score=0.2), chunk(0, 100, page=1, score=0.9), chunk(0, 100, page=2, score=0.5)]
+    tokenizer = Tokenizer()
+    contexts, citations, stats = build_context(to_result(chunks), {"f1": "doc.pdf"}, max_tokens=60, tokenizer=tokenizer)
+
+    assert tokenizer.count(contexts[0]) <= 60
+    assert [metadata["page"] for metadata in citations[0]["metadata"]] == [1, 2]
+    assert stats["selected_chunks"] == 2
+
+def test_truncates_when_best_segment_exceeds_budget():
+    contexts, _, stats = build_context(to_result([chunk(0, 400)]), {"f1": "doc.pdf"}, max_tokens=20, tokenizer=Tokenizer())
+    assert stats["context_tokens"] <= 20
+    assert contexts[0].startswith("doc.pdf\n\nVector")
+
+def test_tokenizer_not_downloaded_falls_back_without_network(tmp_path, monkeypatch):
+    import pytest
+    from apps import context_builder
+    pytest.importorskip("tiktoken")
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    context_builder.get_tokenizer.cache_clear()
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("tokenizer must not be downloaded at startup")
+    monkeypatch.setattr("tiktoken.load.read_file", no_network)
+    assert context_builder.get_tokenizer("gpt-3.5-turbo").encoding is None
+    context_builder.get_tokenizer.cache_clear()
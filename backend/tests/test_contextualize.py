@@ -0,0 +1,33 @@
+import asyncio
+from apps import contextualize
+
+HISTORY = [
+    {"role": "user", "content": "What is the refund policy?"},
+    {"role": "assistant", "content": "Refunds are available within 30 days."},
+]
+
+def test_lookup_without_history():
+    assert contextualize.lookup("What is it?", []) == ("What is it?", "none")
+
+def test_lookup_skips_standalone_query():
+    query = "How long does shipping take to Canada?"
+    assert contextualize.lookup(query, HISTORY) == (query, "skipped")
+
+def test_lookup_requires_rewrite_for_reference():
+    assert contextualize.lookup("What about it?", HISTORY) == (None, "rewrite")
+    assert contextualize.lookup("그것은 언제까지 가능한가요?", HISTORY) == (None, "rewrite")
+
+def test_rewrite_is_cached(monkeypatch):
+    calls = []
+    async def fake_contextualize(llm, query, history):
+        calls.append(query)
+        return "What is the refund period?"
+    monkeypatch.setattr(contextualize, "aget_contextualize_query", fake_contextualize)
+
+    assert asyncio.run(contextualize.rewrite(None, "How long is it?", HISTORY)) == "What is the refund period?"
+    assert contextualize.lookup("How long is it?", HISTORY) == ("What is the refund period?", "cached")
+    assert len(calls) == 1
+
+def test_query_similarity():
+    assert contextualize.query_similarity("refund policy", "refund policy") == 1.0
+    assert contextualize.query_similarity("refund policy", "shipping time") == 0.0
@@ -0,0 +1,84 @@
+import threading
+import pytest
+from langchain_core.documents import Document
+from apps import bm25
+from apps import index
+from apps import embedding_cache
+from apps import flat_store
+from config import CONFIG_DATA
+
+class FakeEmbedding:
+    # 호출된 text를 기록하는 embedding (text 길이로 vector 생성)
+    def __init__(self, offset: float = 0.0):
+        self.offset = offset
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)) + self.offset, 1.0] for text in texts]
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # 임시 경로의 캐시 DB 사용 (thread별 connection도 새로 생성)
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_PATH", str(tmp_path / "embedding_cache.db"))
+    monkeypatch.setattr(embedding_cache, "_local", threading.local())
+    monkeypatch.setitem(CONFIG_DATA['index'], "embedding_cache", True)
+
+def test_hits_and_misses(cache):
+    embedding = FakeEmbedding()
+    vectors, hits = embedding_cache.embed_documents(embedding, ["a", "bb"], model_name="model-a")
+    assert vectors == [[1.0, 1.0], [2.0, 1.0]]
+    assert hits == 0
+
+    vectors, hits = embedding_cache.embed_documents(embedding, ["bb", "ccc", "a"], model_name="model-a")
+    assert vectors == [[2.0, 1.0], [3.0, 1.0], [1.0, 1.0]]
+    assert hits == 2
+    # 캐시에 없는 text만 embedding
+    assert embedding.calls == [["a", "bb"], ["ccc"]]
+
+def test_key_includes_model_name(cache):
+    embedding_cache.embed_documents(FakeEmbedding(), ["a"], model_name="model-a")
+    # 다른 model의 embedding은 재사용하지 않음
+    other = FakeEmbedding(offset=10.0)
+    vectors, hits = embedding_cache.embed_documents(other, ["a"], model_name="model-b")
+    assert vectors == [[11.0, 1.0]]
+    assert hits == 0
+    assert other.calls == [["a"]]
+
+def test_repeated_texts_in_batch_are_embedded_once(cache):
+    embedding = FakeEmbedding()
+    vectors, hits = embedding_cache.embed_documents(embedding, ["a", "a", "bb", "a"], model_name="model-a")
+    assert vectors == [[1.0, 1.0], [1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert embedding.calls == [["a", "bb"]]
+    assert hits == 0
+
+def test_disabled_cache_embeds_everything(cache, monkeypatch):
+    monkeypatch.setitem(CONFIG_DATA['index'], "embedding_cache", False)
+    embedding = FakeEmbedding()
+    embedding_cache.embed_documents(embedding, ["a"], model_name="model-a")
+    vectors, hits = embedding_cache.embed_documents(embedding, ["a"], model_name="model-a")
+    assert hits == 0
+    assert embedding.calls == [["a"], ["a"]]
+
+def test_reindex_embeds_only_changed_chunks(cache, tmp_path, monkeypatch):
+    # 일부 chunk만 바뀐 문서를 재색인하면 바뀐 chunk만 embedding (flat backend, 임시 경로)
+    embedding = FakeEmbedding()
+    monkeypatch.setattr(index.model_registry, "get_embedding", lambda: embedding)
+    monkeypatch.setitem(CONFIG_DATA['vector_db'], "backend", "flat")
+    monkeypatch.setitem(CONFIG_DATA['vector_db'], "flat", {"quantization": "none", "rescore_factor": 4})
+    monkeypatch.setattr(flat_store, "FLAT_DATA_PATH", str(tmp_path / "flat"))
+    monkeypatch.setattr(bm25, "BM25_DATA_PATH", str(tmp_path))
+
+    texts = [f"chunk {i} " * (i + 1) for i in range(10)]
+    docs = [Document(page_content=text, metadata={"page": 0}) for text in texts]
+    index._write_docs_to_vector_db(docs, "file-a")
+
+    texts[3] = "changed chunk"
+    docs = [Document(page_content=text, metadata={"page": 0}) for text in texts]
+    stats = index.PipelineStats()
+    assert index._write_docs_to_vector_db(docs, "file-a", stats=stats) == 10
+
+    assert embedding.calls[1:] == [["changed chunk"]]
+    assert stats.to_dict()["cache_hits"] == 9
+    assert stats.to_dict()["cache_hit_rate"] == 0.9
+    assert flat_store.get_collection("file-a").count() == 10
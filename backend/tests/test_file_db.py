@@ -0,0 +1,114 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import pytest
+from apps.file_db import FileIndexDB
+
+LEGACY_DATA = {
+    "_default": {
+        "1": {"file_id": "legacy-1", "name": "a.pdf", "file_size": 100, "docs_count": 10},
+        "2": {"file_id": "legacy-2", "name": "b.pdf", "file_size": 200, "docs_count": -1},
+    }
+}
+
+@pytest.fixture
+def file_db(tmp_path):
+    legacy_json_path = tmp_path / "file_index_db.json"
+    legacy_json_path.write_text(json.dumps(LEGACY_DATA))
+    db = FileIndexDB(path=str(tmp_path / "file_index_db.sqlite3"), legacy_json_path=str(legacy_json_path))
+    yield db
+    db.close()
+
+def test_migrate_legacy_json(file_db, tmp_path):
+    assert file_db.search(file_id="legacy-1")["docs_count"] == 10
+    assert file_db.search(filename="b.pdf", file_size=200)["file_id"] == "legacy-2"
+
+    # 재시작시 다시 이관하지 않음
+    file_db.update_docs_count("legacy-2", 5)
+    reopened = FileIndexDB(path=file_db.path, legacy_json_path=file_db.legacy_json_path)
+    assert reopened.search(file_id="legacy-2")["docs_count"] == 5
+    reopened.close()
+
+def test_migrate_legacy_json_fills_content_hash(tmp_path):
+    # 업로드 파일이 남아있는 이전 버전 파일은 이관시 content_hash 계산
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    (upload_dir / "legacy-1").write_bytes(b"a" * 100)
+    legacy_json_path = tmp_path / "file_index_db.json"
+    legacy_json_path.write_text(json.dumps(LEGACY_DATA))
+    db = FileIndexDB(path=str(tmp_path / "files.sqlite3"), legacy_json_path=str(legacy_json_path), upload_dir=str(upload_dir))
+
+    content_hash = hashlib.sha256(b"a" * 100).hexdigest()
+    assert db.search(content_hash=content_hash)["file_id"] == "legacy-1"
+    assert db.search(file_id="legacy-2")["content_hash"] is None
+    db.close()
+
+def test_search_matches_legacy_file_by_name_and_size(tmp_path):
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    (upload_dir / "legacy-2").write_bytes(b"b" * 200)
+    db = FileIndexDB(path=str(tmp_path / "files.sqlite3"), legacy_json_path=None, upload_dir=str(upload_dir))
+    # content_hash 없이 등록된 이전 버전 파일
+    db.insert("legacy-1", "a.pdf", 100)
+    db.insert("legacy-2", "b.pdf", 200)
+    db.update_docs_count("legacy-2", 5)
+
+    # 업로드 파일이 없으면 이름 & 크기로 찾고 hash 기록
+    content_hash = hashlib.sha256(b"a" * 100).hexdigest()
+    assert db.search(filename="a.pdf", file_size=100, content_hash=content_hash)["file_id"] == "legacy-1"
+    assert db.search(content_hash=content_hash)["file_id"] == "legacy-1"
+
+    # 업로드 파일이 남아있으면 내용이 같은 경우만
+    assert db.search(filename="b.pdf", file_size=200, content_hash="other") is None
+    content_hash = hashlib.sha256(b"b" * 200).hexdigest()
+    assert db.search(filename="b.pdf", file_size=200, content_hash=content_hash)["docs_count"] == 5
+    db.close()
+
+def test_insert_and_search(file_db):
+    file_db.insert("new-1", "c.pdf", 300, content_hash="abc")
+    assert file_db.search(content_hash="abc") == {
+        "file_id": "new-1", "name": "c.pdf", "file_size": 300, "content_hash": "abc", "docs_count": -1
+    }
+    assert file_db.search(content_hash="missing") is None
+    assert file_db.search() is None
+
+def test_concurrent_writes(file_db):
+    def worker(n):
+        for i in range(50):
+            file_db.insert(f"{n}-{i}", f"{n}-{i}.pdf", i, content_hash=f"{n}-{i}")
+            file_db.update_docs_count(f"{n}-{i}", i)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    for n in range(8):
+        for i in range(50):
+            assert file_db.search(content_hash=f"{n}-{i}")["docs_count"] == i
+
+def test_adds_last_accessed_to_existing_db(tmp_path):
+    # last_accessed column이 없는 이전 버전 DB
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE files (file_id TEXT PRIMARY KEY, name TEXT NOT NULL, file_size INTEGER NOT NULL, content_hash TEXT, docs_count INTEGER NOT NULL DEFAULT -1, created_at REAL NOT NULL)")
+    conn.execute("INSERT INTO files VALUES ('old-1', 'a.pdf', 1, NULL, 3, 100.0)")
+    conn.commit()
+    conn.close()
+
+    db = FileIndexDB(path=path, legacy_json_path=None)
+    assert db.list_by_access()[0]["last_accessed"] == 100.0
+    db.close()
+
+def test_access_order_and_delete(file_db):
+    file_db.insert("new-1", "c.pdf", 300)
+    file_db.insert("new-2", "d.pdf", 400)
+    file_db.touch(["legacy-1", "legacy-2", "new-1"], time.time() + 60)
+    # 검색된 적 없는 파일 -> 오래 전에 검색된 파일 순서
+    assert file_db.list_by_access()[0]["file_id"] == "new-2"
+    assert file_db.get_existing(["new-1", "missing"]) == {"new-1"}
+
+    file_db.delete("new-1")
+    assert file_db.search(file_id="new-1") is None
+    assert file_db.get_existing(["new-1"]) == set()
@@ -0,0 +1,139 @@
+import os
+import numpy as np
+import pytest
+from apps import flat_store
+from apps.flat_store import FlatCollection
+
+def get_vectors(count, dim=32, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+def exact_top_k(vectors, query, k):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return np.argsort(distances, kind="stable")[:k].tolist()
+
+def add(collection, vectors, start=0):
+    ids = [f"c_{i}" for i in range(start, start + len(vectors))]
+    collection.upsert(
+        ids=ids,
+        embeddings=vectors.tolist(),
+        documents=[f"text {i}" for i in range(start, start + len(vectors))],
+        metadatas=[{"page": i} for i in range(start, start + len(vectors))],
+    )
+    return ids
+
+@pytest.fixture
+def flat_config(monkeypatch):
+    config = {"quantization": "none", "rescore_factor": 4}
+    monkeypatch.setitem(flat_store.CONFIG_DATA['vector_db'], 'flat', config)
+    return config
+
+def test_query_matches_exact_search(tmp_path, flat_config):
+    vectors = get_vectors(300)
+    collection = FlatCollection("test", str(tmp_path / "test"))
+    add(collection, vectors[:100])
+    add(collection, vectors[100:], start=100)
+    assert collection.count() == 300
+
+    query = get_vectors(1, seed=1)[0]
+    result = collection.query(query_embeddings=[query.tolist()], n_results=5)
+    assert result["ids"][0] == [f"c_{i}" for i in exact_top_k(vectors, query, 5)]
+    assert result["distances"][0] == sorted(result["distances"][0])
+    row = int(result["ids"][0][0].split("_")[1])
+    assert result["documents"][0][0] == f"text {row}"
+    assert result["metadatas"][0][0] == {"page": row}
+
+    # 새로 연 collection도 디스크의 mmap 파일로 같은 결과
+    reopened = FlatCollection("test", str(tmp_path / "test"))
+    assert reopened.query(query_embeddings=[query.tolist()], n_results=5, include=["distances"])["ids"] == result["ids"]
+
+def test_int8_rescore(tmp_path, flat_config):
+    flat_config["quantization"] = "int8"
+    vectors = get_vectors(1000)
+    collection = FlatCollection("test", str(tmp_path / "test"))
+    add(collection, vectors)
+    queries = get_vectors(20, seed=1)
+
+    hits = 0
+    for query in queries:
+        result = collection.query(query_embeddings=[query.tolist()], n_results=10, include=["distances"])
+        hits += len(set(result["ids"][0]) & {f"c_{i}" for i in exact_top_k(vectors, query, 10)})
+    # rescore는 원본 float32로 거리 계산
+    assert hits / (10 * len(queries)) >= 0.95
+    assert result["distances"][0][0] == pytest.approx(float(((vectors[int(result["ids"][0][0][2:])] - query) ** 2).sum()), rel=1e-4)
+
+    # rescore 없이 저장하면 float32 행렬을 저장하지 않음
+    flat_config["rescore_factor"] = 0
+    small = FlatCollection("small", str(tmp_path / "small"))
+    add(small, vectors)
+    assert not os.path.exists(tmp_path / "small" / flat_store.VECTORS_FILE)
+    assert small.disk_usage() < collection.disk_usage()
+    assert len(small.query(query_embeddings=[queries[0].tolist()], n_results=10)["ids"][0]) == 10
+
+def test_get_and_upsert_existing_ids(tmp_path, flat_config):
+    vectors = get_vectors(10)
+    collection = FlatCollection("test", str(tmp_path / "test"))
+    ids = add(collection, vectors)
+
+    result = collection.get(ids=["c_3", "missing", "c_1"])
+    assert result["ids"] == ["c_3", "c_1"]
+    assert result["documents"] == ["text 3", "text 1"]
+    assert collection.get(include=["documents"])["ids"] == ids
+
+    # 같은 id는 새 행으로 교체
+    collection.upsert(ids=["c_3"], embeddings=[vectors[0].tolist()], documents=["updated"], metadatas=[{"page": 0}])
+    assert collection.count() == 10
+    assert collection.get(ids=["c_3"])["documents"] == ["updated"]
+    result = collection.query(query_embeddings=[vectors[0].tolist()], n_results=2, include=["distances"])
+    assert sorted(result["ids"][0]) == ["c_0", "c_3"]
+
+def test_interrupted_upsert_keeps_committed_rows(tmp_path, flat_config, monkeypatch):
+    vectors = get_vectors(10)
+    collection = FlatCollection("test", str(tmp_path / "test"))
+    add(collection, vectors)
+    before = collection.get_view()
+
+    # meta 갱신 전에 중단된 기존 id upsert
+    def interrupted(meta):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as patch:
+        patch.setattr(collection, "_write_meta", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            collection.upsert(ids=["c_3"], embeddings=[(vectors[3] + 10).tolist()], documents=["updated"], metadatas=[{}])
+
+    # 이미 commit된 행과 upsert 전에 연 view는 변하지 않음
+    assert FlatCollection("test", str(tmp_path / "test")).get(ids=["c_3"])["documents"] == ["text 3"]
+    assert before.record(3)["document"] == "text 3"
+    assert np.allclose(np.asarray(before.vectors[3]), vectors[3])
+    assert collection.count() == 10
+
+    # 다음 upsert는 중단된 꼬리를 버리고 이어서 기록
+    collection.upsert(ids=["c_3"], embeddings=[(vectors[3] + 10).tolist()], documents=["updated"], metadatas=[{}])
+    reopened = FlatCollection("test", str(tmp_path / "test"))
+    assert reopened.count() == 10
+    assert reopened.get(ids=["c_3"])["documents"] == ["updated"]
+    assert sorted(reopened.get()["ids"]) == sorted(f"c_{i}" for i in range(10))
+    assert len(reopened.query(query_embeddings=[vectors[3].tolist()], n_results=20)["ids"][0]) == 10
+
+def test_uncommitted_tail_is_discarded(tmp_path, flat_config):
+    vectors = get_vectors(10)
+    collection = FlatCollection("test", str(tmp_path / "test"))
+    add(collection, vectors[:5])
+    # meta 갱신 전에 중단된 쓰기
+    with open(tmp_path / "test" / flat_store.VECTORS_FILE, "ab") as f:
+        f.write(b"\0" * 100)
+    with open(tmp_path / "test" / flat_store.IDS_FILE, "ab") as f:
+        f.write(b"partial")
+    add(collection, vectors[5:], start=5)
+
+    query = vectors[7]
+    result = collection.query(query_embeddings=[query.tolist()], n_results=1)
+    assert result["ids"][0] == ["c_7"]
+    assert result["documents"][0] == ["text 7"]
+    assert collection.get()["ids"] == [f"c_{i}" for i in range(10)]
+
+def test_empty_collection(tmp_path, flat_config):
+    collection = FlatCollection("test", str(tmp_path / "test"))
+    assert collection.count() == 0
+    assert collection.query(query_embeddings=[[0.0] * 4], n_results=3)["ids"] == [[]]
+    assert collection.get(ids=["c_0"])["ids"] == []
+    assert collection.get(include=["documents", "embeddings"]) == {"ids": [], "documents": [], "metadatas": None, "embeddings": []}
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from apps.fusion import fuse, normalize_scores, recall_at_k
+
+BM25 = (np.asarray(["a", "b", "c"]), np.asarray([9.0, 5.0, 1.0]))
+VECTOR = (np.asarray(["c", "d", "a"]), np.asarray([-0.1, -0.2, -0.9]))
+
+def test_weighted_rrf():
+    ids, scores = fuse([BM25[0], VECTOR[0]], [BM25[1], VECTOR[1]], weights=[0.5, 0.5], method="rrf", c=60)
+    # a: 1위 + 3위, c: 3위 + 1위 -> 동점은 먼저 나온 a
+    assert ids.tolist() == ["a", "c", "b", "d"]
+    assert scores[0] == pytest.approx(0.5 / 61 + 0.5 / 63)
+
+def test_normalized_score_fusion():
+    ids, scores = fuse([BM25[0], VECTOR[0]], [BM25[1], VECTOR[1]], weights=[0.3, 0.7], method="score", limit=2)
+    # c: 0.3 * 0 + 0.7 * 1, a: 0.3 * 1 + 0.7 * 0
+    assert ids.tolist() == ["c", "d"]
+    assert scores.tolist() == pytest.approx([0.7, 0.3 * 0 + 0.7 * (0.7 / 0.8)])
+
+def test_zero_weight_retriever_is_ignored():
+    ids, _ = fuse([BM25[0], VECTOR[0]], [BM25[1], VECTOR[1]], weights=[0.0, 1.0], method="rrf")
+    assert ids.tolist() == ["c", "d", "a"]
+
+def test_empty_and_helpers():
+    ids, scores = fuse([[], []], [[], []], weights=[0.5, 0.5])
+    assert len(ids) == 0 and len(scores) == 0
+    assert normalize_scores(np.asarray([2.0, 2.0])).tolist() == [1.0, 1.0]
+    assert recall_at_k([["a", "b"], ["c"]], [["b"], ["d"]], k=2) == 0.5
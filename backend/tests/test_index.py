@@ -1,7 +1,12 @@
+import os
 import pytest
 from typing import List
+from apps import bm25
+from apps import index
+from apps import flat_store
 from apps.index import get_loader, get_split_docs, store_docs_in_vector_db
 from apps.utils import get_collection_from_vector_store
+from config import CONFIG_DATA
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
 from langchain_community.embeddings import HuggingFaceEmbeddings
@@ -27,4 +32,55 @@ def test_store_docs_in_vector_db():
     documents = collection.get()
     print(documents.get("documents")) 
 
-    # assert documents[0]
\ No newline at end of file
+    # assert documents[0]
+
+class FakeEmbedding:
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+@pytest.fixture
+def flat_backend(tmp_path, monkeypatch):
+    # flat backend & 임시 경로에 색인 (embedding은 fake)
+    monkeypatch.setattr(index.model_registry, "get_embedding", lambda: FakeEmbedding())
+    monkeypatch.setitem(CONFIG_DATA['index'], "embedding_cache", False)
+    monkeypatch.setitem(CONFIG_DATA['index'], "embed_batch_size", 2)
+    monkeypatch.setitem(CONFIG_DATA['vector_db'], "backend", "flat")
+    monkeypatch.setitem(CONFIG_DATA['vector_db'], "flat", {"quantization": "none", "rescore_factor": 4})
+    monkeypatch.setattr(flat_store, "FLAT_DATA_PATH", str(tmp_path / "flat"))
+    monkeypatch.setattr(bm25, "BM25_DATA_PATH", str(tmp_path / "bm25"))
+    os.makedirs(tmp_path / "bm25")
+
+def get_docs(texts):
+    return [Document(metadata={'page': 0}, page_content=text) for text in texts]
+
+def test_reindex_keeps_serving_previous_collection(flat_backend):
+    index._write_docs_to_vector_db(get_docs(["old 1", "old 2", "old 3"]), "reindex")
+
+    seen = []
+    def docs():
+        # 재색인 도중 검색하는 경우
+        for doc in get_docs(["new 1", "new 2", "new 3", "new 4"]):
+            collection = get_collection_from_vector_store("reindex")
+            seen.append(collection.get(include=["documents"])["documents"])
+            yield doc
+
+    assert index._write_docs_to_vector_db(docs(), "reindex") == 4
+    assert all(documents == ["old 1", "old 2", "old 3"] for documents in seen)
+    assert get_collection_from_vector_store("reindex").get(include=["documents"])["documents"] == ["new 1", "new 2", "new 3", "new 4"]
+    assert len(bm25.load_index("reindex")) == 4
+    assert sorted(os.listdir(flat_store.FLAT_DATA_PATH)) == ["reindex"]
+
+def test_failed_reindex_keeps_previous_index(flat_backend):
+    index._write_docs_to_vector_db(get_docs(["old 1", "old 2", "old 3"]), "reindex")
+    version = bm25.get_index_version("reindex")
+
+    def docs():
+        yield from get_docs(["new 1", "new 2", "new 3"])
+        raise ValueError("parse error")
+
+    with pytest.raises(ValueError):
+        index._write_docs_to_vector_db(docs(), "reindex")
+    # 기존 collection & bm25 index를 그대로 사용하고 임시 collection은 삭제
+    assert get_collection_from_vector_store("reindex").get(include=["documents"])["documents"] == ["old 1", "old 2", "old 3"]
+    assert bm25.get_index_version("reindex") == version
+    assert sorted(os.listdir(flat_store.FLAT_DATA_PATH)) == ["reindex"]
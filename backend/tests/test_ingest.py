@@ -0,0 +1,84 @@
+import os
+import json
+import pytest
+from apps import ingest
+from apps import file_db
+from apps.file_db import FileIndexDB
+
+PDF = b"%PDF-1.4 test document a"
+
+class Killed(BaseException):
+    # 프로세스 강제 종료 대신 (Exception이 아니므로 실패로 기록되지 않음)
+    pass
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    # 파일관리 DB & 업로드 경로를 임시 경로로 변경하고 색인은 fake로 대체
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    db = FileIndexDB(path=str(tmp_path / "files.sqlite3"), legacy_json_path=None)
+    monkeypatch.setattr(file_db, "_file_db", db)
+    monkeypatch.setattr(ingest, "UPLOAD_DIR", str(uploads))
+    monkeypatch.setattr(ingest, "get_chroma_client", lambda: None)
+
+    indexed = []
+    killed = []
+    def fake_index_file(file_id, name, extract_images):
+        if name == "kill.pdf" and not killed:
+            killed.append(name)
+            raise Killed
+        indexed.append(name)
+        return {"docs_count": 10, "pages": 2, "seconds": 0.01}
+    monkeypatch.setattr(ingest, "_index_file", fake_index_file)
+
+    root = tmp_path / "pdfs"
+    (root / "sub").mkdir(parents=True)
+    (root / "a.pdf").write_bytes(PDF)
+    (root / "bad.pdf").write_bytes(b"not a pdf")
+    (root / "c.pdf").write_bytes(PDF)
+    (root / "notes.txt").write_bytes(b"ignored")
+    (root / "sub" / "b.pdf").write_bytes(PDF + b" b")
+    (root / "sub" / "kill.pdf").write_bytes(PDF + b" kill")
+    yield root, indexed, str(tmp_path / "checkpoint.jsonl")
+    db.close()
+
+def test_ingest_resumes_from_checkpoint(env):
+    root, indexed, checkpoint_path = env
+
+    # sub/kill.pdf 색인 도중 중단
+    with pytest.raises(Killed):
+        ingest.ingest(str(root), workers=0, checkpoint_path=checkpoint_path)
+    assert indexed == ["a.pdf", "b.pdf"]
+    with open(checkpoint_path) as f:
+        records = {record["path"]: record for record in map(json.loads, f)}
+    assert records["a.pdf"]["status"] == "done"
+    assert records["bad.pdf"]["status"] == "failed"
+    # 내용이 같은 파일은 색인하지 않음
+    assert records["c.pdf"] == {**records["c.pdf"], "status": "skipped", "reason": "indexed"}
+    assert "sub/kill.pdf" not in records
+
+    # 재실행: 중단된 파일부터 처리 (등록된 file_id 재사용)
+    report = ingest.ingest(str(root), workers=0, checkpoint_path=checkpoint_path)
+    assert indexed == ["a.pdf", "b.pdf", "kill.pdf"]
+    assert report["indexed"] == 1
+    assert report["skipped"] == {"checkpoint": 3, "previously_failed": 1, "indexed": 0, "duplicate": 0}
+    assert report["pages"] == 2 and report["chunks"] == 10
+    assert report["failed"] == 0
+
+    # 실패한 파일만 다시 시도
+    report = ingest.ingest(str(root), workers=0, checkpoint_path=checkpoint_path, retry_failed=True)
+    assert report["indexed"] == 0
+    assert [failure["path"] for failure in report["failures"]] == ["bad.pdf"]
+
+def test_ingest_registers_files(env):
+    root, indexed, checkpoint_path = env
+    (root / "sub" / "kill.pdf").unlink()
+    report = ingest.ingest(str(root), workers=0, checkpoint_path=checkpoint_path)
+    assert report["files"] == 4
+    assert report["indexed"] == 2
+
+    file_info = file_db.get_file_db().search(content_hash=ingest.get_file_hash(str(root / "a.pdf")))
+    assert file_info["name"] == "a.pdf"
+    assert file_info["docs_count"] == 10
+    with open(os.path.join(ingest.UPLOAD_DIR, file_info["file_id"]), "rb") as f:
+        assert f.read() == PDF
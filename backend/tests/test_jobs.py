@@ -0,0 +1,86 @@
+import sqlite3
+import subprocess
+import pytest
+from apps import jobs
+from apps import file_db
+from apps.file_db import FileIndexDB
+
+class FakeExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # job 상태는 파일관리 DB에 저장되므로 임시 DB 사용, 색인은 실행하지 않음
+    db = FileIndexDB(path=str(tmp_path / "files.sqlite3"), legacy_json_path=None)
+    monkeypatch.setattr(file_db, "_file_db", db)
+    monkeypatch.setattr(jobs, "_executor", FakeExecutor())
+    yield db
+    db.close()
+
+def get_dead_pid() -> int:
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+def test_active_job_is_unique_per_file(db):
+    job = jobs.IndexJob("file-a", "a.pdf", False)
+    db.insert_job(job.to_row())
+    # 다른 worker 프로세스에서 같은 파일의 job을 등록하는 경우
+    with pytest.raises(sqlite3.IntegrityError):
+        db.insert_job(jobs.IndexJob("file-a", "a.pdf", False).to_row())
+
+    # 완료된 job은 제약 대상이 아님
+    db.update_job(job.job_id, status="done")
+    db.insert_job(jobs.IndexJob("file-a", "a.pdf", False).to_row())
+
+def test_submit_reuses_job_of_other_process(db):
+    # 살아있는 다른 프로세스(여기서는 현재 프로세스)가 등록한 job은 재사용
+    job = jobs.IndexJob("file-a", "a.pdf", False)
+    db.insert_job(job.to_row())
+    submitted = jobs.submit_index_job("file-a", "a.pdf")
+    assert submitted.job_id == job.job_id
+    assert jobs._executor.submitted == []
+
+def test_submit_fails_orphaned_job(db):
+    # 종료된 worker의 job은 실패로 기록하고 새로 색인
+    job = jobs.IndexJob("file-a", "a.pdf", False)
+    job.pid = get_dead_pid()
+    job.status = "running"
+    db.insert_job(job.to_row())
+
+    submitted = jobs.submit_index_job("file-a", "a.pdf")
+    assert submitted.job_id != job.job_id
+    assert len(jobs._executor.submitted) == 1
+    orphaned = jobs.get_job(job.job_id)
+    assert orphaned.status == "failed"
+    assert orphaned.error == "indexing process exited"
+    assert jobs.get_job(submitted.job_id).to_dict()["status"] == "queued"
+
+def test_submit_fails_job_of_reused_pid(db):
+    # 재시작한 worker가 같은 pid를 받은 경우, 이전 프로세스의 job은 살아있는 것으로 보지 않음
+    job = jobs.IndexJob("file-a", "a.pdf", False)
+    assert job.process is not None
+    job.process = job.process.rsplit(":", 1)[0] + ":0"
+    job.status = "running"
+    db.insert_job(job.to_row())
+
+    submitted = jobs.submit_index_job("file-a", "a.pdf")
+    assert submitted.job_id != job.job_id
+    assert jobs.get_job(job.job_id).status == "failed"
+
+def test_progress_is_throttled(db, monkeypatch):
+    job = jobs.submit_index_job("file-a", "a.pdf")
+    monkeypatch.setattr(jobs, "PROGRESS_INTERVAL", 3600)
+    job.update_progress("embedding", chunks_total=64)
+    job.update_progress(chunks_embedded=64)
+    # stage 변경은 바로 기록, 진행상황은 간격마다 기록
+    saved = jobs.get_job(job.job_id)
+    assert saved.stage == "embedding"
+    assert saved.chunks_total == 64
+    assert saved.chunks_embedded == 0
+    job.update_progress(status="done", docs_count=64)
+    assert jobs.get_job(job.job_id).to_dict()["docs_count"] == 64
@@ -0,0 +1,87 @@
+import pytest
+from apps import lifecycle
+from apps import file_db
+from apps.file_db import FileIndexDB
+
+def make_file(file_id, last_accessed, size):
+    return {"file_id": file_id, "last_accessed": last_accessed, "disk_usage": {"total": size}}
+
+@pytest.fixture
+def config(monkeypatch):
+    config = {**lifecycle.CONFIG_DATA['lifecycle'], "ttl": 0, "max_collections": 0, "max_disk_bytes": 0}
+    monkeypatch.setitem(lifecycle.CONFIG_DATA, 'lifecycle', config)
+    return config
+
+def test_ttl_eviction(config):
+    config["ttl"] = 100
+    files = [make_file("a", 0, 10), make_file("b", 950, 10)]
+    assert [(file["file_id"], reason) for file, reason in lifecycle.get_eviction_candidates(files, now=1000)] == [("a", "ttl")]
+
+def test_lru_eviction_by_count_and_size(config):
+    config["max_collections"] = 3
+    config["max_disk_bytes"] = 25
+    # 오래 검색되지 않은 순서로 전달됨
+    files = [make_file("a", 1, 10), make_file("b", 2, 10), make_file("c", 3, 10), make_file("d", 4, 10)]
+    candidates = lifecycle.get_eviction_candidates(files, now=10)
+    assert [(file["file_id"], reason) for file, reason in candidates] == [("a", "max_collections"), ("b", "max_disk_bytes")]
+
+def test_no_eviction_by_default(config):
+    files = [make_file("a", 0, 10 ** 12)]
+    assert lifecycle.get_eviction_candidates(files, now=10 ** 9) == []
+
+def test_evict_skips_storage_scan_without_limits(config, monkeypatch):
+    def get_storage():
+        raise AssertionError("get_storage() called")
+    monkeypatch.setattr(lifecycle, "get_storage", get_storage)
+    assert lifecycle.evict(now=1000) == []
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = FileIndexDB(path=str(tmp_path / "files.sqlite3"), legacy_json_path=None)
+    monkeypatch.setattr(file_db, "_file_db", db)
+    monkeypatch.setattr(lifecycle, "_touched", {})
+    yield db
+    db.close()
+
+def test_record_access_filters_deleted_files(db, config):
+    config["touch_interval"] = 3600
+    db.insert("a", "a.pdf", 1)
+    db.insert("b", "b.pdf", 1)
+    assert lifecycle.record_access(["a", "b", "deleted"]) == {"a", "b"}
+    accessed = {row["file_id"]: row["last_accessed"] for row in db.list_by_access()}
+
+    # touch_interval 이내의 검색은 DB에 다시 기록하지 않음
+    db.touch(["a"], 0)
+    lifecycle.record_access(["a"])
+    assert {row["file_id"]: row["last_accessed"] for row in db.list_by_access()}["a"] == 0
+    assert accessed["b"] > 0
+
+def test_delete_missing_file(db):
+    with pytest.raises(lifecycle.FileNotFound):
+        lifecycle.delete_file("missing")
+
+def test_compaction_interval_shared_between_workers(db, config):
+    config["compact_interval"] = 100
+    # 처음 실행한 worker가 기준 시각을 기록
+    assert not lifecycle._is_compaction_due(now=1000)
+    assert not lifecycle._is_compaction_due(now=1050)
+    assert lifecycle._is_compaction_due(now=1100)
+    # 다른 worker가 compaction을 기록하면 그 시각부터 다시 계산
+    db.set_meta("last_compaction", "1100")
+    assert not lifecycle._is_compaction_due(now=1150)
+
+def test_chroma_usage_includes_shared_sqlite(tmp_path, monkeypatch):
+    chromadb = pytest.importorskip("chromadb")
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    # HNSW 파일을 만들지 않는 작은 collection도 embedding & 문서 크기만큼 사용량에 포함
+    for name, count in [("small-file", 10), ("large-file", 90)]:
+        client.get_or_create_collection(name).add(
+            ids=[f"{name}_{i}" for i in range(count)],
+            embeddings=[[float(i)] * 64 for i in range(count)],
+            documents=["text " * 50] * count,
+        )
+    monkeypatch.setattr(lifecycle, "CHROMA_DATA_PATH", str(tmp_path))
+    monkeypatch.setattr(lifecycle, "CHROMA_SQLITE_PATH", str(tmp_path / "chroma.sqlite3"))
+    usage = lifecycle._get_chroma_usage()
+    assert 0 < usage["small-file"] < usage["large-file"]
+    assert sum(usage.values()) >= (tmp_path / "chroma.sqlite3").stat().st_size * 0.5
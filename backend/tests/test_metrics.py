@@ -0,0 +1,31 @@
+import time
+from apps import metrics
+
+def test_span_records_debug_timings():
+    token = metrics.start_timings()
+    with metrics.span("stage_a"):
+        time.sleep(0.01)
+    with metrics.span("stage_a"):
+        pass
+    timings = metrics.stop_timings(token)
+    assert timings["stage_a"] >= 10
+    # 요청이 끝나면 더 이상 기록하지 않음
+    with metrics.span("stage_b"):
+        pass
+    assert metrics._timings.get() is None
+
+def test_span_exports_histogram():
+    with metrics.span("test_stage"):
+        pass
+    body, _ = metrics.get_metrics()
+    assert b'rag_stage_seconds_count{stage="test_stage"}' in body
+
+def test_disabled_span_overhead(monkeypatch):
+    monkeypatch.setitem(metrics.CONFIG_DATA['metrics'], 'enabled', False)
+    assert metrics.span("disabled") is metrics._NOOP_SPAN
+    started = time.perf_counter()
+    for _ in range(100000):
+        with metrics.span("disabled"):
+            pass
+    # span 1회당 수 us 이내
+    assert time.perf_counter() - started < 0.5
@@ -0,0 +1,39 @@
+import pytest
+from apps import startup
+from apps.utils import get_model_path, get_model_repo_id, ModelNotCached
+
+def test_model_repo_id():
+    assert get_model_repo_id("all-MiniLM-L6-v2") == "sentence-transformers/all-MiniLM-L6-v2"
+    assert get_model_repo_id("BAAI/bge-m3") == "BAAI/bge-m3"
+    assert get_model_repo_id("/models/org/bge-m3") is None
+
+def test_model_path_does_not_download(tmp_path, monkeypatch):
+    # 로컬 캐시에 없는 모델은 다운로드하지 않고 바로 실패
+    monkeypatch.setenv("SENTENCE_TRANSFORMERS_HOME", str(tmp_path))
+    with pytest.raises(ModelNotCached):
+        get_model_path("BAAI/not-cached-model")
+
+@pytest.fixture
+def fresh_startup(monkeypatch):
+    monkeypatch.setattr(startup, "_thread", None)
+    monkeypatch.setattr(startup, "_status", {"ready": False, "error": None, "steps": {}})
+
+def test_ready_after_steps(fresh_startup, monkeypatch):
+    calls = []
+    monkeypatch.setattr(startup, "STEPS", (("stores", lambda: calls.append("stores")), ("models", lambda: calls.append("models"))))
+    assert not startup.is_ready()
+    startup.start(background=False)
+    # 프로세스당 1회만 실행
+    startup.start(background=False)
+    assert calls == ["stores", "models"]
+    assert startup.is_ready()
+    assert set(startup.get_status()["steps"]) == {"stores", "models"}
+
+def test_not_ready_on_failure(fresh_startup, monkeypatch):
+    def fail():
+        raise RuntimeError("model missing")
+    monkeypatch.setattr(startup, "STEPS", (("models", fail),))
+    startup.start(background=False)
+    status = startup.get_status()
+    assert not status["ready"]
+    assert status["error"] == "model missing"
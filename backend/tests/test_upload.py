@@ -0,0 +1,136 @@
+import io
+import asyncio
+import importlib.util
+import os
+import hashlib
+import resource
+import pytest
+from apps.upload import stream_to_temp, commit_upload, InvalidFileType, FileTooLarge, PDF_MAGIC
+
+class SyntheticPDF(io.RawIOBase):
+    # 메모리에 올리지 않고 size 만큼의 PDF-like byte stream 생성
+    def __init__(self, size: int):
+        self.size = size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self.size - self.pos)
+        if n <= 0:
+            return 0
+        block = (PDF_MAGIC if self.pos == 0 else b"") + bytes([self.pos // (1024 * 1024) % 251]) * n
+        buffer[:n] = block[:n]
+        self.pos += n
+        return n
+
+def expected_hash(size: int) -> str:
+    sha256 = hashlib.sha256()
+    stream = SyntheticPDF(size)
+    while chunk := stream.read(1024 * 1024):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def test_stream_to_temp_large_file_memory(tmp_path):
+    size = 300 * 1024 * 1024
+    before = max_rss_mb()
+    temp_path, file_size, content_hash = stream_to_temp(SyntheticPDF(size), upload_dir=tmp_path, max_size=size)
+    # peak RSS는 파일 크기와 무관하게 수 MB 이내로 유지
+    assert max_rss_mb() - before < 32
+
+    assert file_size == size
+    assert os.path.getsize(temp_path) == size
+    assert content_hash == expected_hash(size)
+
+    file_path = commit_upload(temp_path, "test", upload_dir=tmp_path)
+    assert os.path.exists(file_path)
+    assert not os.path.exists(temp_path)
+
+def test_stream_to_temp_rejects_non_pdf(tmp_path):
+    with pytest.raises(InvalidFileType):
+        stream_to_temp(io.BytesIO(b"not a pdf"), upload_dir=tmp_path)
+    assert os.listdir(tmp_path) == []
+
+def test_stream_to_temp_rejects_large_file(tmp_path):
+    with pytest.raises(FileTooLarge):
+        stream_to_temp(SyntheticPDF(4 * 1024 * 1024), upload_dir=tmp_path, chunk_size=1024 * 1024, max_size=3 * 1024 * 1024)
+    assert os.listdir(tmp_path) == []
+
+# /file: request body를 받는 도중 검사하는지 확인 (Starlette UploadFile처럼 전부 받은 뒤가 아닌지)
+BOUNDARY = "test-boundary"
+
+def multipart_chunks(filename: str, size: int, chunk_size: int = 16 * 1024) -> list:
+    head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n").encode()
+    stream = SyntheticPDF(size)
+    chunks = [head]
+    while chunk := stream.read(chunk_size):
+        chunks.append(chunk)
+    chunks.append(f"\r\n--{BOUNDARY}--\r\n".encode())
+    return chunks
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    pytest.importorskip("python_multipart" if importlib.util.find_spec("python_multipart") else "multipart")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    main = pytest.importorskip("main")
+    from apps import upload, file_db
+    from apps.file_db import FileIndexDB
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setitem(main.CONFIG_DATA, "upload", {"chunk_size": 64 * 1024, "max_size": 256 * 1024})
+    db = FileIndexDB(path=str(tmp_path / "files.sqlite3"), legacy_json_path=None)
+    monkeypatch.setattr(file_db, "_file_db", db)
+    yield main.app
+    db.close()
+
+def post_file(app, chunks: list) -> tuple:
+    # chunked 요청 (content-length 없음), returns (status, app이 읽은 body chunk 수)
+    received = []
+    response = {}
+
+    async def receive():
+        if len(received) == len(chunks):
+            return {"type": "http.disconnect"}
+        received.append(chunks[len(received)])
+        return {"type": "http.request", "body": received[-1], "more_body": len(received) < len(chunks)}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/file", "raw_path": b"/file", "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    return response["status"], len(received)
+
+def test_upload_rejects_oversized_body_while_receiving(server, tmp_path):
+    chunks = multipart_chunks("large.pdf", 4 * 1024 * 1024)
+    status, received = post_file(server, chunks)
+    assert status == 413
+    # max_size(256KB)를 넘은 직후 중단, 4MB body의 나머지는 읽지 않음
+    assert received <= 256 // 16 + 2 < len(chunks)
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".upload-")] == []
+
+def test_upload_rejects_non_pdf_before_reading_content(server):
+    status, received = post_file(server, multipart_chunks("notes.txt", 1024 * 1024))
+    assert status == 400
+    assert received == 1
+
+def test_upload_file(server, tmp_path):
+    from fastapi.testclient import TestClient
+    client = TestClient(server)
+    content = b"".join(multipart_chunks("report.pdf", 100 * 1024)[1:-1])
+    first = client.post("/file", files={"file": ("report.pdf", content, "application/pdf")})
+    assert first.status_code == 200
+    assert os.path.getsize(tmp_path / first.json()["file_id"]) == len(content)
+    # 같은 내용은 기존 file_id 반환
+    second = client.post("/file", files={"file": ("copy.pdf", content, "application/pdf")})
+    assert second.json() == first.json()
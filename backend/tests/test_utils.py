@@ -0,0 +1,19 @@
+from langchain_core.documents import Document
+from apps.cache import LRUCache
+from apps.utils import RerankCompressor
+from benchmarks.stand_ins import TinyCrossEncoder
+
+def test_rerank_score_cache_misses_after_reindex():
+    def rerank(docs):
+        compressor = RerankCompressor(
+            embedding_function=None, top_n=2, reranking_function=TinyCrossEncoder(), r_score=-1e9,
+            score_cache=cache, model_name="tiny",
+        )
+        compressor.compress_documents(docs, "camera price")
+        return compressor.stats
+
+    cache = LRUCache(maxsize=100)
+    assert rerank([Document(id="file_0", page_content="camera price list")])["cache_hits"] == 0
+    assert rerank([Document(id="file_0", page_content="camera price list")])["cache_hits"] == 1
+    # 재색인으로 같은 chunk id에 다른 내용이 들어간 경우 이전 점수를 사용하지 않음
+    assert rerank([Document(id="file_0", page_content="warranty terms")])["cache_hits"] == 0
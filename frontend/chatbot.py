@@ -3,6 +3,7 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 
 import json
+import itertools
 import streamlit as st
 import requests
 import asyncio
@@ -32,11 +33,25 @@ with st.sidebar:
 
         async def upload_file(file):
             async def async_post(session, url, filename, data=None, json=None):
-                async with session.post(url, data=data, json=json, timeout=aiohttp.ClientTimeout(total=6000)) as response:
+                async with session.post(url, data=data, json=json, timeout=aiohttp.ClientTimeout(total=600)) as response:
                     if response.status == 200:
                         return await response.text()
                     else:
                         st.error(f"Failed to upload {filename}")
+
+            async def wait_indexing_job(session, job, filename):
+                # 색인은 backend job으로 실행되므로 완료될때까지 상태 polling
+                while job['status'] not in ('done', 'failed'):
+                    await asyncio.sleep(1)
+                    async with session.get(f"{BACKEND_URL}/indexing/{job['job_id']}") as response:
+                        if response.status != 200:
+                            st.error(f"Failed to index {filename}")
+                            return None
+                        job = await response.json()
+                if job['status'] == 'failed':
+                    st.error(f"Failed to index {filename}: {job['error']}")
+                    return None
+                return {'file_id': job['file_id'], 'name': job['name'], 'docs_count': job['docs_count']}
             
             async with aiohttp.ClientSession() as session:
                 # file upload
@@ -58,7 +73,9 @@ with st.sidebar:
                     result = await async_post(session, url=f"{BACKEND_URL}/indexing", filename=file.name, json=index_params)
                     
                     if result:
-                        st.session_state["uploaded_file_ids"].append(json.loads(result))
+                        result = await wait_indexing_job(session, json.loads(result), file.name)
+                    if result:
+                        st.session_state["uploaded_file_ids"].append(result)
         
         # 비동기 파일 업로드 실행
         async def async_run(files):
@@ -78,19 +95,18 @@ if prompt := st.chat_input():
     st.session_state.messages.append({"role": "user", "content": prompt})
     st.chat_message("user").write(prompt)
     
-    with st.spinner('답변 생성중'):
-        # print(st.session_state.messages)
-        # print(st.session_state.uploaded_file_ids)
-        searchResult = requests.post(f"{BACKEND_URL}/search",
-                                    json={
-                                        "file_infos": st.session_state.uploaded_file_ids,
-                                        "messages": st.session_state.messages
-                                        }
-                                    )
-        content = json.loads(searchResult.content.decode('utf-8'))
+    def read_chat_stream(response):
+        # /chat SSE 응답을 (event, data) 단위로 변환
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+
+    def get_tooltips(citations):
         tooltips = []
-        for citation in content['citations']:
-            # print(citation)
+        for citation in citations:
             if citation['document']:
                 title = urllib.parse.unquote(citation['source'])
                 for i in range(len(citation['document'])):
@@ -99,27 +115,40 @@ if prompt := st.chat_input():
                         'content': citation['document'][i],
                         'page': citation['metadata'][i]['page']
                     })
+        return tooltips
 
-        response = requests.post(f"{BACKEND_URL}/invoke",
-                                    json={
-                                    "input": {
-                                        "context": content['context'],
-                                        "question": content['question']
-                                    },
-                                    "config": {},
-                                    "kwargs": {}
+    with st.spinner('답변 생성중'):
+        # 검색 & 답변 생성을 /chat 하나의 요청으로 처리, 토큰은 생성되는 대로 출력
+        response = requests.post(f"{BACKEND_URL}/chat",
+                                json={
+                                    "file_infos": st.session_state.uploaded_file_ids,
+                                    "messages": st.session_state.messages
                                     },
-                                    headers={
-                                        'Content-Type': 'application/json'
-                                        }
-                                    )
-        if response.ok:
-            content = json.loads(response.content.decode('utf-8'))
-            # print(f"generate result: {content}")
-            msg = content['output']
-            st.session_state.messages.append({"role": "assistant", "content": msg})
-            st.chat_message("assistant").write(msg)
+                                stream=True,
+                                timeout=600
+                                )
+        events = read_chat_stream(response)
+        # 첫 이벤트(citations)를 받을때까지 spinner 표시
+        first_event = next(events, None) if response.ok else None
+
+    if response.ok:
+        result = {"tooltips": [], "error": None}
+
+        def stream_tokens():
+            for event, data in itertools.chain([first_event] if first_event else [], events):
+                if event == "citations":
+                    result["tooltips"] = get_tooltips(data['citations'])
+                elif event == "token":
+                    yield data
+                elif event == "error":
+                    result["error"] = data['detail']
 
+        msg = st.chat_message("assistant").write_stream(stream_tokens())
+        if result["error"]:
+            st.error(result["error"])
+        else:
+            st.session_state.messages.append({"role": "assistant", "content": msg})
+            tooltips = result["tooltips"]
             if len(tooltips)> 0:
                 with st.container():
                     for idx, tooltip in enumerate(tooltips, start=1):
@@ -127,5 +156,5 @@ if prompt := st.chat_input():
                             st.text(f"[{idx}] {tooltip['title']} ({tooltip['page']}p)", help = tooltip['content'])
                         else:
                             st.text(f"[{idx}] {tooltip['title']}", help = tooltip['content'])
-        else:
-            st.error(response)
\ No newline at end of file
+    else:
+        st.error(response)